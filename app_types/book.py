@@ -2,13 +2,18 @@ from psycopg import Connection, Cursor
 from util.orm import (
     Record,
     ORM,
+    Relation,
     SearchResult,
     SearchCondition,
+    SearchSpec,
     PaginationParams,
-    search_internal,
+    BulkResult,
 )
 from datetime import datetime
-from typing import Literal, Optional
+from typing import TYPE_CHECKING, Iterable, Literal, Optional
+
+if TYPE_CHECKING:
+    from util.affinity import GenreAffinityEngine
 
 # Big query strings for searching
 
@@ -24,8 +29,41 @@ BOOK_FMT_COUNT = """
 SELECT COUNT(id) FROM view_books_vid {conditions}
 """
 
+# Adds a "relevance" column (full-text rank of the title) that can be sorted & seeked on
+# (float8 so the rank round-trips exactly through keyset cursors)
+BOOK_FMT_RANKED = """
+SELECT * FROM (
+    SELECT view_books_vid.*, ts_rank(books.title_tsv, websearch_to_tsquery('english', %s))::float8 AS relevance
+        FROM view_books_vid
+        JOIN books ON books.id = view_books_vid.id
+) AS ranked
+    {conditions}
+	{order}
+    {offset}
+    {limit}
+"""
+
+TITLE_MODES = Literal["substring", "fulltext"]
+
+# Tables read by view_books_vid, writes to any of them invalidate cached book searches
+BOOK_TAGS = [
+    "books",
+    "books_authors",
+    "books_editors",
+    "books_publishers",
+    "books_genres",
+    "books_audiences",
+    "contributors",
+    "genres",
+    "audiences",
+    "users_ratings",
+]
+
 
 class AudienceRecord(Record):
+    __slots__ = ("id", "name")
+    table = "audiences"
+
     def __init__(
         self, db: Connection, table: str, orm: ORM, id: int, name: str, *args
     ) -> None:
@@ -35,6 +73,9 @@ class AudienceRecord(Record):
 
 
 class GenreRecord(Record):
+    __slots__ = ("id", "name")
+    table = "genres"
+
     def __init__(
         self, db: Connection, table: str, orm: ORM, id: int, name: str, *args
     ) -> None:
@@ -44,6 +85,9 @@ class GenreRecord(Record):
 
 
 class ContributorRecord(Record):
+    __slots__ = ("type", "id", "first_name", "last_name_or_company")
+    table = "contributors"
+
     def __init__(
         self,
         db: Connection,
@@ -78,16 +122,17 @@ class ContributorRecord(Record):
                 relation_table = "books_publishers"
 
         cursor = self.db.execute(
-            "SELECT * FROM books AS root WHERE id IN (SELECT book_id FROM {rel} WHERE contributor_id = %(id)s)".format(
+            "SELECT id, title, length, edition, release_dt, isbn FROM books AS root WHERE id IN (SELECT book_id FROM {rel} WHERE contributor_id = %(id)s)".format(
                 rel=relation_table
             ),
             {"id": self.id},
         )
         results = [
-            BookRecord(self.db, "books", self.orm, *r) for r in cursor.fetchall()
+            BookRecord._from_row(self.db, "books", self.orm, *r)
+            for r in cursor.fetchall()
         ]
         cursor.close()
-        return results
+        return self.orm.prefetch(results, *BookRecord.RELATIONS)
 
     def save(self):
         self.db.execute(
@@ -101,13 +146,26 @@ class ContributorRecord(Record):
             ),
         )
         self.db.commit()
+        self.orm.invalidate(self.table)
 
     def delete(self):
         self.db.execute("DELETE FROM " + self.table + " WHERE id = %s", (self.id,))
         self.db.commit()
+        self.orm.invalidate(self.table)
 
 
 class SessionRecord(Record):
+    __slots__ = (
+        "session_id",
+        "book_id",
+        "user_id",
+        "start_dt",
+        "end_dt",
+        "start_page",
+        "end_page",
+    )
+    table = "users_sessions"
+
     def __init__(
         self,
         db: Connection,
@@ -134,8 +192,32 @@ class SessionRecord(Record):
     def create(cls, user: int, book: int):
         pass
 
+    # Backfill many sessions with one COPY, rows are
+    # (book_id, user_id, start_dt, end_dt, start_page, end_page)
+    # Session IDs come from the column's sequence default
+    @staticmethod
+    def bulk_create(
+        orm: ORM,
+        sessions: Iterable[tuple[int, int, datetime, datetime, int, int]],
+    ) -> BulkResult:
+        return orm.bulk_insert(
+            "users_sessions",
+            [
+                "book_id",
+                "user_id",
+                "start_datetime",
+                "end_datetime",
+                "start_page",
+                "end_page",
+            ],
+            sessions,
+        )
+
 
 class RatingRecord(Record):
+    __slots__ = ("user_id", "rating", "book_id")
+    table = "users_ratings"
+
     def __init__(
         self,
         db: Connection,
@@ -156,21 +238,131 @@ class RatingRecord(Record):
             (book_id, user_id, rating),
         )
         orm.db.commit()
+        orm.affinity.rating_changed(
+            user_id, book_id, float(rating) if rating != None else None
+        )
+        orm.invalidate("users_ratings")
         return RatingRecord(orm.db, "users_ratings", orm, user_id, rating, book_id)
 
         return None
 
+    # Backfill many ratings with one COPY, rows are (user_id, book_id, rating)
+    # Existing ratings by the same user for the same book are replaced
+    @staticmethod
+    # The affinity engine reloads on next use, the rows aren't applied one by one
+    @staticmethod
+    def bulk_create(orm: ORM, ratings: Iterable[tuple[int, int, int]]) -> BulkResult:
+        result = orm.bulk_upsert(
+            "users_ratings",
+            ["user_id", "book_id", "rating"],
+            ratings,
+            ["user_id", "book_id"],
+        )
+        orm.affinity.expire()
+        return result
+
+    # Updates the rating, the previous one is returned so the affinity totals can swap it out
     def save(self):
-        self.db.execute(
+        cursor = self.db.execute(
             "UPDATE "
             + self.table
-            + " SET book_id = %s, user_id = %s, rating = %s WHERE user_id == %s && book_id == %s",
-            (self.book_id, self.user_id, self.rating, self.book_id, self.user_id),
+            + " AS rated SET rating = %(rating)s FROM (SELECT user_id, book_id, rating FROM "
+            + self.table
+            + " WHERE user_id = %(user_id)s AND book_id = %(book_id)s FOR UPDATE) AS previous WHERE rated.user_id = previous.user_id AND rated.book_id = previous.book_id RETURNING previous.rating",
+            {"rating": self.rating, "user_id": self.user_id, "book_id": self.book_id},
         )
+        previous = cursor.fetchone()
+        cursor.close()
         self.db.commit()
+        if previous != None:
+            self.orm.affinity.rating_changed(
+                self.user_id,
+                self.book_id,
+                float(self.rating) if self.rating != None else None,
+                float(previous[0]) if previous[0] != None else None,
+            )
+        self.orm.invalidate(self.table)
+
+
+# Batched loader for the contributors of a book in one role
+def contributor_relation(role: Literal["author", "publisher", "editor"]) -> Relation:
+    return Relation(
+        "SELECT books_{role}s.book_id, contributors.id, contributors.name_first, contributors.name_last_company FROM books_{role}s JOIN contributors ON contributors.id = books_{role}s.contributor_id WHERE books_{role}s.book_id = ANY(%s) ORDER BY contributors.name_last_company, contributors.name_first".format(
+            role=role
+        ),
+        lambda orm, book_id, row: orm.identity(
+            "contributors",
+            (role, row[0]),
+            ContributorRecord,
+            orm.db,
+            "contributors",
+            orm,
+            role,
+            *row,
+        ),
+        ["books_" + role + "s", "contributors"],
+    )
+
+
+# Books with a contributor (through relation_table) whose name contains name,
+# matched on the normalized, trigram indexed contributors.search_name.
+# Lower-cased with whitespace runs collapsed to one space, like the column (migration 006)
+def contributor_condition(
+    relation_table: Literal["books_authors", "books_editors", "books_publishers"],
+    name: str,
+) -> SearchCondition:
+    return SearchCondition(
+        "id IN (SELECT {rel}.book_id FROM {rel} JOIN contributors ON contributors.id = {rel}.contributor_id WHERE contributors.search_name LIKE %s)".format(
+            rel=relation_table
+        ),
+        ["%" + " ".join(name.lower().split()) + "%"],
+    )
 
 
 class BookRecord(Record):
+    # Relation cache is one slot per relation, None until loaded
+    __slots__ = (
+        "id",
+        "title",
+        "length",
+        "edition",
+        "release_dt",
+        "isbn",
+        "_authors",
+        "_editors",
+        "_publishers",
+        "_audiences",
+        "_genres",
+        "_ratings",
+    )
+    table = "books"
+    RELATIONS = {
+        "audiences": Relation(
+            "SELECT books_audiences.book_id, audiences.id, audiences.name FROM books_audiences JOIN audiences ON audiences.id = books_audiences.audience_id WHERE books_audiences.book_id = ANY(%s) ORDER BY audiences.name",
+            lambda orm, book_id, row: orm.identity(
+                "audiences", row[0], AudienceRecord, orm.db, "audiences", orm, *row
+            ),
+            ["books_audiences", "audiences"],
+        ),
+        "genres": Relation(
+            "SELECT books_genres.book_id, genres.id, genres.name FROM books_genres JOIN genres ON genres.id = books_genres.genre_id WHERE books_genres.book_id = ANY(%s) ORDER BY genres.name",
+            lambda orm, book_id, row: orm.identity(
+                "genres", row[0], GenreRecord, orm.db, "genres", orm, *row
+            ),
+            ["books_genres", "genres"],
+        ),
+        "authors": contributor_relation("author"),
+        "editors": contributor_relation("editor"),
+        "publishers": contributor_relation("publisher"),
+        "ratings": Relation(
+            "SELECT book_id, user_id, rating FROM users_ratings WHERE book_id = ANY(%s)",
+            lambda orm, book_id, row: RatingRecord(
+                orm.db, "users_ratings", orm, row[0], row[1], book_id
+            ),
+            ["users_ratings"],
+        ),
+    }
+
     def __init__(
         self,
         db: Connection,
@@ -197,14 +389,49 @@ class BookRecord(Record):
         self.edition = edition
         self.release_dt = release_dt
         self.isbn = isbn
-        self.cache = {
-            "authors": _authors,
-            "editors": _editors,
-            "publishers": _publishers,
-            "audiences": _audiences,
-            "genres": _genres,
-            "ratings": _ratings,
-        }
+        self._authors = _authors
+        self._editors = _editors
+        self._publishers = _publishers
+        self._audiences = _audiences
+        self._genres = _genres
+        self._ratings = _ratings
+
+    # Build from a books row, sharing the instance through the ORM identity map
+    @classmethod
+    def _from_row(
+        cls,
+        db: Connection,
+        table: str,
+        orm: ORM,
+        id: int,
+        title: str,
+        length: int,
+        edition: str,
+        release_dt: datetime,
+        isbn: int,
+        *args,
+    ) -> "BookRecord":
+        record: BookRecord = orm.identity(
+            "books",
+            id,
+            BookRecord,
+            db,
+            table,
+            orm,
+            id,
+            title,
+            length,
+            edition,
+            release_dt,
+            isbn,
+        )
+        # Refresh columns, relations already loaded on the shared instance stay cached
+        record.title = title
+        record.length = length
+        record.edition = edition
+        record.release_dt = release_dt
+        record.isbn = isbn
+        return record
 
     def save(self):
         self.db.execute(
@@ -221,117 +448,60 @@ class BookRecord(Record):
             ),
         )
         self.db.commit()
+        self.orm.invalidate(self.table)
 
     def delete(self):
         self.db.execute("DELETE FROM " + self.table + " WHERE id = %s", (self.id,))
         self.db.commit()
+        self.orm.invalidate(self.table)
 
-    # Return a list of AudienceRecord
+    # Relations are loaded through ORM.prefetch, so a single book and a whole
+    # page of books share the same batched query
     @property
     def audiences(self) -> list[AudienceRecord]:
-        if self.cache["audiences"] != None:
-            return self.cache["audiences"]
-        cursor = self.db.execute(
-            "SELECT * FROM audiences AS root WHERE id IN (SELECT audience_id FROM books_audiences WHERE book_id = %(id)s)",
-            {"id": self.id},
-        )
-        results = [
-            AudienceRecord(self.db, "audiences", self.orm, *r)
-            for r in cursor.fetchall()
-        ]
-        self.cache["audiences"] = results
-        cursor.close()
-        return results
+        if self._audiences == None:
+            self.orm.prefetch([self], "audiences")
+        return self._audiences
 
-    # Return a list of GenreRecord
     @property
     def genres(self) -> list[GenreRecord]:
-        if self.cache["genres"] != None:
-            return self.cache["genres"]
-        cursor = self.db.execute(
-            "SELECT * FROM genres AS root WHERE id IN (SELECT genre_id FROM books_genres WHERE book_id = %(id)s)",
-            {"id": self.id},
-        )
-        results = [
-            GenreRecord(self.db, "genres", self.orm, *r) for r in cursor.fetchall()
-        ]
-        self.cache["genres"] = results
-        cursor.close()
-        return results
+        if self._genres == None:
+            self.orm.prefetch([self], "genres")
+        return self._genres
 
     @property
     def authors(self) -> list[ContributorRecord]:
-        if self.cache["authors"] != None:
-            return self.cache["authors"]
-
-        cursor = self.db.execute(
-            "SELECT * FROM contributors AS root WHERE id IN (SELECT contributor_id FROM books_authors WHERE book_id = %(id)s)",
-            {"id": self.id},
-        )
-        results = [
-            ContributorRecord(self.db, "contributors", self.orm, "author", *r)
-            for r in cursor.fetchall()
-        ]
-        self.cache["authors"] = results
-        cursor.close()
-        return results
+        if self._authors == None:
+            self.orm.prefetch([self], "authors")
+        return self._authors
 
     @property
     def editors(self) -> list[ContributorRecord]:
-        if self.cache["editors"] != None:
-            return self.cache["editors"]
-
-        cursor = self.db.execute(
-            "SELECT * FROM contributors AS root WHERE id IN (SELECT contributor_id FROM books_editors WHERE book_id = %(id)s)",
-            {"id": self.id},
-        )
-        results = [
-            ContributorRecord(self.db, "contributors", self.orm, "editor", *r)
-            for r in cursor.fetchall()
-        ]
-        self.cache["editors"] = results
-        cursor.close()
-        return results
+        if self._editors == None:
+            self.orm.prefetch([self], "editors")
+        return self._editors
 
     @property
     def publishers(self) -> list[ContributorRecord]:
-        if self.cache["publishers"] != None:
-            return self.cache["publishers"]
-
-        cursor = self.db.execute(
-            "SELECT * FROM contributors AS root WHERE id IN (SELECT contributor_id FROM books_publishers WHERE book_id = %(id)s)",
-            {"id": self.id},
-        )
-        results = [
-            ContributorRecord(self.db, "contributors", self.orm, "publisher", *r)
-            for r in cursor.fetchall()
-        ]
-        self.cache["publishers"] = results
-        cursor.close()
-        return results
+        if self._publishers == None:
+            self.orm.prefetch([self], "publishers")
+        return self._publishers
 
     @property
     def ratings(self) -> list[RatingRecord]:
-        if self.cache["ratings"] != None:
-            return self.cache["ratings"]
-
-        cursor = self.db.execute(
-            "SELECT user_id, rating FROM users_ratings WHERE book_id = %(id)s",
-            {"id": self.id},
-        )
-        results = [
-            RatingRecord(self.db, "users_ratings", self.orm, *r)
-            for r in cursor.fetchall()
-        ]
-        self.cache["ratings"] = results
-        cursor.close()
-        return results
+        if self._ratings == None:
+            self.orm.prefetch([self], "ratings")
+        return self._ratings
 
     @property
     def avg_rating(self) -> float:
-        if self.cache["ratings"]:
-            ratings = self.ratings
-            return round(sum([r.rating for r in ratings]) / len(ratings), 2)
+        if self._ratings != None:
+            ratings = self._ratings
+            return (
+                round(sum([r.rating for r in ratings]) / len(ratings), 2)
+                if len(ratings) > 0
+                else -1
+            )
         else:
             cursor = self.db.execute(
                 "SELECT AVG(rating) FROM users_ratings WHERE book_id = %s", [self.id]
@@ -341,6 +511,9 @@ class BookRecord(Record):
             return round(result, 2) if result else -1
 
     # Build from search results
+    # relations is the view's jsonb column, already decoded by psycopg:
+    # {"genres": [[id, name]], "audiences": [[id, name]], "publishers": [[id, name]],
+    #  "authors": [[id, first, last]], "editors": [[id, first, last]], "ratings": [[user_id, rating]]}
 
     @classmethod
     def _from_search(
@@ -354,123 +527,71 @@ class BookRecord(Record):
         edition: str,
         release_dt: datetime,
         isbn: int,
-        genres: str,
-        genres_names: str,
-        audiences: str,
-        audiences_names: str,
-        publishers: str,
-        publishers_names: str,
-        authors: str,
-        authors_names: str,
-        editors: str,
-        editors_names: str,
-        ratings: str,
+        relations: dict[str, list[list]],
         *args,
     ):
-        genre_records = (
-            [
-                GenreRecord(db, "genres", orm, int(i.split(":")[0]), i.split(":")[1])
-                for i in list(set(genres.split("|")))
-            ]
-            if genres
-            else []
-        )
-        audience_records = (
-            [
-                AudienceRecord(
-                    db, "audiences", orm, int(i.split(":")[0]), i.split(":")[1]
-                )
-                for i in list(set(audiences.split("|")))
-            ]
-            if audiences
-            else []
-        )
-        publisher_records = (
-            [
-                ContributorRecord(
-                    db,
-                    "contributors",
-                    orm,
-                    "publisher",
-                    int(i.split(":")[0]),
-                    None,
-                    i.split(":")[1],
-                )
-                for i in list(set(publishers.split("|")))
-            ]
-            if publishers
-            else []
-        )
-        author_records = (
-            [
-                ContributorRecord(
-                    db,
-                    "contributors",
-                    orm,
-                    "author",
-                    int(i.split(":")[0]),
-                    i.split(":")[1],
-                    i.split(":")[2],
-                )
-                for i in list(set(authors.split("|")))
-            ]
-            if authors
-            else []
-        )
-        editor_records = (
-            [
-                ContributorRecord(
-                    db,
-                    "contributors",
-                    orm,
-                    "editor",
-                    int(i.split(":")[0]),
-                    i.split(":")[1],
-                    i.split(":")[2],
-                )
-                for i in list(set(editors.split("|")))
-            ]
-            if editors
-            else []
-        )
-        rating_records = (
-            [
-                RatingRecord(
-                    db,
-                    "users_ratings",
-                    orm,
-                    int(i.split(":")[0]),
-                    int(i.split(":")[1]),
-                    id,
-                )
-                for i in list(set(ratings.split("|")))
-            ]
-            if ratings
-            else []
-        )
-        return BookRecord(
-            db,
-            table,
-            orm,
-            id,
-            title,
-            length,
-            edition,
-            release_dt,
-            isbn,
-            _audiences=audience_records,
-            _genres=genre_records,
-            _publishers=publisher_records,
-            _authors=author_records,
-            _editors=editor_records,
-            _ratings=rating_records,
+        record = BookRecord._from_row(
+            db, table, orm, id, title, length, edition, release_dt, isbn
         )
+        record._genres = [
+            orm.identity("genres", i[0], GenreRecord, db, "genres", orm, *i)
+            for i in relations["genres"]
+        ]
+        record._audiences = [
+            orm.identity("audiences", i[0], AudienceRecord, db, "audiences", orm, *i)
+            for i in relations["audiences"]
+        ]
+        record._publishers = [
+            orm.identity(
+                "contributors",
+                ("publisher", i[0]),
+                ContributorRecord,
+                db,
+                "contributors",
+                orm,
+                "publisher",
+                i[0],
+                None,
+                i[1],
+            )
+            for i in relations["publishers"]
+        ]
+        record._authors = [
+            orm.identity(
+                "contributors",
+                ("author", i[0]),
+                ContributorRecord,
+                db,
+                "contributors",
+                orm,
+                "author",
+                *i,
+            )
+            for i in relations["authors"]
+        ]
+        record._editors = [
+            orm.identity(
+                "contributors",
+                ("editor", i[0]),
+                ContributorRecord,
+                db,
+                "contributors",
+                orm,
+                "editor",
+                *i,
+            )
+            for i in relations["editors"]
+        ]
+        record._ratings = [
+            RatingRecord(db, "users_ratings", orm, i[0], i[1], id)
+            for i in relations["ratings"]
+        ]
+        return record
 
     # Search with fields
     @classmethod
-    def search(
+    def search_spec(
         self,
-        orm: ORM,
         pagination: PaginationParams,
         title: Optional[str] = None,
         min_length: Optional[int] = None,
@@ -483,15 +604,30 @@ class BookRecord(Record):
         publisher_name: Optional[str] = None,
         genre: Optional[str] = None,
         audience: Optional[str] = None,
-    ) -> SearchResult:
+        title_mode: TITLE_MODES = "substring",
+    ) -> SearchSpec:
         fields = []
-        if title != None:
+        order = pagination.get("order") if pagination else None
+        ranked = False
+        # Title filters go through the indexed books table, not the view
+        if title != None and title_mode == "fulltext":
             fields.append(
                 SearchCondition(
-                    "title ilike %s",
+                    "id IN (SELECT id FROM books WHERE title_tsv @@ websearch_to_tsquery('english', %s))",
+                    [title],
+                )
+            )
+            ranked = order != None and "relevance" in [o[0] for o in order]
+        elif title != None:
+            fields.append(
+                SearchCondition(
+                    "id IN (SELECT id FROM books WHERE title ilike %s)",
                     ["%%" + title + "%%"],
                 )
             )
+        # Relevance only exists for full-text searches
+        if order != None and not ranked:
+            order = [o for o in order if o[0] != "relevance"]
         if min_length != None:
             fields.append(SearchCondition("length >= %s", [min_length]))
         if max_length != None:
@@ -505,20 +641,11 @@ class BookRecord(Record):
         if isbn != None:
             fields.append(SearchCondition("isbn = %s", [isbn]))
         if author_name != None:
-            fields.append(
-                SearchCondition(
-                    "books.id IN (SELECT book_id FROM books_authors AS aus WHERE contributor_id IN (SELECT contributors.id FROM contributors WHERE name_last_company ilike %s OR name_first ilike %s OR name_first || ' ' || name_last_company ilike %s))",
-                    [
-                        "%%" + author_name + "%%",
-                        "%%" + author_name + "%%",
-                        "%%" + author_name + "%%",
-                    ],
-                )
-            )
+            fields.append(contributor_condition("books_authors", author_name))
         if genre != None:
             fields.append(
                 SearchCondition(
-                    "books.id IN (SELECT book_id FROM books_genres AS ges WHERE genre_id IN (SELECT genres.id FROM genres WHERE name ilike %s))",
+                    "id IN (SELECT book_id FROM books_genres AS ges WHERE genre_id IN (SELECT genres.id FROM genres WHERE name ilike %s))",
                     ["%%" + genre + "%%"],
                 )
             )
@@ -526,28 +653,92 @@ class BookRecord(Record):
         if audience != None:
             fields.append(
                 SearchCondition(
-                    "books.id IN (SELECT book_id FROM books_audiences AS aud WHERE audience_id IN (SELECT audiences.id FROM audiences WHERE name ilike %s))",
+                    "id IN (SELECT book_id FROM books_audiences AS aud WHERE audience_id IN (SELECT audiences.id FROM audiences WHERE name ilike %s))",
                     ["%%" + audience + "%%"],
                 )
             )
         if publisher_name != None:
-            fields.append(
-                SearchCondition(
-                    "books.id IN (SELECT book_id FROM books_publishers AS pubs WHERE contributor_id IN (SELECT contributors.id FROM contributors WHERE name_last_company ilike %s))",
-                    [
-                        "%%" + publisher_name + "%%",
-                    ],
-                )
-            )
+            fields.append(contributor_condition("books_publishers", publisher_name))
 
-        return search_internal(
-            orm,
+        return SearchSpec(
             "books",
             BookRecord._from_search,
             fields,
-            pagination.get("order") if pagination else None,
+            order,
             pagination.get("offset") if pagination else None,
             pagination.get("limit") if pagination else None,
-            format_query=BOOK_FMT,
+            format_query=BOOK_FMT_RANKED if ranked else BOOK_FMT,
             format_count_query=BOOK_FMT_COUNT,
+            tags=BOOK_TAGS,
+            source_fields=[title] if ranked else None,
+            after=pagination.get("after") if pagination else None,
+            before=pagination.get("before") if pagination else None,
         )
+
+    # Recommendation lists, shared by the recommendation panel & the benchmark suite.
+    # The first two read materialized rollups (migration 005), ordered by their indexed columns
+    @staticmethod
+    def recommend_last_90(orm: ORM, limit: int = 20) -> list["BookRecord"]:
+        cursor = orm.db.execute(
+            "SELECT * FROM v90_vid ORDER BY count DESC LIMIT %s", [limit], prepare=True
+        )
+        results = [
+            BookRecord._from_search(orm.db, "books", orm, *i) for i in cursor
+        ]
+        cursor.close()
+        return results
+
+    @staticmethod
+    def recommend_this_month(orm: ORM, limit: int = 5) -> list["BookRecord"]:
+        cursor = orm.db.execute(
+            "SELECT * FROM vmonth_vid ORDER BY rollup_avg_rating DESC LIMIT %s",
+            [limit],
+            prepare=True,
+        )
+        results = [
+            BookRecord._from_search(orm.db, "books", orm, *i) for i in cursor
+        ]
+        cursor.close()
+        return results
+
+    # Scored in-process by genre affinity (util/affinity.py), only the picked books are queried
+    @staticmethod
+    def recommend_for_you(
+        orm: ORM, engine: "GenreAffinityEngine", user_id: int, limit: int = 20
+    ) -> list["BookRecord"]:
+        ids = engine.recommend(user_id, limit)
+        cursor = orm.db.execute(
+            "SELECT * FROM view_books_vid WHERE id = ANY(%s)", [ids], prepare=True
+        )
+        books = {
+            i[0]: BookRecord._from_search(orm.db, "books", orm, *i) for i in cursor
+        }
+        cursor.close()
+        return [books[id] for id in ids if id in books]
+
+    # Followers come from the ORM's follow graph, their collected books from one query
+    @staticmethod
+    def recommend_followers_read(
+        orm: ORM, user_id: int, limit: int = 20
+    ) -> list["BookRecord"]:
+        followers = orm.follows.followers(user_id)
+        if len(followers) == 0:
+            return []
+        cursor = orm.db.execute(
+            """
+            SELECT * FROM view_books_vid WHERE avg_rating IS NOT NULL AND id IN (
+                SELECT books_collections.book_id FROM books_collections
+                JOIN users_collections ON users_collections.collection_id = books_collections.collection_id
+                WHERE users_collections.user_id = ANY(%s)
+            )
+            ORDER BY avg_rating DESC
+            LIMIT %s
+        """,
+            [list(followers), limit],
+            prepare=True,
+        )
+        results = [
+            BookRecord._from_search(orm.db, "books", orm, *i) for i in cursor
+        ]
+        cursor.close()
+        return results
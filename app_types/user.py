@@ -5,7 +5,7 @@ from util.orm import (
     ORM,
     SearchCondition,
     SearchResult,
-    search_internal,
+    SearchSpec,
 )
 from datetime import datetime
 import time
@@ -36,6 +36,17 @@ SELECT
 
 
 class UserRecord(Record):
+    __slots__ = (
+        "id",
+        "creation_dt",
+        "access_dt",
+        "name_first",
+        "name_last",
+        "email",
+        "password",
+    )
+    table = "users"
+
     def __init__(
         self,
         db: Connection,
@@ -75,19 +86,26 @@ class UserRecord(Record):
             ),
         )
         self.db.commit()
+        self.orm.invalidate(self.table)
 
     def delete(self):
         self.db.execute("DELETE FROM " + self.table + " WHERE id = %s", (self.id,))
         self.db.commit()
+        self.orm.invalidate(self.table)
 
-    def collections(self) -> list("CollectionRecord"):
+    # Collections with their book count & page sum from one grouped query, books load lazily
+    def collections(self) -> list["CollectionRecord"]:
         cursor = self.db.execute(
-            f"SELECT * from collections WHERE id IN (SELECT collection_id from users_collections where user_id = {self.id}) ORDER BY name"
+            "SELECT c.id, c.name, COUNT(bc.book_id), COALESCE(SUM(b.length), 0) FROM users_collections AS uc JOIN collections AS c ON c.id = uc.collection_id LEFT JOIN books_collections AS bc ON bc.collection_id = c.id LEFT JOIN books AS b ON b.id = bc.book_id WHERE uc.user_id = %(id)s GROUP BY c.id, c.name ORDER BY c.name, c.id",
+            {"id": self.id},
+            prepare=True,
         )
-        results = [CollectionRecord(self.db, "collections", self.orm, *r) for r in cursor.fetchall()]
+        results = [
+            CollectionRecord(self.db, "collections", self.orm, *r, _user=self)
+            for r in cursor.fetchall()
+        ]
         cursor.close()
 
-        #self.cache["collections"] = results
         return results
 
     
@@ -96,16 +114,17 @@ class UserRecord(Record):
     def create(
         cls, orm: ORM, name_first: str, name_last: str, email: str, password: str
     ) -> Union["UserRecord", None]:
-        next_id = orm.next_available_id("users")
         creation = datetime.fromtimestamp(time.time())
         access = datetime.fromtimestamp(time.time())
 
         try:
-            orm.db.execute(
-                "INSERT INTO users (id, creation_dt, access_dt, name_first, name_last, email, password) VALUES (%s, %s, %s, %s, %s, %s, %s)",
-                (next_id, creation, access, name_first, name_last, email, password),
-            )
+            # ID comes from the column's sequence
+            next_id = orm.db.execute(
+                "INSERT INTO users (creation_dt, access_dt, name_first, name_last, email, password) VALUES (%s, %s, %s, %s, %s, %s) RETURNING id",
+                (creation, access, name_first, name_last, email, password),
+            ).fetchone()[0]
             orm.db.commit()
+            orm.invalidate("users")
             return UserRecord(
                 orm.db,
                 "users",
@@ -119,6 +138,7 @@ class UserRecord(Record):
                 password,
             )
         except:
+            orm.db.rollback()
             return None
 
     @classmethod
@@ -149,15 +169,14 @@ class UserRecord(Record):
         )
 
     @classmethod
-    def search(
+    def search_spec(
         self,
-        orm: ORM,
         pagination: PaginationParams,
         id: Optional[str] = None,
         name_first: Optional[str] = None,
         name_last: Optional[str] = None,
         email: Optional[str] = None,
-    ) -> SearchResult:
+    ) -> SearchSpec:
         fields = []
 
         if id != None:
@@ -173,8 +192,7 @@ class UserRecord(Record):
         if email != None:
             fields.append(SearchCondition("email ilike %s", ["%%" + email + "%%"]))
 
-        results = search_internal(
-            orm,
+        return SearchSpec(
             "users",
             UserRecord._from_search,
             fields,
@@ -183,19 +201,45 @@ class UserRecord(Record):
             pagination.get("limit") if pagination else None,
             format_query=USER_FMT,
             # format_count_query=USER_FMT_COUNT,
+            after=pagination.get("after") if pagination else None,
+            before=pagination.get("before") if pagination else None,
         )
-
-        return results
     
+    # Follow edges come from the ORM's in-memory follow graph, only the user rows are queried
     @property
     def followers(self) -> list["UserRecord"]:
-        return self.orm.get_records_from_cursor("users", self.db.execute("SELECT * FROM users WHERE id IN (SELECT user_id FROM users_following WHERE following_id = %s)", [self.id]))
+        ids = self.orm.follows.followers(self.id)
+        if len(ids) == 0:
+            return []
+        return self.orm.get_records_from_cursor("users", self.db.execute("SELECT * FROM users WHERE id = ANY(%s) ORDER BY id", [list(ids)], prepare=True))
 
     @property
     def following(self) -> list["UserRecord"]:
-        return self.orm.get_records_from_cursor("users", self.db.execute("SELECT * FROM users WHERE id IN (SELECT following_id FROM users_following WHERE user_id = %s)", [self.id]))
+        ids = self.orm.follows.following(self.id)
+        if len(ids) == 0:
+            return []
+        return self.orm.get_records_from_cursor("users", self.db.execute("SELECT * FROM users WHERE id = ANY(%s) ORDER BY id", [list(ids)], prepare=True))
+
+# Books per page of CollectionRecord.books_page
+COLLECTION_PAGE_SIZE = 50
+
 
 class CollectionRecord(Record):
+    # _added/_removed are book IDs changed since the last save/load
+    # _books, _book_count & _page_count are loaded on first use (None until then)
+    __slots__ = (
+        "id",
+        "name",
+        "deleted",
+        "_user",
+        "_added",
+        "_removed",
+        "_books",
+        "_book_count",
+        "_page_count",
+    )
+    table = "collections"
+
     def __init__(
             self,
             db: Connection,
@@ -204,36 +248,46 @@ class CollectionRecord(Record):
             id: int,
             name: str,
             _book_count: int = None,
+            _page_count: int = None,
             _user: UserRecord = None
     ) -> None:
-        self.orm = orm # TODO: put this in the super class
-        self.db = db
-        self.table = table
+        super().__init__(db, table, orm)
         self.id = id
         self.name = name
-        self.books = self._init_books()
         self.deleted = False
-        self.cache = {
-            "user": _user
-        }
+        self._user = _user
+        self._book_count = _book_count
+        self._page_count = _page_count
+        self.reload_books()
 
+    # Saves the name, then only the membership changes since the last save, in one transaction
     def save(self) -> None:
-        self.db.execute(
-            "UPDATE "
-            + self.table
-            + " SET NAME = %(name)s WHERE ID = %(id)s",
-            {"name": self.name, "id": self.id}
-        )
-        # TODO: ewww...
-        self.db.execute(
-            "DELETE FROM books_collections WHERE collection_id = %(id)s",
-            {"id": self.id}
-        )
-        if(len(self.books) != 0):
+        try:
             self.db.execute(
-                "INSERT INTO books_collections (book_id, collection_id) VALUES" + ",".join([f"({book.id}, {self.id})" for book in self.books])
+                "UPDATE "
+                + self.table
+                + " SET NAME = %(name)s WHERE ID = %(id)s",
+                {"name": self.name, "id": self.id}
             )
-        self.db.commit()
+            if len(self._removed) > 0:
+                self.db.execute(
+                    "DELETE FROM books_collections WHERE collection_id = %(id)s AND book_id = ANY(%(books)s)",
+                    {"id": self.id, "books": list(self._removed)}
+                )
+            if len(self._added) > 0:
+                self.db.execute(
+                    "INSERT INTO books_collections (book_id, collection_id) SELECT added.book_id, %(id)s FROM unnest(%(books)s::int[]) AS added(book_id) WHERE NOT EXISTS (SELECT 1 FROM books_collections WHERE collection_id = %(id)s AND book_id = added.book_id)",
+                    {"id": self.id, "books": list(self._added)}
+                )
+            self.db.commit()
+        except:
+            self.db.rollback()
+            raise
+        self._added = set()
+        self._removed = set()
+        self._book_count = None
+        self._page_count = None
+        self.orm.invalidate(self.table, "books_collections")
 
     def delete(self) -> None:
         self.db.execute("DELETE FROM books_collections WHERE collection_id = %(id)s", {"id": self.id})
@@ -241,65 +295,132 @@ class CollectionRecord(Record):
         self.db.execute("DELETE FROM " + self.table +
                         " WHERE id = %(id)s", {"id": self.id})
         self.db.commit()
+        self.orm.invalidate(self.table, "books_collections", "users_collections")
         self.deleted = True
 
+    # Membership is tracked by ID, the book list is only touched if it was already loaded.
+    # The insert in save() skips books that are already in the collection
     def add_book(self, book: BookRecord) -> None:
-        if(book not in self.books):
-            self.books.append(book)
+        if self._books != None:
+            if book.id in [b.id for b in self._books]:
+                return
+            self._books.append(book)
+        if book.id in self._removed:
+            self._removed.discard(book.id)
+        else:
+            self._added.add(book.id)
     
     def remove_book(self, book: BookRecord) -> bool:
-        if(book in self.books):
-            self.books.remove(book)
-            return True
-        return False
+        if self._books != None:
+            matches = [b for b in self._books if b.id == book.id]
+            if len(matches) == 0:
+                return False
+            self._books.remove(matches[0])
+        if book.id in self._added:
+            self._added.discard(book.id)
+        elif book.id in self._removed:
+            return False
+        else:
+            self._removed.add(book.id)
+        return True
+
+    # Drop the loaded book list & unsaved membership changes, the next access reloads
+    def reload_books(self) -> None:
+        self._books = None
+        self._added = set()
+        self._removed = set()
+
+    # Every book in the collection, loaded on first access
+    @property
+    def books(self) -> list[BookRecord]:
+        if self._books == None:
+            self._books = self._init_books()
+        return self._books
 
     @property
     def book_count(self) -> int:
-        return self.db.execute("SELECT COUNT(*) FROM books_collections WHERE collection_id = %(id)s", {"id": self.id}).fetchone()[0]
+        if self._book_count == None:
+            self._init_totals()
+        return self._book_count
 
     @property
     def page_count(self) -> int:
-        return self.db.execute("SELECT SUM(length) FROM books WHERE id IN (SELECT book_id FROM books_collections WHERE collection_id = %(id)s)", {"id": self.id}).fetchone()[0]
+        if self._page_count == None:
+            self._init_totals()
+        return self._page_count
+
+    def _init_totals(self) -> None:
+        cursor = self.db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(books.length), 0) FROM books_collections JOIN books ON books.id = books_collections.book_id WHERE collection_id = %(id)s",
+            {"id": self.id},
+            prepare=True,
+        )
+        self._book_count, self._page_count = cursor.fetchone()
+        cursor.close()
 
+    # One page of saved books ordered by title, the next page starts after the last book returned
+    def books_page(
+        self, after: Optional[BookRecord] = None, limit: int = COLLECTION_PAGE_SIZE
+    ) -> list[BookRecord]:
+        if after == None:
+            cursor = self.db.execute(
+                "SELECT id, title, length, edition, release_dt, isbn FROM books AS root WHERE id IN (SELECT book_id FROM books_collections WHERE collection_id = %(id)s) ORDER BY title, id LIMIT %(limit)s",
+                {"id": self.id, "limit": limit},
+                prepare=True,
+            )
+        else:
+            cursor = self.db.execute(
+                "SELECT id, title, length, edition, release_dt, isbn FROM books AS root WHERE id IN (SELECT book_id FROM books_collections WHERE collection_id = %(id)s) AND (title, id) > (%(title)s, %(book_id)s) ORDER BY title, id LIMIT %(limit)s",
+                {"id": self.id, "title": after.title, "book_id": after.id, "limit": limit},
+                prepare=True,
+            )
+        results = [
+            BookRecord._from_row(self.db, "books", self.orm, *r)
+            for r in cursor.fetchall()
+        ]
+        cursor.close()
+
+        return self.orm.prefetch(results, *BookRecord.RELATIONS)
 
     def _init_books(self) -> list[BookRecord]:
         cursor = self.db.execute(
-            "SELECT * FROM books AS root WHERE id IN (SELECT book_id FROM books_collections WHERE collection_id = %(id)s)",
+            "SELECT id, title, length, edition, release_dt, isbn FROM books AS root WHERE id IN (SELECT book_id FROM books_collections WHERE collection_id = %(id)s) ORDER BY title, id",
             {"id": self.id},
         )
         results = [
-            BookRecord(self.db, "audiences", self.orm, *r)
+            BookRecord._from_row(self.db, "books", self.orm, *r)
             for r in cursor.fetchall()
         ]
         cursor.close()
 
-        return results
+        return self.orm.prefetch(results, *BookRecord.RELATIONS)
 
     @property
     def user(self) -> UserRecord:
-        if self.cache["user"] != None:
-            return self.cache["user"]
+        if self._user != None:
+            return self._user
         cursor = self.db.execute(
-            "SELECT user_id FROM users_collections WHERE collection_id = %(id)s",
+            "SELECT users.* FROM users JOIN users_collections ON users_collections.user_id = users.id WHERE collection_id = %(id)s",
             {"id": self.id}
         )
         result = UserRecord(self.db, "users", self.orm, *(cursor.fetchone()))
         cursor.close()
 
-        self.cache["user"] = result
+        self._user = result
         return result
 
     @classmethod
     def create(cls, orm: ORM, name: str, user: UserRecord ) -> Union["CollectionRecord", None]:
-        next_id = orm.next_available_id("collections")
         try:
-            orm.db.execute(
-                "INSERT INTO collections (id, name) VALUES (%(next_id)s,%(name)s)", {"next_id": next_id, "name": name}
-                )
+            next_id = orm.db.execute(
+                "INSERT INTO collections (name) VALUES (%(name)s) RETURNING id", {"name": name}
+                ).fetchone()[0]
             orm.db.execute(
                 "INSERT INTO users_collections (user_id, collection_id) VALUES (%(user_id)s, %(next_id)s)", {"user_id":user.id, "next_id": next_id})
             orm.db.commit()
+            orm.invalidate("collections", "users_collections")
         except:
+            orm.db.rollback()
             return None
 
-        return CollectionRecord(orm.db, "collections", orm, next_id, name)
\ No newline at end of file
+        return CollectionRecord(orm.db, "collections", orm, next_id, name, 0, 0, _user=user)
\ No newline at end of file
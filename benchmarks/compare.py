@@ -0,0 +1,117 @@
+from argparse import ArgumentParser
+from typing import Any
+import json
+import sys
+
+"""
+SUMMARY:
+Compares two benchmark suite reports (benchmarks/suite.py), ie from two commits.
+Prints every case present in both with its baseline & current time and the ratio,
+slowest ratio first, and warns when the datasets or servers differ (the timings are
+then not comparable). Exits with 1 if any case got slower than --threshold.
+
+Usage: python -m benchmarks.compare baseline.json current.json [--threshold 1.25] [--metric median_ms]
+"""
+
+
+def load_report(file: str) -> dict[str, Any]:
+    with open(file) as f:
+        return json.load(f)
+
+
+def compare(
+    baseline: dict[str, Any], current: dict[str, Any], metric: str = "median_ms"
+) -> list[dict[str, Any]]:
+    """Ratio of current to baseline time for every case in both reports
+
+    Args:
+        baseline (dict[str, Any]): Earlier report
+        current (dict[str, Any]): Later report
+        metric (str, optional): Timing statistic to compare. Defaults to "median_ms".
+
+    Returns:
+        list[dict[str, Any]]: Cases, largest ratio (worst regression) first
+    """
+    cases = []
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before == None:
+            continue
+        cases.append(
+            {
+                "name": name,
+                "baseline": before[metric],
+                "current": result[metric],
+                "ratio": (
+                    result[metric] / before[metric]
+                    if before[metric] > 0
+                    else float("inf")
+                ),
+                "rows_changed": before["rows"] != result["rows"],
+            }
+        )
+    return sorted(cases, key=lambda c: c["ratio"], reverse=True)
+
+
+def differences(baseline: dict[str, Any], current: dict[str, Any]) -> list[str]:
+    """Setup differences that make timings incomparable"""
+    warnings = []
+    if baseline["dataset"]["rows"] != current["dataset"]["rows"]:
+        warnings.append("datasets have different row counts")
+    if baseline["dataset"]["config"] != current["dataset"]["config"]:
+        warnings.append("datasets were generated with different settings")
+    for key in ["postgres", "pg_trgm", "python"]:
+        if baseline["environment"][key] != current["environment"][key]:
+            warnings.append(key + " differs")
+    return warnings
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Compare two benchmark suite reports")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.25,
+        help="Ratio above which a case counts as a regression",
+    )
+    parser.add_argument("--metric", default="median_ms")
+    args = parser.parse_args()
+
+    baseline, current = load_report(args.baseline), load_report(args.current)
+    print(
+        "baseline "
+        + str(baseline["git"]["commit"])
+        + " -> current "
+        + str(current["git"]["commit"])
+    )
+    for warning in differences(baseline, current):
+        print("warning: " + warning)
+
+    cases = compare(baseline, current, args.metric)
+    width = max([len(c["name"]) for c in cases], default=0)
+    regressions = 0
+    for case in cases:
+        flag = ""
+        if case["ratio"] > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif case["ratio"] < 1 / args.threshold:
+            flag = "  faster"
+        if case["rows_changed"]:
+            flag += "  (rows changed)"
+        print(
+            case["name"].ljust(width)
+            + f"  {case['baseline']:10.3f}  {case['current']:10.3f}  {case['ratio']:6.2f}x"
+            + flag
+        )
+    print(
+        str(regressions)
+        + " of "
+        + str(len(cases))
+        + " cases slower than "
+        + str(args.threshold)
+        + "x"
+    )
+    sys.exit(1 if regressions > 0 else 0)
@@ -0,0 +1,124 @@
+from argparse import ArgumentParser
+from statistics import median
+from time import perf_counter
+from typing import Optional
+import json
+from psycopg import Connection, connect
+from util.orm import ORM, SearchCondition, search_internal
+from app_types import BookRecord
+from app_types.book import BOOK_FMT, BOOK_FMT_COUNT, contributor_condition
+
+"""
+SUMMARY:
+Benchmark for the author/publisher filters of BookRecord.search.
+Times a first page + total of view_books_vid for each name, using the old
+nested IN / triple ILIKE condition and the current join on the normalized
+contributors.search_name column (migration 003). Result caching is off.
+
+Usage: python -m benchmarks.contributor_filter [--dsn <conninfo>] [--runs 10] [--explain] [names...]
+Without --dsn, connects with the app's .env settings.
+"""
+
+
+# Condition shapes from before migration 003, kept only for comparison
+def legacy_author_condition(name: str) -> SearchCondition:
+    return SearchCondition(
+        "id IN (SELECT book_id FROM books_authors AS aus WHERE contributor_id IN (SELECT contributors.id FROM contributors WHERE name_last_company ilike %s OR name_first ilike %s OR name_first || ' ' || name_last_company ilike %s))",
+        ["%%" + name + "%%", "%%" + name + "%%", "%%" + name + "%%"],
+    )
+
+
+def legacy_publisher_condition(name: str) -> SearchCondition:
+    return SearchCondition(
+        "id IN (SELECT book_id FROM books_publishers AS pubs WHERE contributor_id IN (SELECT contributors.id FROM contributors WHERE name_last_company ilike %s))",
+        ["%%" + name + "%%"],
+    )
+
+
+def run(orm: ORM, condition: SearchCondition, runs: int) -> dict[str, float]:
+    """Times a search with a single condition
+
+    Args:
+        orm (ORM): ORM object
+        condition (SearchCondition): Filter to time
+        runs (int): Timed repetitions (after one warm-up)
+
+    Returns:
+        dict[str, float]: Median/min milliseconds & the result total
+    """
+    timings = []
+    for i in range(runs + 1):
+        start = perf_counter()
+        result = search_internal(
+            orm,
+            "books",
+            BookRecord._from_search,
+            [condition],
+            [["title", "ASC"]],
+            0,
+            25,
+            format_query=BOOK_FMT,
+            format_count_query=BOOK_FMT_COUNT,
+            cache=False,
+        )
+        if i > 0:
+            timings.append((perf_counter() - start) * 1000)
+    return {"median_ms": median(timings), "min_ms": min(timings), "total": result.total}
+
+
+def explain(db: Connection, condition: SearchCondition) -> str:
+    cursor = db.execute(
+        "EXPLAIN ANALYZE SELECT COUNT(id) FROM view_books_vid WHERE "
+        + condition.condition,
+        condition.fields,
+    )
+    plan = "\n".join([r[0] for r in cursor.fetchall()])
+    cursor.close()
+    return plan
+
+
+def open_orm(dsn: Optional[str]) -> ORM:
+    if dsn != None:
+        return ORM(connect(dsn))
+    from util.context import ApplicationContext
+
+    return ApplicationContext().orm
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Compare contributor name filter shapes")
+    parser.add_argument("names", nargs="*", default=["king", "stephen king", "son"])
+    parser.add_argument("--dsn", default=None)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--explain", action="store_true")
+    args = parser.parse_args()
+
+    orm = open_orm(args.dsn)
+    results = []
+    for name in args.names:
+        for role, legacy, current in [
+            (
+                "author",
+                legacy_author_condition(name),
+                contributor_condition("books_authors", name),
+            ),
+            (
+                "publisher",
+                legacy_publisher_condition(name),
+                contributor_condition("books_publishers", name),
+            ),
+        ]:
+            entry = {
+                "name": name,
+                "role": role,
+                "legacy": run(orm, legacy, args.runs),
+                "search_name": run(orm, current, args.runs),
+            }
+            entry["speedup"] = (
+                entry["legacy"]["median_ms"] / entry["search_name"]["median_ms"]
+            )
+            if args.explain:
+                entry["legacy_plan"] = explain(orm.db, legacy)
+                entry["search_name_plan"] = explain(orm.db, current)
+            results.append(entry)
+    print(json.dumps(results, indent=4))
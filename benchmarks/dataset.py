@@ -0,0 +1,666 @@
+from argparse import ArgumentParser
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from datetime import datetime
+from math import gcd
+from multiprocessing import get_context
+from os import cpu_count
+from time import perf_counter
+from typing import Any, Optional, Sequence
+import json
+import numpy as np
+from psycopg import Connection, connect
+from benchmarks.postgres import apply_schema
+
+"""
+SUMMARY:
+Synthetic dataset generator, filling every table app_types reads at up to production volume.
+Usage: python -m benchmarks.dataset --dsn <conninfo> [--scale 10k|1m|10m] [--schema] [--workers N]
+    [--seed 0] [--anchor YYYY-MM-DD] [--books N] [--users N]
+(--schema applies sql/schema.sql & the migrations first, the database must then be empty)
+
+Distributions are skewed like real usage: book popularity (ratings, sessions, collections),
+followed users, author output & genres follow power laws, per-user activity is log-normal
+(a few heavy users, a long tail of light ones) and sessions are weighted towards the
+last few months before the anchor date, so the 90-day & monthly rollups have data when the
+anchor is recent (the windows are relative to now(), pass --anchor to move the data up).
+Rows are generated in fixed-size chunks of books, users or contributors, each from its own
+numpy generator seeded with (seed, stream, chunk), so the dataset only depends on the
+config, never on the number of workers. Chunks are generated & COPYed by parallel worker
+processes, each on its own connection. Secondary indexes are dropped during the load and
+rebuilt afterwards (in parallel), then the ID sequences, rollups & statistics are updated.
+The word lists below are also used by the benchmark suite for its filter values.
+"""
+
+TITLE_WORDS = [
+    "night", "river", "shadow", "garden", "winter", "empire", "secret", "house",
+    "stone", "light", "silent", "glass", "storm", "crown", "letters", "ocean",
+    "forest", "memory", "iron", "summer", "lost", "hidden", "broken", "golden",
+    "city", "war", "dream", "fire", "song", "wolf", "island", "mirror",
+]
+FIRST_NAMES = [
+    "james", "mary", "robert", "patricia", "john", "jennifer", "michael", "linda",
+    "david", "elizabeth", "william", "barbara", "richard", "susan", "joseph",
+    "jessica", "thomas", "sarah", "charles", "karen", "stephen", "nancy", "daniel",
+    "lisa",
+]
+LAST_NAMES = [
+    "smith", "johnson", "williams", "brown", "jones", "garcia", "miller", "davis",
+    "rodriguez", "martinez", "hernandez", "lopez", "gonzalez", "wilson", "anderson",
+    "thomas", "taylor", "moore", "jackson", "martin", "lee", "king", "wright",
+    "scott",
+]
+PUBLISHER_SUFFIXES = ["Press", "Books", "House", "Publishing", "Editions"]
+# Most to least common
+GENRES = [
+    "Fantasy", "Science Fiction", "Mystery", "Thriller", "Romance", "Horror",
+    "Historical Fiction", "Literary Fiction", "Biography", "History", "Poetry",
+    "Drama", "Adventure", "Young Adult", "Graphic Novel", "Philosophy", "Science",
+    "Travel", "Cooking", "Self Help",
+]
+AUDIENCES = ["Children", "Middle Grade", "Teen", "Adult", "Academic"]
+AUDIENCE_WEIGHTS = [0.15, 0.15, 0.2, 0.45, 0.05]
+EDITIONS = ["First", "Second", "Third", "Revised", "Anniversary", "Illustrated", None]
+EDITION_WEIGHTS = [0.5, 0.12, 0.05, 0.08, 0.03, 0.02, 0.2]
+RATING_WEIGHTS = [0.05, 0.08, 0.2, 0.37, 0.3]
+
+# Power law exponents, higher is more concentrated on the top items
+BOOK_SKEW = 1.0
+FOLLOW_SKEW = 1.1
+AUTHOR_SKEW = 0.8
+PUBLISHER_SKEW = 1.2
+GENRE_SKEW = 0.9
+# Spread of the log-normal per-user activity counts
+ACTIVITY_SIGMA = 1.0
+# Mean age of sessions & of releases, in days
+SESSION_AGE_DAYS = 90
+RELEASE_AGE_DAYS = 15 * 365
+
+# Entities per generated chunk, part of the dataset definition (changing them changes the rows)
+CONTRIBUTOR_CHUNK = 200_000
+BOOK_CHUNK = 100_000
+USER_CHUNK = 20_000
+# Rows per COPY write
+COPY_BATCH = 50_000
+
+# Random streams
+CONTRIBUTORS, BOOKS, USERS, ACTIVITY = range(4)
+
+# Tables filled by the generator, in the order their chunks write them
+TABLES = [
+    "genres",
+    "audiences",
+    "contributors",
+    "books",
+    "books_authors",
+    "books_editors",
+    "books_publishers",
+    "books_genres",
+    "books_audiences",
+    "users",
+    "users_following",
+    "collections",
+    "users_collections",
+    "books_collections",
+    "users_ratings",
+    "users_sessions",
+]
+
+
+# Fixed, so datasets generated on different days are identical
+DEFAULT_ANCHOR = datetime(2026, 1, 1)
+
+
+@dataclass
+class DatasetConfig:
+    books: int = 10_000
+    users: int = 2_000
+    # People, authors & editors are drawn from them
+    contributors: int = 5_000
+    publishers: int = 200
+    # Per-user means
+    ratings_per_user: float = 20
+    follows_per_user: float = 10
+    collections_per_user: float = 2
+    books_per_collection: float = 15
+    sessions_per_user: float = 30
+    seed: int = 0
+    anchor: datetime = DEFAULT_ANCHOR
+
+    def dict(self) -> dict[str, Any]:
+        return {
+            k: (v.isoformat() if isinstance(v, datetime) else v)
+            for k, v in self.__dict__.items()
+        }
+
+
+# Sizes by number of books, per-user activity stays the same
+SCALES = {
+    "10k": DatasetConfig(),
+    "1m": DatasetConfig(
+        books=1_000_000, users=100_000, contributors=300_000, publishers=5_000
+    ),
+    "10m": DatasetConfig(
+        books=10_000_000, users=1_000_000, contributors=2_000_000, publishers=20_000
+    ),
+}
+
+
+def from_scale(scale: str, **overrides) -> DatasetConfig:
+    """Config of a scale preset, with fields replaced by the non-None overrides"""
+    return replace(SCALES[scale], **{k: v for k, v in overrides.items() if v != None})
+
+
+def stream(config: DatasetConfig, kind: int, chunk: int) -> np.random.Generator:
+    return np.random.default_rng([config.seed, kind, chunk])
+
+
+def chunks(total: int, size: int) -> list[tuple[int, int]]:
+    """(first, last) IDs of each chunk, IDs start at 1 and last is exclusive"""
+    return [
+        (start, min(start + size, total + 1)) for start in range(1, total + 1, size)
+    ]
+
+
+def zipf(rng: np.random.Generator, n: int, s: float, size: int) -> np.ndarray:
+    """Ranks in [0, n) with P(rank) ~ 1 / (rank + 1)^s, through the inverse CDF of
+        the continuous power law (no per-item table, so it works for 10M items)
+
+    Args:
+        rng (np.random.Generator): Random stream
+        n (int): Number of items
+        s (float): Exponent
+        size (int): Number of draws
+
+    Returns:
+        np.ndarray: Ranks
+    """
+    u = rng.random(size)
+    if abs(s - 1) < 1e-9:
+        ranks = np.exp(u * np.log(n + 1))
+    else:
+        ranks = (((n + 1) ** (1 - s) - 1) * u + 1) ** (1 / (1 - s))
+    return np.minimum(ranks.astype(np.int64) - 1, n - 1)
+
+
+def scatter(n: int) -> int:
+    """Multiplier coprime with n, so rank * multiplier % n spreads popular ranks over the ID range"""
+    multiplier = max(1, int(n * 0.6180339887))
+    while gcd(multiplier, n) != 1:
+        multiplier += 1
+    return multiplier
+
+
+def popular(rng: np.random.Generator, n: int, s: float, size: int) -> np.ndarray:
+    """IDs (1 to n) drawn by power law popularity, the most popular aren't the lowest IDs"""
+    return (zipf(rng, n, s, size) * scatter(n) + n // 3) % n + 1
+
+
+def activity_counts(
+    rng: np.random.Generator, mean: float, size: int, cap: int
+) -> np.ndarray:
+    """Log-normal counts with the given mean"""
+    if mean <= 0 or cap <= 0:
+        return np.zeros(size, dtype=np.int64)
+    mu = np.log(mean) - ACTIVITY_SIGMA**2 / 2
+    counts = np.rint(rng.lognormal(mu, ACTIVITY_SIGMA, size)).astype(np.int64)
+    return np.minimum(counts, cap)
+
+
+def unique_pairs(
+    left: np.ndarray, right: np.ndarray, width: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Distinct (left, right) pairs, sorted, right must be below width"""
+    keys = np.unique(left.astype(np.int64) * width + right)
+    return keys // width, keys % width
+
+
+def timestamps(anchor: datetime, seconds_before: np.ndarray) -> np.ndarray:
+    """Timestamps as COPY text, seconds before the anchor"""
+    return (
+        np.datetime64(anchor, "s") - seconds_before.astype("timedelta64[s]")
+    ).astype(str)
+
+
+def words(rng: np.random.Generator, choices: Sequence[str], size: int) -> np.ndarray:
+    return np.array(choices)[rng.integers(0, len(choices), size)]
+
+
+def text(values: Any) -> list[str]:
+    """Column values as COPY text"""
+    return np.asarray(values).astype(str).tolist()
+
+
+def activity(config: DatasetConfig, chunk: int) -> dict[str, np.ndarray]:
+    """Per-user activity counts of a user chunk, from their own stream so the loader
+    can compute collection & session ID offsets without generating the rows"""
+    first, last = chunks(config.users, USER_CHUNK)[chunk]
+    size = last - first
+    rng = stream(config, ACTIVITY, chunk)
+    return {
+        "follows": activity_counts(
+            rng, config.follows_per_user, size, config.users - 1
+        ),
+        "collections": rng.poisson(config.collections_per_user, size),
+        "ratings": activity_counts(rng, config.ratings_per_user, size, config.books),
+        "sessions": activity_counts(rng, config.sessions_per_user, size, 10_000),
+    }
+
+
+def contributor_rows(config: DatasetConfig, chunk: int) -> list[tuple]:
+    first, last = chunks(config.contributors + config.publishers, CONTRIBUTOR_CHUNK)[
+        chunk
+    ]
+    rng = stream(config, CONTRIBUTORS, chunk)
+    ids = np.arange(first, last)
+    size = len(ids)
+    person = ids <= config.contributors
+    firsts = words(rng, [n.capitalize() for n in FIRST_NAMES], size)
+    lasts = words(rng, [n.capitalize() for n in LAST_NAMES], size)
+    companies = np.char.add(
+        np.char.add(lasts, " "), words(rng, PUBLISHER_SUFFIXES, size)
+    )
+    return [
+        (
+            "contributors",
+            ["id", "name_first", "name_last_company"],
+            [
+                text(ids),
+                text(np.where(person, firsts, "\\N")),
+                text(np.where(person, lasts, companies)),
+            ],
+        )
+    ]
+
+
+def book_rows(config: DatasetConfig, chunk: int) -> list[tuple]:
+    first, last = chunks(config.books, BOOK_CHUNK)[chunk]
+    rng = stream(config, BOOKS, chunk)
+    ids = np.arange(first, last)
+    size = len(ids)
+
+    lengths = rng.integers(1, 5, size)
+    picks = rng.integers(0, len(TITLE_WORDS), (size, 4))
+    vocabulary = [w.capitalize() for w in TITLE_WORDS]
+    titles = [
+        " ".join([vocabulary[w] for w in picks[i, : lengths[i]]]) for i in range(size)
+    ]
+    pages = np.clip(np.rint(rng.lognormal(np.log(300), 0.5, size)), 20, 2000)
+    editions = rng.choice(len(EDITIONS), size, p=EDITION_WEIGHTS)
+    released = np.minimum(rng.exponential(RELEASE_AGE_DAYS, size), 100 * 365)
+
+    people = config.contributors
+    width = config.contributors + config.publishers + 1
+    authors = np.minimum(rng.geometric(0.7, size), 5)
+    author_books, author_ids = unique_pairs(
+        np.repeat(ids, authors),
+        popular(rng, people, AUTHOR_SKEW, int(authors.sum())),
+        width,
+    )
+    edited = ids[rng.random(size) < 0.3]
+    editor_ids = popular(rng, people, AUTHOR_SKEW, len(edited))
+    publisher_ids = people + popular(rng, config.publishers, PUBLISHER_SKEW, size)
+    genres = np.minimum(rng.geometric(0.6, size), 4)
+    genre_books, genre_ids = unique_pairs(
+        np.repeat(ids, genres),
+        zipf(rng, len(GENRES), GENRE_SKEW, int(genres.sum())) + 1,
+        len(GENRES) + 1,
+    )
+    audiences = rng.choice(len(AUDIENCES), size, p=AUDIENCE_WEIGHTS) + 1
+
+    return [
+        (
+            "books",
+            ["id", "title", "length", "edition", "release_dt", "isbn"],
+            [
+                text(ids),
+                titles,
+                text(pages.astype(np.int64)),
+                [EDITIONS[e] if EDITIONS[e] != None else "\\N" for e in editions],
+                text(timestamps(config.anchor, (released * 86400).astype(np.int64))),
+                text(ids + 9780000000000),
+            ],
+        ),
+        (
+            "books_authors",
+            ["book_id", "contributor_id"],
+            [text(author_books), text(author_ids)],
+        ),
+        (
+            "books_editors",
+            ["book_id", "contributor_id"],
+            [text(edited), text(editor_ids)],
+        ),
+        (
+            "books_publishers",
+            ["book_id", "contributor_id"],
+            [text(ids), text(publisher_ids)],
+        ),
+        ("books_genres", ["book_id", "genre_id"], [text(genre_books), text(genre_ids)]),
+        ("books_audiences", ["book_id", "audience_id"], [text(ids), text(audiences)]),
+    ]
+
+
+def user_rows(
+    config: DatasetConfig, chunk: int, collection_start: int, session_start: int
+) -> list[tuple]:
+    first, last = chunks(config.users, USER_CHUNK)[chunk]
+    rng = stream(config, USERS, chunk)
+    counts = activity(config, chunk)
+    ids = np.arange(first, last)
+    size = len(ids)
+
+    first_names = words(rng, FIRST_NAMES, size)
+    last_names = words(rng, LAST_NAMES, size)
+    # Sign-ups skew recent, last access is somewhere since
+    joined = np.minimum(rng.exponential(365, size), 10 * 365) * 86400
+    accessed = joined * rng.random(size)
+    emails = np.char.add(
+        np.char.add(
+            np.char.add(np.char.add(first_names, "."), last_names), ids.astype(str)
+        ),
+        "@example.com",
+    )
+
+    followers, followed = unique_pairs(
+        np.repeat(ids, counts["follows"]),
+        popular(rng, config.users, FOLLOW_SKEW, int(counts["follows"].sum())),
+        config.users + 1,
+    )
+    keep = followers != followed
+    followers, followed = followers[keep], followed[keep]
+
+    collection_ids = collection_start + np.arange(int(counts["collections"].sum()))
+    owners = np.repeat(ids, counts["collections"])
+    # Position of each collection among its owner's
+    numbers = np.arange(len(owners)) - np.repeat(
+        np.cumsum(counts["collections"]) - counts["collections"], counts["collections"]
+    )
+    sizes = activity_counts(
+        rng, config.books_per_collection, len(collection_ids), config.books
+    )
+    member_collections, member_books = unique_pairs(
+        np.repeat(collection_ids, sizes),
+        popular(rng, config.books, BOOK_SKEW, int(sizes.sum())),
+        config.books + 1,
+    )
+
+    rating_users, rating_books = unique_pairs(
+        np.repeat(ids, counts["ratings"]),
+        popular(rng, config.books, BOOK_SKEW, int(counts["ratings"].sum())),
+        config.books + 1,
+    )
+    ratings = rng.choice(5, len(rating_users), p=RATING_WEIGHTS) + 1
+
+    session_count = int(counts["sessions"].sum())
+    started = np.minimum(
+        rng.exponential(SESSION_AGE_DAYS * 86400, session_count), 3 * 365 * 86400
+    ).astype(np.int64)
+    minutes = rng.integers(5, 181, session_count)
+    start_pages = rng.integers(1, 500, session_count)
+
+    return [
+        (
+            "users",
+            [
+                "id",
+                "creation_dt",
+                "access_dt",
+                "name_first",
+                "name_last",
+                "email",
+                "password",
+            ],
+            [
+                text(ids),
+                text(timestamps(config.anchor, joined.astype(np.int64))),
+                text(timestamps(config.anchor, accessed.astype(np.int64))),
+                text(np.char.capitalize(first_names)),
+                text(np.char.capitalize(last_names)),
+                text(emails),
+                text(np.char.add("password", ids.astype(str))),
+            ],
+        ),
+        (
+            "users_following",
+            ["user_id", "following_id"],
+            [text(followers), text(followed)],
+        ),
+        (
+            "collections",
+            ["id", "name"],
+            [
+                text(collection_ids),
+                text(np.char.add("Collection ", (numbers + 1).astype(str))),
+            ],
+        ),
+        (
+            "users_collections",
+            ["user_id", "collection_id"],
+            [text(owners), text(collection_ids)],
+        ),
+        (
+            "books_collections",
+            ["book_id", "collection_id"],
+            [text(member_books), text(member_collections)],
+        ),
+        (
+            "users_ratings",
+            ["user_id", "book_id", "rating"],
+            [text(rating_users), text(rating_books), text(ratings)],
+        ),
+        (
+            "users_sessions",
+            [
+                "session_id",
+                "book_id",
+                "user_id",
+                "start_datetime",
+                "end_datetime",
+                "start_page",
+                "end_page",
+            ],
+            [
+                text(session_start + np.arange(session_count)),
+                text(popular(rng, config.books, BOOK_SKEW, session_count)),
+                text(np.repeat(ids, counts["sessions"])),
+                text(timestamps(config.anchor, started)),
+                text(timestamps(config.anchor, started - minutes * 60)),
+                text(start_pages),
+                text(start_pages + rng.integers(1, 61, session_count)),
+            ],
+        ),
+    ]
+
+
+def write_table(
+    db: Connection, table: str, columns: list[str], values: list[list[str]]
+) -> int:
+    """COPYs column-wise text values (\\N for NULL)
+
+    Args:
+        db (Connection): Database
+        table (str): Table name
+        columns (list[str]): Columns, in the order of values
+        values (list[list[str]]): One list of values per column
+
+    Returns:
+        int: Rows written
+    """
+    rows = len(values[0])
+    with db.cursor() as cursor:
+        with cursor.copy(
+            "COPY " + table + " (" + ", ".join(columns) + ") FROM STDIN"
+        ) as copy:
+            for start in range(0, rows, COPY_BATCH):
+                batch = [v[start : start + COPY_BATCH] for v in values]
+                copy.write("".join(["\t".join(r) + "\n" for r in zip(*batch)]))
+    return rows
+
+
+def load_chunk(
+    conninfo: str, config: DatasetConfig, kind: int, chunk: int, *offsets: int
+) -> dict[str, int]:
+    """Generates & writes one chunk in a single transaction (runs in a worker process)"""
+    if kind == CONTRIBUTORS:
+        tables = contributor_rows(config, chunk)
+    elif kind == BOOKS:
+        tables = book_rows(config, chunk)
+    else:
+        tables = user_rows(config, chunk, *offsets)
+    counts = {}
+    with connect(conninfo) as db:
+        for table, columns, values in tables:
+            counts[table] = write_table(db, table, columns, values)
+        db.commit()
+    return counts
+
+
+def drop_indexes(db: Connection) -> list[str]:
+    """Drops the generated tables' indexes that don't back a constraint
+
+    Returns:
+        list[str]: Their definitions, to recreate them after loading
+    """
+    cursor = db.execute(
+        """
+        SELECT indexrelid::regclass::text, pg_get_indexdef(indexrelid) FROM pg_index
+        WHERE indrelid = ANY(%s::regclass[])
+        AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conindid = indexrelid)
+        """,
+        [TABLES],
+    )
+    indexes = cursor.fetchall()
+    cursor.close()
+    for name, _ in indexes:
+        db.execute("DROP INDEX " + name)
+    return [definition for _, definition in indexes]
+
+
+def create_index(conninfo: str, definition: str):
+    with connect(conninfo, autocommit=True) as db:
+        db.execute(definition)
+
+
+def finish(db: Connection):
+    """Moves the ID sequences past the loaded rows, refreshes the rollups & analyzes"""
+    for table, column in [
+        ("users", "id"),
+        ("collections", "id"),
+        ("users_sessions", "session_id"),
+    ]:
+        db.execute(
+            "SELECT setval(pg_get_serial_sequence(%s, %s), COALESCE((SELECT MAX("
+            + column
+            + ") FROM "
+            + table
+            + "), 0) + 1, false)",
+            [table, column],
+        )
+    db.execute("REFRESH MATERIALIZED VIEW books_sessions_90")
+    db.execute("REFRESH MATERIALIZED VIEW books_sessions_month")
+    db.execute("UPDATE rollup_refreshes SET refreshed_at = now(), duration_ms = 0")
+    db.commit()
+    db.autocommit = True
+    db.execute("ANALYZE")
+    db.autocommit = False
+
+
+def load(
+    conninfo: str, config: DatasetConfig, workers: Optional[int] = None
+) -> dict[str, int]:
+    """Generates & loads a dataset into an empty schema (benchmarks/postgres.py apply_schema)
+
+    Args:
+        conninfo (str): Database to fill
+        config (DatasetConfig): Dataset to generate
+        workers (Optional[int], optional): Parallel worker processes. Defaults to the CPU count.
+
+    Returns:
+        dict[str, int]: Rows loaded per table
+    """
+    workers = workers if workers != None else cpu_count() or 1
+    counts = Counter()
+    with connect(conninfo, autocommit=True) as db:
+        indexes = drop_indexes(db)
+        counts["genres"] = write_table(
+            db, "genres", ["id", "name"], [text(np.arange(1, len(GENRES) + 1)), GENRES]
+        )
+        counts["audiences"] = write_table(
+            db,
+            "audiences",
+            ["id", "name"],
+            [text(np.arange(1, len(AUDIENCES) + 1)), AUDIENCES],
+        )
+
+    tasks = [
+        (CONTRIBUTORS, i)
+        for i in range(
+            len(chunks(config.contributors + config.publishers, CONTRIBUTOR_CHUNK))
+        )
+    ] + [(BOOKS, i) for i in range(len(chunks(config.books, BOOK_CHUNK)))]
+    # Collection & session IDs continue from the previous user chunk
+    collection_start, session_start = 1, 1
+    for i in range(len(chunks(config.users, USER_CHUNK))):
+        tasks.append((USERS, i, collection_start, session_start))
+        counts_chunk = activity(config, i)
+        collection_start += int(counts_chunk["collections"].sum())
+        session_start += int(counts_chunk["sessions"].sum())
+
+    try:
+        with ProcessPoolExecutor(workers, mp_context=get_context("spawn")) as executor:
+            futures = [executor.submit(load_chunk, conninfo, config, *t) for t in tasks]
+            for future in futures:
+                counts.update(future.result())
+    finally:
+        with ThreadPoolExecutor(workers) as executor:
+            list(executor.map(lambda d: create_index(conninfo, d), indexes))
+
+    with connect(conninfo) as db:
+        finish(db)
+    return {t: counts.get(t, 0) for t in TABLES}
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Generate a synthetic dataset")
+    parser.add_argument("--dsn", required=True, help="Database to fill")
+    parser.add_argument("--scale", choices=list(SCALES.keys()), default="10k")
+    parser.add_argument(
+        "--schema",
+        action="store_true",
+        help="Apply sql/schema.sql & the migrations first (the database must be empty)",
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--anchor",
+        default=None,
+        help="Date the dataset is relative to (YYYY-MM-DD). Defaults to "
+        + DEFAULT_ANCHOR.strftime("%Y-%m-%d"),
+    )
+    parser.add_argument("--books", type=int, default=None)
+    parser.add_argument("--users", type=int, default=None)
+    args = parser.parse_args()
+
+    config = from_scale(
+        args.scale,
+        books=args.books,
+        users=args.users,
+        seed=args.seed,
+        anchor=datetime.strptime(args.anchor, "%Y-%m-%d") if args.anchor else None,
+    )
+    start = perf_counter()
+    if args.schema:
+        apply_schema(args.dsn)
+    rows = load(args.dsn, config, args.workers)
+    print(
+        json.dumps(
+            {
+                "config": config.dict(),
+                "rows": rows,
+                "seconds": round(perf_counter() - start, 2),
+            },
+            indent=4,
+        )
+    )
@@ -0,0 +1,184 @@
+from os import environ, geteuid, listdir, path
+from shutil import rmtree, which
+from tempfile import mkdtemp
+from typing import Optional
+import re
+import subprocess
+from psycopg import Connection, connect
+
+"""
+SUMMARY:
+Throwaway Postgres clusters & schema setup for the benchmarks.
+EphemeralPostgres runs initdb into a temporary directory and starts a server that
+only listens on a unix socket inside it. Durability is off (fsync, synchronous_commit,
+full_page_writes), which speeds up loading but doesn't change query plans.
+The binaries are looked up in PG_BIN, then PATH, then pg_config --bindir.
+apply_schema() creates sql/schema.sql then runs sql/migrations in order, skipping the
+pg_trgm statements if the server doesn't ship the extension.
+"""
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+SCHEMA_FILE = path.join(ROOT, "sql", "schema.sql")
+MIGRATIONS_DIR = path.join(ROOT, "sql", "migrations")
+
+SERVER_OPTIONS = [
+    "listen_addresses=''",
+    "fsync=off",
+    "synchronous_commit=off",
+    "full_page_writes=off",
+    "max_connections=64",
+]
+
+
+def find_bin_dir(bin_dir: Optional[str] = None) -> str:
+    """Directory holding initdb/pg_ctl
+
+    Args:
+        bin_dir (Optional[str], optional): Explicit directory. Defaults to PG_BIN, then PATH, then pg_config.
+
+    Raises:
+        FileNotFoundError: Raised if initdb can't be found
+
+    Returns:
+        str: Binary directory
+    """
+    bin_dir = bin_dir if bin_dir != None else environ.get("PG_BIN")
+    if bin_dir != None:
+        if not path.exists(path.join(bin_dir, "initdb")):
+            raise FileNotFoundError("No initdb in " + bin_dir)
+        return bin_dir
+    initdb = which("initdb")
+    if initdb != None:
+        return path.dirname(initdb)
+    if which("pg_config") != None:
+        bin_dir = subprocess.run(
+            ["pg_config", "--bindir"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        if path.exists(path.join(bin_dir, "initdb")):
+            return bin_dir
+    raise FileNotFoundError(
+        "Postgres binaries not found, set PG_BIN (or pass --dsn to use a running server)"
+    )
+
+
+class EphemeralPostgres:
+    def __init__(self, bin_dir: Optional[str] = None, keep: bool = False) -> None:
+        """Temporary cluster, started on enter & removed on exit
+
+        Args:
+            bin_dir (Optional[str], optional): Postgres binary directory. Defaults to find_bin_dir().
+            keep (bool, optional): Leave the data directory behind (its path is in self.directory). Defaults to False.
+        """
+        self.bin_dir = find_bin_dir(bin_dir)
+        self.keep = keep
+        self.directory: Optional[str] = None
+
+    @property
+    def data_dir(self) -> str:
+        return path.join(self.directory, "data")
+
+    def conninfo(self, database: str = "postgres") -> str:
+        return "host=" + self.directory + " dbname=" + database + " user=postgres"
+
+    def run(self, name: str, *args: str):
+        subprocess.run(
+            [path.join(self.bin_dir, name), *args],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+
+    def start(self) -> "EphemeralPostgres":
+        if geteuid() == 0:
+            raise PermissionError(
+                "Postgres refuses to run as root, run as another user or pass --dsn"
+            )
+        self.directory = mkdtemp(prefix="bench-pg-")
+        try:
+            self.run(
+                "initdb",
+                "-D",
+                self.data_dir,
+                "-U",
+                "postgres",
+                "--auth=trust",
+                "--encoding=UTF8",
+                "--no-sync",
+            )
+            options = " ".join(["-c " + o for o in SERVER_OPTIONS])
+            self.run(
+                "pg_ctl",
+                "-D",
+                self.data_dir,
+                "-l",
+                path.join(self.directory, "server.log"),
+                "-o",
+                options + " -k " + self.directory,
+                "-w",
+                "start",
+            )
+        except:
+            self.cleanup()
+            raise
+        return self
+
+    def stop(self):
+        if self.directory == None:
+            return
+        try:
+            self.run("pg_ctl", "-D", self.data_dir, "-m", "immediate", "-w", "stop")
+        finally:
+            self.cleanup()
+
+    def cleanup(self):
+        if not self.keep and self.directory != None:
+            rmtree(self.directory, ignore_errors=True)
+        self.directory = None
+
+    def __enter__(self) -> "EphemeralPostgres":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def split_statements(script: str) -> list[str]:
+    """Splits a SQL file into statements (the schema files have no function bodies)"""
+    script = re.sub(r"--[^\n]*", "", script)
+    return [s.strip() for s in script.split(";") if s.strip() != ""]
+
+
+def has_trigram(db: Connection) -> bool:
+    """Whether the server can create the pg_trgm extension"""
+    cursor = db.execute(
+        "SELECT COUNT(*) FROM pg_available_extensions WHERE name = 'pg_trgm'"
+    )
+    available = cursor.fetchone()[0] > 0
+    cursor.close()
+    return available
+
+
+def apply_schema(conninfo: str) -> dict[str, bool]:
+    """Creates the base tables & runs every migration
+
+    Args:
+        conninfo (str): Empty database to set up
+
+    Returns:
+        dict[str, bool]: Setup details, ie whether pg_trgm (and its indexes) exist
+    """
+    with connect(conninfo, autocommit=True) as db:
+        trigram = has_trigram(db)
+        files = [SCHEMA_FILE] + [
+            path.join(MIGRATIONS_DIR, f)
+            for f in sorted(listdir(MIGRATIONS_DIR))
+            if f.endswith(".sql")
+        ]
+        for file in files:
+            with open(file) as f:
+                statements = split_statements(f.read())
+            for statement in statements:
+                if not trigram and "trgm" in statement:
+                    continue
+                db.execute(statement)
+    return {"pg_trgm": trigram}
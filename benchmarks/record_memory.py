@@ -0,0 +1,95 @@
+from argparse import ArgumentParser
+from datetime import datetime
+from typing import Any, Callable
+import gc
+import json
+import tracemalloc
+from app_types import BookRecord
+
+"""
+SUMMARY:
+Memory benchmark for the Record layout.
+Compares the old dict-based layout (db/table/orm + a relation cache dict on
+every instance) with the current slotted BookRecord.
+
+Usage: python -m benchmarks.record_memory [--count 100000]
+"""
+
+
+# Replica of the pre-slots BookRecord layout, kept only for comparison
+class LegacyBookRecord:
+    def __init__(
+        self,
+        db: Any,
+        table: str,
+        orm: Any,
+        id: int,
+        title: str,
+        length: int,
+        edition: str,
+        release_dt: datetime,
+        isbn: int,
+    ) -> None:
+        self.db = db
+        self.table = table
+        self.orm = orm
+        self.id = id
+        self.title = title
+        self.length = length
+        self.edition = edition
+        self.release_dt = release_dt
+        self.isbn = isbn
+        self.cache = {
+            "authors": None,
+            "editors": None,
+            "publishers": None,
+            "audiences": None,
+            "genres": None,
+            "ratings": None,
+        }
+
+
+def measure(factory: Callable[..., Any], count: int) -> dict[str, float]:
+    """Builds count records & measures the memory they hold
+
+    Args:
+        factory (Callable[..., Any]): Record class
+        count (int): Number of records
+
+    Returns:
+        dict[str, float]: Total bytes & bytes per record
+    """
+    # Column values are shared so only the record layout is measured
+    release = datetime(2000, 1, 1)
+    titles = [f"Book {i}" for i in range(count)]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = [
+        factory(None, "books", None, i, titles[i], 300, "First", release, i)
+        for i in range(count)
+    ]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del records
+    return {"bytes": after - before, "bytes_per_record": (after - before) / count}
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Compare Record memory layouts")
+    parser.add_argument("--count", type=int, default=100_000)
+    args = parser.parse_args()
+
+    legacy = measure(LegacyBookRecord, args.count)
+    slotted = measure(BookRecord, args.count)
+    print(
+        json.dumps(
+            {
+                "count": args.count,
+                "legacy": legacy,
+                "slotted": slotted,
+                "ratio": slotted["bytes"] / legacy["bytes"],
+            },
+            indent=4,
+        )
+    )
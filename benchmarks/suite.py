@@ -0,0 +1,529 @@
+from argparse import ArgumentParser
+from dataclasses import fields
+from datetime import datetime, timezone
+from itertools import combinations, cycle
+from statistics import mean, median
+from time import perf_counter
+from typing import Any, Callable, Optional
+import json
+import platform
+import subprocess
+import sys
+from psycopg import Connection, connect
+from util.orm import ORM, search_internal
+from util.affinity import GenreAffinityEngine
+from util.instrument import percentile
+from app_types import BookRecord, UserRecord
+from app_types.user import CollectionRecord
+from benchmarks.dataset import (
+    AUDIENCES,
+    DEFAULT_ANCHOR,
+    GENRES,
+    LAST_NAMES,
+    PUBLISHER_SUFFIXES,
+    TITLE_WORDS,
+    SCALES,
+    DatasetConfig,
+    from_scale,
+    load,
+)
+from benchmarks.postgres import ROOT, EphemeralPostgres, apply_schema
+
+"""
+SUMMARY:
+Reproducible benchmark suite for the app's hot paths, results as JSON.
+Without --dsn it starts an ephemeral Postgres (benchmarks/postgres.py), applies
+sql/schema.sql & every migration, and loads a synthetic dataset (benchmarks/dataset.py)
+generated from a fixed seed. With --dsn it runs against an existing, populated database
+(--setup creates the schema & dataset there first).
+
+Cases, each timed over --runs repetitions after --warmup untimed ones:
+    search:<filters>        search_internal for combinations of BookRecord.search filters, up to
+                            --max-filters at once (2 by default, --all-filters for the full matrix)
+                            (first page of 25 + total, result cache off)
+    parse:from_search       BookRecord._from_search over view_books_vid rows, fresh identity map
+    recommend:<mode>        The recommendation panel's queries (BookRecord.recommend_*)
+    load:<cache>            Full loads of the follow graph & the genre affinity engine
+    collection:save:<kind>  CollectionRecord.save of a new collection & of a mixed add/remove
+
+Compare two result files with benchmarks/compare.py.
+
+Usage: python -m benchmarks.suite [--dsn <conninfo> [--setup]] [--scale 10k|1m|10m] [--workers N]
+    [--books N] [--users N] [--seed 0] [--anchor YYYY-MM-DD] [--runs 5] [--max-filters N | --all-filters] [--only <prefix>] [--output results.json]
+"""
+
+PAGE_SIZE = 25
+# Rows parsed per _from_search run
+PARSE_ROWS = 500
+# Books per collection save
+COLLECTION_BOOKS = 50
+# Users the per-user recommendations cycle through
+SAMPLE_USERS = 20
+# Filters combined per search case by default, pairs cover every filter & their interactions
+# (every combination is thousands of cases)
+DEFAULT_MAX_FILTERS = 2
+
+
+def search_filters(db: Connection) -> dict[str, dict[str, Any]]:
+    """Keyword arguments of BookRecord.search_spec for each filter, with values that match part of the dataset
+
+    Args:
+        db (Connection): Benchmark database
+
+    Returns:
+        dict[str, dict[str, Any]]: Filter name -> search keyword arguments
+    """
+    cursor = db.execute(
+        "SELECT isbn FROM books ORDER BY id OFFSET (SELECT COUNT(*) / 2 FROM books) LIMIT 1"
+    )
+    row = cursor.fetchone()
+    cursor.close()
+    return {
+        "title": {"title": TITLE_WORDS[0]},
+        "title_fulltext": {
+            "title": TITLE_WORDS[0] + " " + TITLE_WORDS[1],
+            "title_mode": "fulltext",
+        },
+        "min_length": {"min_length": 300},
+        "max_length": {"max_length": 800},
+        "edition": {"edition": "first"},
+        "released_after": {"released_after": datetime(1970, 1, 1)},
+        "released_before": {"released_before": datetime(2010, 1, 1)},
+        "isbn": {"isbn": row[0] if row != None else 0},
+        "author_name": {"author_name": LAST_NAMES[0]},
+        "publisher_name": {"publisher_name": PUBLISHER_SUFFIXES[0].lower()},
+        "genre": {"genre": GENRES[0].lower()},
+        "audience": {"audience": AUDIENCES[3].lower()},
+    }
+
+
+def filter_combinations(
+    names: list[str], max_filters: Optional[int] = None
+) -> list[tuple[str, ...]]:
+    """Every combination of filters, up to max_filters at once (both title modes never combine)"""
+    largest = len(names) if max_filters == None else min(max_filters, len(names))
+    return [
+        combo
+        for size in range(largest + 1)
+        for combo in combinations(names, size)
+        if not ("title" in combo and "title_fulltext" in combo)
+    ]
+
+
+def measure(
+    run: Callable[[Any], int],
+    runs: int,
+    warmup: int,
+    setup: Optional[Callable[[], Any]] = None,
+    teardown: Optional[Callable[[Any], Any]] = None,
+) -> dict[str, Any]:
+    """Times a case, only run() is inside the timed region
+
+    Args:
+        run (Callable[[Any], int]): Case body, given setup()'s result, returns the rows it produced
+        runs (int): Timed repetitions
+        warmup (int): Untimed repetitions first
+        setup (Optional[Callable[[], Any]], optional): Called before each repetition. Defaults to None.
+        teardown (Optional[Callable[[Any], Any]], optional): Called after each repetition with setup()'s result. Defaults to None.
+
+    Returns:
+        dict[str, Any]: Millisecond statistics & rows of the last run
+    """
+    timings = []
+    rows = 0
+    for i in range(warmup + runs):
+        state = setup() if setup != None else None
+        start = perf_counter()
+        rows = run(state)
+        elapsed = (perf_counter() - start) * 1000
+        if teardown != None:
+            teardown(state)
+        if i >= warmup:
+            timings.append(elapsed)
+    timings.sort()
+    return {
+        "runs": runs,
+        "median_ms": round(median(timings), 4),
+        "mean_ms": round(mean(timings), 4),
+        "min_ms": round(timings[0], 4),
+        "max_ms": round(timings[-1], 4),
+        "p95_ms": round(percentile(timings, 95), 4),
+        "rows": rows,
+    }
+
+
+class Suite:
+    def __init__(
+        self,
+        conninfo: str,
+        runs: int = 5,
+        warmup: int = 1,
+        max_filters: Optional[int] = DEFAULT_MAX_FILTERS,
+        only: Optional[list[str]] = None,
+    ) -> None:
+        """Benchmark cases against one database
+
+        Args:
+            conninfo (str): Populated database
+            runs (int, optional): Timed repetitions per case. Defaults to 5.
+            warmup (int, optional): Untimed repetitions per case. Defaults to 1.
+            max_filters (Optional[int], optional): Most search filters combined at once, None for every combination. Defaults to DEFAULT_MAX_FILTERS.
+            only (Optional[list[str]], optional): Case name prefixes to run. Defaults to every case.
+        """
+        self.db = connect(conninfo)
+        self.orm = ORM(self.db)
+        self.runs = runs
+        self.warmup = warmup
+        self.max_filters = max_filters
+        self.only = only
+        self.results: dict[str, dict[str, Any]] = {}
+
+    def case(self, name: str, run: Callable[[Any], int], **kwargs):
+        if self.only != None and not any([name.startswith(o) for o in self.only]):
+            return
+        print(name, file=sys.stderr)
+        self.results[name] = measure(run, self.runs, self.warmup, **kwargs)
+
+    # The most followed users, the heaviest Read By Followers lists
+    def sample_users(self) -> list[int]:
+        cursor = self.db.execute(
+            "SELECT following_id FROM users_following GROUP BY following_id ORDER BY COUNT(*) DESC, following_id LIMIT %s",
+            [SAMPLE_USERS],
+        )
+        ids = [r[0] for r in cursor]
+        cursor.close()
+        return ids
+
+    def run_all(self) -> dict[str, dict[str, Any]]:
+        self.run_searches()
+        self.run_parsing()
+        self.run_recommendations()
+        self.run_collections()
+        return self.results
+
+    def run_searches(self):
+        filters = search_filters(self.db)
+        pagination = {
+            "order": [["relevance", "DESC"], ["title", "ASC"]],
+            "offset": 0,
+            "limit": PAGE_SIZE,
+        }
+        for combo in filter_combinations(list(filters.keys()), self.max_filters):
+            kwargs = {}
+            for name in combo:
+                kwargs.update(filters[name])
+            spec = BookRecord.search_spec(pagination, **kwargs)
+            arguments = {f.name: getattr(spec, f.name) for f in fields(spec)}
+            arguments["cache"] = False
+            self.case(
+                "search:" + ("+".join(combo) if len(combo) > 0 else "none"),
+                lambda _, arguments=arguments: search_internal(
+                    self.orm, **arguments
+                ).total,
+            )
+
+    def run_parsing(self):
+        cursor = self.db.execute(
+            "SELECT * FROM view_books_vid ORDER BY id LIMIT %s", [PARSE_ROWS]
+        )
+        rows = cursor.fetchall()
+        cursor.close()
+        self.db.commit()
+        self.case(
+            "parse:from_search",
+            lambda orm: len(
+                [BookRecord._from_search(self.db, "books", orm, *r) for r in rows]
+            ),
+            # A fresh ORM each run, so every record & relation is built
+            setup=lambda: ORM(self.db),
+        )
+
+    def run_recommendations(self):
+        users = cycle(self.sample_users())
+        engine = GenreAffinityEngine(self.orm)
+        self.case(
+            "recommend:last_90", lambda _: len(BookRecord.recommend_last_90(self.orm))
+        )
+        self.case(
+            "recommend:this_month",
+            lambda _: len(BookRecord.recommend_this_month(self.orm)),
+        )
+        self.case(
+            "recommend:followers_read",
+            lambda user_id: len(BookRecord.recommend_followers_read(self.orm, user_id)),
+            setup=lambda: next(users),
+        )
+
+        # Each run scores a user whose affinity isn't cached yet
+        def next_user() -> int:
+            engine.users.clear()
+            return next(users)
+
+        self.case(
+            "recommend:for_you",
+            lambda user_id: len(
+                BookRecord.recommend_for_you(self.orm, engine, user_id)
+            ),
+            setup=next_user,
+        )
+
+        def load_graph(_) -> int:
+            self.orm.follows.load()
+            return self.orm.follows.stats()["edges"]
+
+        def load_affinity(_) -> int:
+            engine.load()
+            return engine.stats()["books"]
+
+        self.case("load:follow_graph", load_graph)
+        self.case("load:affinity", load_affinity)
+        self.db.commit()
+
+    def run_collections(self):
+        cursor = self.db.execute("SELECT * FROM users ORDER BY id LIMIT 1")
+        user = UserRecord(self.db, "users", self.orm, *cursor.fetchone())
+        cursor.close()
+        cursor = self.db.execute(
+            "SELECT id, title, length, edition, release_dt, isbn FROM books ORDER BY id LIMIT %s",
+            [COLLECTION_BOOKS * 2],
+        )
+        books = [BookRecord._from_row(self.db, "books", self.orm, *r) for r in cursor]
+        cursor.close()
+        self.db.commit()
+        half = COLLECTION_BOOKS // 2
+
+        # A new collection with every book added
+        def new_collection() -> CollectionRecord:
+            collection = CollectionRecord.create(self.orm, "Benchmark", user)
+            for book in books[:COLLECTION_BOOKS]:
+                collection.add_book(book)
+            return collection
+
+        # A saved collection with half its books removed & as many others added
+        def changed_collection() -> CollectionRecord:
+            collection = new_collection()
+            collection.save()
+            for book in books[:half]:
+                collection.remove_book(book)
+            for book in books[COLLECTION_BOOKS : COLLECTION_BOOKS + half]:
+                collection.add_book(book)
+            return collection
+
+        def save(collection: CollectionRecord) -> int:
+            collection.save()
+            return COLLECTION_BOOKS
+
+        self.case(
+            "collection:save:insert",
+            save,
+            setup=new_collection,
+            teardown=lambda c: c.delete(),
+        )
+        self.case(
+            "collection:save:mixed",
+            save,
+            setup=changed_collection,
+            teardown=lambda c: c.delete(),
+        )
+
+    def environment(self) -> dict[str, Any]:
+        cursor = self.db.execute(
+            "SELECT current_setting('server_version'), EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')"
+        )
+        version, trigram = cursor.fetchone()
+        cursor.close()
+        self.db.commit()
+        return {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "postgres": version,
+            "pg_trgm": trigram,
+        }
+
+    def row_counts(self) -> dict[str, int]:
+        counts = {}
+        for table in [
+            "books",
+            "contributors",
+            "books_authors",
+            "books_genres",
+            "users",
+            "users_following",
+            "collections",
+            "books_collections",
+            "users_ratings",
+            "users_sessions",
+        ]:
+            cursor = self.db.execute("SELECT COUNT(*) FROM " + table)
+            counts[table] = cursor.fetchone()[0]
+            cursor.close()
+        self.db.commit()
+        return counts
+
+    def close(self):
+        self.db.close()
+
+
+def git_revision() -> dict[str, Any]:
+    """Commit being benchmarked, and whether the tree has uncommitted changes"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": status.strip() != ""}
+
+
+def benchmark(
+    conninfo: str,
+    dataset: Optional[DatasetConfig],
+    workers: Optional[int],
+    runs: int,
+    warmup: int,
+    max_filters: Optional[int],
+    only: Optional[list[str]],
+) -> dict[str, Any]:
+    """Sets up the database (if a dataset is given) & runs every case
+
+    Args:
+        conninfo (str): Database to benchmark
+        dataset (Optional[DatasetConfig]): Dataset to create first, None to use the database as-is
+        workers (Optional[int]): Dataset loading processes, None for the CPU count
+        runs (int): Timed repetitions per case
+        warmup (int): Untimed repetitions per case
+        max_filters (Optional[int]): Most search filters combined at once, None for all
+        only (Optional[list[str]]): Case name prefixes to run, None for all
+
+    Returns:
+        dict[str, Any]: JSON-ready report
+    """
+    started = datetime.now(timezone.utc)
+    setup = None
+    if dataset != None:
+        start = perf_counter()
+        schema = apply_schema(conninfo)
+        loaded = load(conninfo, dataset, workers)
+        setup = {
+            "seconds": round(perf_counter() - start, 2),
+            "pg_trgm_indexes": schema["pg_trgm"],
+            "rows": loaded,
+        }
+
+    suite = Suite(conninfo, runs, warmup, max_filters, only)
+    try:
+        results = suite.run_all()
+        report = {
+            "started_at": started.isoformat(),
+            "git": git_revision(),
+            "environment": suite.environment(),
+            "dataset": {
+                "config": dataset.dict() if dataset != None else None,
+                "setup": setup,
+                "rows": suite.row_counts(),
+            },
+            "settings": {
+                "runs": runs,
+                "warmup": warmup,
+                "max_filters": max_filters,
+                "only": only,
+            },
+            "results": results,
+        }
+    finally:
+        suite.close()
+    return report
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark the app's hot paths")
+    parser.add_argument(
+        "--dsn", default=None, help="Existing database, instead of an ephemeral one"
+    )
+    parser.add_argument(
+        "--setup",
+        action="store_true",
+        help="Create the schema & dataset in the --dsn database (which must be empty)",
+    )
+    parser.add_argument("--pg-bin", default=None, help="Postgres binary directory")
+    parser.add_argument("--scale", choices=list(SCALES.keys()), default="10k")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--books", type=int, default=None)
+    parser.add_argument("--users", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--anchor",
+        default=None,
+        help="Date the dataset is relative to (YYYY-MM-DD). Defaults to "
+        + DEFAULT_ANCHOR.strftime("%Y-%m-%d"),
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument(
+        "--max-filters",
+        type=int,
+        default=DEFAULT_MAX_FILTERS,
+        help="Most search filters combined at once. Defaults to "
+        + str(DEFAULT_MAX_FILTERS),
+    )
+    parser.add_argument(
+        "--all-filters",
+        action="store_true",
+        help="Every combination of search filters (thousands of cases)",
+    )
+    parser.add_argument(
+        "--only", action="append", default=None, help="Only cases with this prefix"
+    )
+    parser.add_argument(
+        "--output", default=None, help="Output file. Defaults to stdout"
+    )
+    args = parser.parse_args()
+    max_filters = None if args.all_filters else args.max_filters
+
+    config = from_scale(
+        args.scale,
+        books=args.books,
+        users=args.users,
+        seed=args.seed,
+        anchor=datetime.strptime(args.anchor, "%Y-%m-%d") if args.anchor else None,
+    )
+
+    if args.dsn != None:
+        report = benchmark(
+            args.dsn,
+            config if args.setup else None,
+            args.workers,
+            args.runs,
+            args.warmup,
+            max_filters,
+            args.only,
+        )
+    else:
+        with EphemeralPostgres(args.pg_bin) as server:
+            report = benchmark(
+                server.conninfo(),
+                config,
+                args.workers,
+                args.runs,
+                args.warmup,
+                max_filters,
+                args.only,
+            )
+
+    output = json.dumps(report, indent=4)
+    if args.output != None:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
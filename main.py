@@ -3,6 +3,8 @@ from textual.app import App, ComposeResult
 from textual.widgets import Header, Footer
 from screens.login import LoginScreen
 from screens.home import HomeScreen
+from screens.debug import DebugScreen
+from textual.binding import Binding
 from app_types import UserRecord
 from events.logout import LogoutMessage
 from events.login import LoginMessage
@@ -21,9 +23,13 @@ class BooksApp(App):
         os.path.join("styles", "users.panel.tcss"),
         os.path.join("styles", "pagination.util.tcss"),
         os.path.join("styles", "collection.panel.tcss"),
-        os.path.join("styles", "rec.panel.tcss")
+        os.path.join("styles", "rec.panel.tcss"),
+        os.path.join("styles", "debug.screen.tcss"),
     ]
 
+    # Query statistics screen, from anywhere
+    BINDINGS = [Binding("f12", "toggle_debug", "Query Stats")]
+
     # Dont use the command palette
     ENABLE_COMMAND_PALETTE = False
 
@@ -46,7 +52,8 @@ class BooksApp(App):
         yield Footer()
 
     # Setup screens & check autologin
-    def on_mount(self):
+    async def on_mount(self):
+        await self.context.async_orm.open()
         self.install_screen(LoginScreen(), name="login")
         self.install_screen(HomeScreen(), name="home")
         if self.context.options.debug_autologin:
@@ -75,6 +82,16 @@ class BooksApp(App):
         else:
             self.push_screen("login")
 
+    # Close the async pool while its event loop is still running
+    async def on_unmount(self):
+        await self.context.async_orm.close()
+
+    def action_toggle_debug(self):
+        if isinstance(self.screen, DebugScreen):
+            self.pop_screen()
+        else:
+            self.push_screen(DebugScreen())
+
     # Application Event Handling
 
     # Handle login attempt
@@ -138,3 +155,6 @@ if __name__ == "__main__":
     app = BooksApp(context)
     app.run()
     context.cleanup()
+    if context.options.debug_orm_stats:
+        for name, stats in context.orm.stats().items():
+            print(name + ": " + ", ".join([f"{k} = {v}" for k, v in stats.items()]))
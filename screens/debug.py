@@ -0,0 +1,100 @@
+from textual.app import ComposeResult
+from textual.widgets import Header, Footer, Static, DataTable
+from textual.containers import Container
+from textual.binding import Binding
+from util import ContextScreen
+
+
+# Shortens a statement signature to fit a table cell
+def clip(text: str, length: int = 80) -> str:
+    return text if len(text) <= length else text[: length - 3] + "..."
+
+
+# Live query statistics from util/instrument.py, toggled with F12
+class DebugScreen(ContextScreen):
+    BINDINGS = [
+        Binding("f12,escape", "close", "Close"),
+        Binding("p", "toggle_recording", "Pause/Resume"),
+        Binding("r", "reset", "Reset"),
+    ]
+
+    def compose(self) -> ComposeResult:
+        yield Header()
+        yield Footer()
+        yield Container(
+            Static(id="debug-summary"),
+            Static("[b]Top statements by total time[/b]", classes="debug-title"),
+            DataTable(id="debug-statements", zebra_stripes=True),
+            Static("[b]Possible N+1 queries[/b]", classes="debug-title"),
+            DataTable(id="debug-suspects", zebra_stripes=True),
+            id="debug-container",
+        )
+
+    def on_mount(self):
+        self.query_one("#debug-statements", expect_type=DataTable).add_columns(
+            "Statement",
+            "Calls",
+            "Total ms",
+            "Mean ms",
+            "p50",
+            "p95",
+            "p99",
+            "Rows",
+            "KiB",
+            "Top Caller",
+        )
+        self.query_one("#debug-suspects", expect_type=DataTable).add_columns(
+            "Statement", "Caller", "Max Burst"
+        )
+        self.update_stats()
+        self.set_interval(1, self.update_stats)
+
+    def update_stats(self):
+        stats = self.context.query_stats
+        totals = stats.totals()
+        self.query_one("#debug-summary", expect_type=Static).update(
+            f"[b]Recording:[/b] {'on' if stats.enabled else 'paused'}    "
+            + f"[b]Statements:[/b] {totals['statements']}    "
+            + f"[b]Calls:[/b] {totals['calls']}    "
+            + f"[b]Total:[/b] {totals['total_ms']:.1f} ms"
+        )
+
+        table = self.query_one("#debug-statements", expect_type=DataTable)
+        table.clear()
+        table.add_rows(
+            [
+                [
+                    clip(s["signature"]),
+                    str(s["calls"]),
+                    f"{s['total_ms']:.1f}",
+                    f"{s['mean_ms']:.2f}",
+                    f"{s['p50_ms']:.2f}",
+                    f"{s['p95_ms']:.2f}",
+                    f"{s['p99_ms']:.2f}",
+                    str(s["rows"]),
+                    f"{s['bytes'] / 1024:.1f}",
+                    s["caller"],
+                ]
+                for s in stats.top()
+            ]
+        )
+
+        suspects = self.query_one("#debug-suspects", expect_type=DataTable)
+        suspects.clear()
+        suspects.add_rows(
+            [
+                [clip(s["signature"]), s["caller"], str(s["burst"])]
+                for s in stats.suspects()
+            ]
+        )
+
+    def action_close(self):
+        self.app.pop_screen()
+
+    def action_toggle_recording(self):
+        self.context.query_stats.enabled = not self.context.query_stats.enabled
+        self.update_stats()
+
+    def action_reset(self):
+        self.context.query_stats.reset()
+        self.update_stats()
@@ -1,7 +1,15 @@
 from typing import Any, Coroutine, Union
 from textual.app import ComposeResult
 from textual.widget import Widget
-from textual.widgets import Placeholder, Input, Button, Static, ListView, ListItem
+from textual.widgets import (
+    Placeholder,
+    Input,
+    Button,
+    Static,
+    ListView,
+    ListItem,
+    Select,
+)
 from textual.containers import Container, Horizontal, Grid
 from app_types.user import CollectionRecord, UserRecord
 from util import ContextWidget, PaginatedTable, ContextModal
@@ -28,6 +36,15 @@ class SearchFields(TypedDict):
     publisher_name: str
     genre: str
     audience: str
+    title_mode: str
+
+
+# "relevance" is full-text matching, sorted by rank first
+TITLE_MODE_OPTIONS = [
+    ("Title contains", "substring"),
+    ("Title words", "fulltext"),
+    ("Title words, best match first", "relevance"),
+]
 
 
 class SearchSuggestions(Suggester):
@@ -66,15 +83,17 @@ class AdvancedSearchModal(ContextModal):
 
     @work(exclusive=True, thread=True, group="adv-genre")
     def load_genres(self):
-        cursor = self.context.db.execute("SELECT name FROM genres")
-        self.genre_suggestions.update([r[0] for r in cursor.fetchall()])
-        cursor.close()
+        with self.context.orm.connection():
+            cursor = self.context.db.execute("SELECT name FROM genres")
+            self.genre_suggestions.update([r[0] for r in cursor.fetchall()])
+            cursor.close()
 
     @work(exclusive=True, thread=True, group="adv-audience")
     def load_audiences(self):
-        cursor = self.context.db.execute("SELECT name FROM audiences")
-        self.audience_suggestions.update([r[0] for r in cursor.fetchall()])
-        cursor.close()
+        with self.context.orm.connection():
+            cursor = self.context.db.execute("SELECT name FROM audiences")
+            self.audience_suggestions.update([r[0] for r in cursor.fetchall()])
+            cursor.close()
 
     def compose(self) -> ComposeResult:
         with Grid(id="advanced-search-modal-container"):
@@ -89,6 +108,19 @@ class AdvancedSearchModal(ContextModal):
                 id="input-title",
                 name="title",
             )
+            yield ListItem(
+                Static("[b]Title Match[/b]"),
+                classes="input-label",
+                id="label-title-mode",
+            )
+            yield Select(
+                TITLE_MODE_OPTIONS,
+                value=self.fields.get("title_mode", "substring"),
+                allow_blank=False,
+                classes="input-field",
+                id="input-title-mode",
+                name="title_mode",
+            )
             yield ListItem(
                 Static("[b]Length[/b]"), classes="input-label", id="label-length"
             )
@@ -218,6 +250,10 @@ class AdvancedSearchModal(ContextModal):
             else:
                 self.fields[event.input.name] = event.value
 
+    @on(Select.Changed, "#input-title-mode")
+    def on_title_mode(self, event: Select.Changed):
+        self.fields["title_mode"] = event.value
+
 
 class AddCollection(Static):
     def __init__(
@@ -403,11 +439,8 @@ class BookActionsModal(ContextModal):
         try:
             values = {k: v.value for k, v in inputs.items()}
             self.context.db.execute(
-                "INSERT INTO users_sessions (session_id, book_id, user_id, start_datetime, end_datetime, start_page, end_page) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                "INSERT INTO users_sessions (book_id, user_id, start_datetime, end_datetime, start_page, end_page) VALUES (%s, %s, %s, %s, %s, %s)",
                 [
-                    self.context.orm.next_available_id(
-                        "users_sessions", col="session_id"
-                    ),
                     self.record.id,
                     self.context.logged_in.id,
                     parse(values["start_time"]),
@@ -417,6 +450,7 @@ class BookActionsModal(ContextModal):
                 ],
             )
             self.context.db.commit()
+            self.context.orm.invalidate("users_sessions")
             self.app.notify("Success!", severity="information")
         except:
             self.app.notify("Failure", severity="error")
@@ -464,6 +498,12 @@ class BooksPanel(ContextWidget):
         yield Container(
             Horizontal(
                 Input(value="", placeholder="Search Books", id="search-main"),
+                Select(
+                    TITLE_MODE_OPTIONS,
+                    value="substring",
+                    allow_blank=False,
+                    id="search-mode",
+                ),
                 Button("Search", id="btn-search"),
                 Button("Advanced", id="btn-advanced"),
                 id="book-search-section",
@@ -570,8 +610,12 @@ class BooksPanel(ContextWidget):
             self.query_one("#search-main", expect_type=Input).value = values.get(
                 "title", ""
             )
+            self.query_one("#search-mode", expect_type=Select).value = values.get(
+                "title_mode", "substring"
+            )
             self.fields = values
             transformed_values = {}
+            order = None
             for k, v in self.fields.items():
                 match k:
                     case "released_after":
@@ -584,10 +628,16 @@ class BooksPanel(ContextWidget):
                         transformed_values[k] = int(v)
                     case "isbn":
                         transformed_values[k] = int(v)
+                    case "title_mode":
+                        if v == "relevance":
+                            transformed_values[k] = "fulltext"
+                            order = [["relevance", "DESC"], ["title", "ASC"]]
+                        else:
+                            transformed_values[k] = v
                     case _:
                         transformed_values[k] = v
             self.query_one("#book-results-section", expect_type=PaginatedTable).search(
-                transformed_values
+                transformed_values, order
             )
 
     @on(Button.Pressed, "#btn-advanced")
@@ -605,6 +655,10 @@ class BooksPanel(ContextWidget):
         else:
             self.fields["title"] = event.value
 
+    @on(Select.Changed, "#search-mode")
+    def on_search_mode_change(self, event: Select.Changed):
+        self.fields["title_mode"] = event.value
+
     @on(PaginatedTable.CursorEvent)
     def on_row_highlight(self, event: PaginatedTable.CursorEvent):
         self.app.push_screen(BookActionsModal(event.value, id="book-actions-modal"))
@@ -1,13 +1,35 @@
 from textual.app import ComposeResult
 from textual.widget import Widget
-from textual.widgets import Button, DataTable
+from textual.widgets import Button, DataTable, Static
 from util import ContextWidget
 from textual.containers import Container, Horizontal
 from textual import on, work
 from textual.reactive import reactive
-from typing import Literal
+from typing import Literal, Optional
+from psycopg import Error
 from app_types import BookRecord
-from datetime import datetime
+from datetime import datetime, timezone
+from util.cache import RecommendationCache
+
+# Tables each mode reads, writes to them (ie the user's own ratings, sessions
+# & follows, or a rollup refresh) mark that mode's cached lists stale
+MODE_TAGS = {
+    "last-90": ["users_sessions", "books_sessions_90"],
+    "this-month": ["users_sessions", "users_ratings", "books_sessions_month"],
+    "followers-read": [
+        "users_following",
+        "users_collections",
+        "books_collections",
+        "users_ratings",
+    ],
+    "for-you": ["users_ratings", "books_genres"],
+}
+
+# Rollup each mode reads from, the others query live
+MODE_ROLLUPS = {
+    "last-90": "books_sessions_90",
+    "this-month": "books_sessions_month",
+}
 
 
 class RecommendationPanel(ContextWidget):
@@ -15,6 +37,8 @@ class RecommendationPanel(ContextWidget):
         Literal["last-90", "followers-read", "this-month", "for-you"]
     ] = reactive("last-90")
     data: reactive[list[BookRecord]] = reactive(lambda: list())
+    # How fresh the shown data is, rollup tabs lag behind by up to the refresh interval
+    status: reactive[str] = reactive("")
 
     def __init__(
         self,
@@ -27,74 +51,111 @@ class RecommendationPanel(ContextWidget):
         super().__init__(
             *children, name=name, id=id, classes=classes, disabled=disabled
         )
+        self.cache = RecommendationCache(MODE_TAGS)
+
+    # When a rollup was last refreshed, None if it never was
+    def rollup_refreshed(self, rollup: str) -> Optional[datetime]:
+        return self.context.rollups.last_refreshed(self.context.orm.db).get(rollup)
+
+    # Describes how fresh a mode's data is, rollups by the age of their last refresh
+    def mode_status(self, mode: str, refreshed: Optional[datetime]) -> str:
+        if not mode in MODE_ROLLUPS:
+            return "Live"
+        if refreshed == None:
+            return "Not refreshed yet"
+        age = (datetime.now(timezone.utc) - refreshed).total_seconds()
+        if age < 60:
+            text = "Updated just now"
+        elif age < 3600:
+            text = f"Updated {int(age // 60)} min ago"
+        else:
+            text = f"Updated {int(age // 3600)} h ago"
+        interval = self.context.rollups.interval
+        if interval <= 0 or age > interval * 2:
+            text += " (stale)"
+        return text
 
-    @work(name="data.last-90", thread=True)
-    def get_data_last_90(self):
-        data = self.context.db.execute(
-            "SELECT * FROM v90_vid ORDER BY count DESC LIMIT 20"
+    # Queries live on BookRecord (app_types/book.py), so the benchmark suite times the same code
+    def get_data_last_90(self) -> tuple[list[BookRecord], Optional[datetime]]:
+        return (
+            BookRecord.recommend_last_90(self.context.orm, 20),
+            self.rollup_refreshed(MODE_ROLLUPS["last-90"]),
         )
-        self.data = [
-            BookRecord._from_search(self.context.db, "books", self.context.orm, *i)
-            for i in data
-        ]
-
-    @work(name="data.this-month", thread=True)
-    def get_data_this_month(self):
-        data = self.context.db.execute(
-            "SELECT * FROM vmonth_vid ORDER BY avg_rating DESC LIMIT 5"
+
+    def get_data_this_month(self) -> tuple[list[BookRecord], Optional[datetime]]:
+        return (
+            BookRecord.recommend_this_month(self.context.orm, 5),
+            self.rollup_refreshed(MODE_ROLLUPS["this-month"]),
         )
-        self.data = [
-            BookRecord._from_search(self.context.db, "books", self.context.orm, *i)
-            for i in data
-        ]
-
-    @work(name="data.for-you", thread=True)
-    def get_data_for_you(self):
-        data = self.context.db.execute(
-            """
-                SELECT * FROM view_books_vid 
-                WHERE avg_rating IS NOT NULL AND id IN (
-                    SELECT book_id FROM books_genres
-                    WHERE genre_id IN (
-                        SELECT DISTINCT genre_id FROM books_genres
-                        WHERE book_id IN (
-                            SELECT book_id FROM users_ratings
-                            WHERE user_id = %s ORDER BY rating DESC LIMIT 100
-                        )
-                    )
-                )
-                ORDER BY avg_rating DESC
-                LIMIT 20
-            """,
-            [self.context.logged_in.id],
+
+    def get_data_for_you(self) -> tuple[list[BookRecord], Optional[datetime]]:
+        return (
+            BookRecord.recommend_for_you(
+                self.context.orm, self.context.affinity, self.context.logged_in.id, 20
+            ),
+            None,
         )
-        self.data = [
-            BookRecord._from_search(self.context.db, "books", self.context.orm, *i)
-            for i in data
-        ]
-
-    @work(name="data.followers-read", thread=True)
-    def get_data_followers_read(self):
-        data = self.context.db.execute(
-            """
-            SELECT * FROM view_books_vid WHERE avg_rating IS NOT NULL AND id in (SELECT books_collections.book_id FROM books_collections 
-                WHERE books_collections.collection_id IN (
-                    SELECT users_collections.collection_id FROM users_collections
-                    WHERE users_collections.user_id IN (
-                        SELECT users_following.user_id FROM users_following 
-                        WHERE users_following.following_id = %s
-                    )
-                ) 
-                GROUP BY books_collections.book_id)
-            ORDER BY avg_rating DESC
-            LIMIT 20
-        """,
-            [self.context.logged_in.id],
+
+    def get_data_followers_read(self) -> tuple[list[BookRecord], Optional[datetime]]:
+        return (
+            BookRecord.recommend_followers_read(
+                self.context.orm, self.context.logged_in.id, 20
+            ),
+            None,
         )
-        self.data = [
-            BookRecord._from_search(self.context.db, "books", self.context.orm, *i)
-            for i in data
-        ]
+
+    # Cached lists show right away, stale ones are re-fetched in the background.
+    # The age is worked out on every show, the cache only keeps the refresh time
+    def show_mode(self, mode: str):
+        cached = self.cache.get(self.context.logged_in.id, mode)
+        if cached != None:
+            self.data = cached.records
+            self.status = self.mode_status(mode, cached.refreshed) + (
+                " (refreshing)" if cached.stale else ""
+            )
+            if not cached.stale:
+                return
+        self.load_mode(mode)
+
+    # True if the user is still on the tab the load was for
+    def is_showing(self, mode: str, user_id: int) -> bool:
+        return (
+            self.mode == mode
+            and self.context.logged_in != None
+            and self.context.logged_in.id == user_id
+        )
+
+    @work(thread=True)
+    def load_mode(self, mode: str):
+        user_id = self.context.logged_in.id
+        generation = self.cache.generation(mode)
+        try:
+            with self.context.orm.connection():
+                match mode:
+                    case "last-90":
+                        records, refreshed = self.get_data_last_90()
+                    case "this-month":
+                        records, refreshed = self.get_data_this_month()
+                    case "followers-read":
+                        records, refreshed = self.get_data_followers_read()
+                    case "for-you":
+                        records, refreshed = self.get_data_for_you()
+                    case _:
+                        if self.is_showing(mode, user_id):
+                            self.status = "Unknown recommendation mode: " + mode
+                        return
+        except Error as e:
+            # Query or pool failure, any cached (stale) list stays shown & cached
+            if self.is_showing(mode, user_id):
+                message = str(e).splitlines()
+                self.status = "Couldn't load recommendations: " + (
+                    message[0] if len(message) > 0 else type(e).__name__
+                )
+            return
+        self.cache.put(user_id, mode, records, refreshed, generation)
+        if self.is_showing(mode, user_id):
+            self.data = records
+            self.status = self.mode_status(mode, refreshed)
 
     def compose(self) -> ComposeResult:
         yield Container(
@@ -117,11 +178,15 @@ class RecommendationPanel(ContextWidget):
                 Button(label="For You", classes="rec-control for-you", name="for-you"),
                 id="rec-buttons",
             ),
+            Static(id="rec-status"),
             DataTable(id="data-display"),
             classes="panel rec",
             id="app-panel-rec",
         )
 
+    def watch_status(self, old: str, new: str):
+        self.query_one("#rec-status", expect_type=Static).update(new)
+
     def watch_data(self, old: list[BookRecord], new: list[BookRecord]):
         table = self.query_one("#data-display", expect_type=DataTable)
         if len(new) > 0:
@@ -164,7 +229,11 @@ class RecommendationPanel(ContextWidget):
             "Audiences",
             "Average Rating",
         )
-        self.get_data_last_90()
+        self.context.orm.add_listener(self.cache.invalidate)
+        self.show_mode(self.mode)
+
+    def on_unmount(self):
+        self.context.orm.remove_listener(self.cache.invalidate)
 
     @on(Button.Pressed, selector=".rec-control")
     def handle_tab_click(self, event: Button.Pressed):
@@ -174,13 +243,4 @@ class RecommendationPanel(ContextWidget):
         self.query_one(f".rec-control.{self.mode}", expect_type=Button).add_class(
             "active"
         )
-
-        match self.mode:
-            case "last-90":
-                self.get_data_last_90()
-            case "this-month":
-                self.get_data_this_month()
-            case "followers-read":
-                self.get_data_followers_read()
-            case "for-you":
-                self.get_data_for_you()
+        self.show_mode(self.mode)
@@ -18,8 +18,9 @@ from textual.widgets import (
 from textual.containers import Container, Grid
 from textual import work, on
 from textual.reactive import reactive
+import asyncio
 from app_types.book import BookRecord
-from app_types.user import CollectionRecord, UserRecord
+from app_types.user import CollectionRecord, UserRecord, COLLECTION_PAGE_SIZE
 from util.widget import ContextModal
 from util import ContextWidget
 
@@ -30,11 +31,13 @@ class ConnectionsPanel(ContextWidget):
 
     @work(thread=True)
     async def load_followers(self):
-        self.followers = self.context.logged_in.followers
+        with self.context.orm.connection():
+            self.followers = self.context.logged_in.followers
 
     @work(thread=True)
     async def load_following(self):
-        self.following = self.context.logged_in.following
+        with self.context.orm.connection():
+            self.following = self.context.logged_in.following
 
     def on_mount(self):
         self.load_followers()
@@ -74,6 +77,8 @@ class ConnectionsPanel(ContextWidget):
                 [self.context.logged_in.id, record.id],
             )
             self.context.db.commit()
+            self.context.orm.follows.unfollow(self.context.logged_in.id, record.id)
+            self.context.orm.invalidate("users_following")
             del self.following[event.coordinate.row]
             self.watch_following([], self.following)
 
@@ -119,8 +124,11 @@ class CollectionEditModal(ContextModal):
     ) -> None:
         super().__init__(name, id, classes)
         self.collection = collection
-        self.collection.books = self.collection._init_books()  # refresh book list
+        self.collection.reload_books()  # drop unsaved changes
         self.newName = collection.name
+        # Books are listed a page at a time
+        self.page = self.collection.books_page()
+        self.last_book = self.page[-1] if len(self.page) > 0 else None
 
     def compose(self) -> ComposeResult:
         with Grid(id="collection-edit-modal-container"):
@@ -148,13 +156,31 @@ class CollectionEditModal(ContextModal):
             yield ListView(
                 *[
                     ListItem(CollectionBook(b, self.collection), classes="list-item")
-                    for b in self.collection.books
+                    for b in self.page
                 ],
                 id="book-list",
             )
             yield Button("Save", id="save-button")
             yield Button("Delete", id="delete-button")
             yield Button("Cancel", id="cancel-button")
+            yield Button(
+                "More Books",
+                id="more-button",
+                disabled=len(self.page) < COLLECTION_PAGE_SIZE,
+            )
+
+    @on(Button.Pressed, "#more-button")
+    def on_more(self, event: Button.Pressed):
+        page = self.collection.books_page(self.last_book)
+        if len(page) > 0:
+            self.last_book = page[-1]
+            self.query_one("#book-list", expect_type=ListView).extend(
+                [
+                    ListItem(CollectionBook(b, self.collection), classes="list-item")
+                    for b in page
+                ]
+            )
+        event.button.disabled = len(page) < COLLECTION_PAGE_SIZE
 
     @on(Button.Pressed, "#save-button")
     def on_save(self):
@@ -252,25 +278,25 @@ class SelfPanel(ContextWidget):
         self.get_table_data()
         self.update_user_data()
 
-    @work(thread=True)
+    @work(exclusive=True, group="self-user-data")
     async def update_user_data(self):
         user = self.context.logged_in
         email = user.email
         name = user.name_first + " " + user.name_last
         created = user.creation_dt
 
-        count_collections = self.context.db.execute(
-            "SELECT COUNT(collection_id) FROM users_collections WHERE user_id = %s",
-            [user.id],
-        ).fetchone()[0]
-        count_following = self.context.db.execute(
-            "SELECT COUNT(following_id) FROM users_following WHERE user_id = %s",
-            [user.id],
-        ).fetchone()[0]
-        count_followers = self.context.db.execute(
-            "SELECT COUNT(user_id) FROM users_following WHERE following_id = %s",
-            [user.id],
-        ).fetchone()[0]
+        # Independent counts, awaited together, each on its own pooled connection
+        counts = await asyncio.gather(
+            *[
+                self.context.async_orm.fetchone(query, [user.id])
+                for query in [
+                    "SELECT COUNT(collection_id) FROM users_collections WHERE user_id = %s",
+                    "SELECT COUNT(following_id) FROM users_following WHERE user_id = %s",
+                    "SELECT COUNT(user_id) FROM users_following WHERE following_id = %s",
+                ]
+            ]
+        )
+        count_collections, count_following, count_followers = [c[0] for c in counts]
 
         await self.query_one("#user-info-section", expect_type=Static).remove()
         await self.query_one("#app-panel-self", expect_type=Container).mount(
@@ -287,20 +313,17 @@ Following: {count_following}""",
             before="#collections-section",
         )
 
-    @work(thread=True)
-    def get_table_data(self):
-        data = [
-            [record[0][0], record[0][1], record[0][2]]
-            for record in self.context.db.execute(
-                """
-                    SELECT (title, authors, rating) FROM view_books_vid 
-                        LEFT JOIN users_ratings ON users_ratings.book_id = view_books_vid.id 
-                        WHERE users_ratings.user_id = %s 
-                        ORDER BY rating DESC LIMIT 10
-                """,
-                [self.context.logged_in.id],
-            )
-        ]
+    @work(exclusive=True, group="self-top-ten")
+    async def get_table_data(self):
+        data = await self.context.async_orm.fetchall(
+            """
+                SELECT title, relations -> 'authors', rating FROM view_books_vid 
+                    LEFT JOIN users_ratings ON users_ratings.book_id = view_books_vid.id 
+                    WHERE users_ratings.user_id = %s 
+                    ORDER BY rating DESC LIMIT 10
+            """,
+            [self.context.logged_in.id],
+        )
 
         table = self.query_one("#top-ten-data", expect_type=DataTable)
         table.clear()
@@ -308,7 +331,7 @@ Following: {count_following}""",
             [
                 [
                     i[0] if len(i[0]) <= 50 else i[0][:47] + "...",
-                    ", ".join([x.split(":")[1] for x in i[1].split("|")]),
+                    ", ".join([" ".join(filter(None, a[1:])) for a in i[1]]),
                     str(i[2] if i[2] else 0),
                 ]
                 for i in data
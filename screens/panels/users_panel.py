@@ -102,15 +102,9 @@ class UserActionsModal(ContextModal):
     ) -> None:
         super().__init__(name, id, classes)
         self.record = record
-        cursor = self.context.db.execute(
-            "SELECT user_id from users_following where user_id=%s AND following_id=%s",
-            [self.context.logged_in.id, record.id],
+        self.following = self.context.orm.follows.is_following(
+            self.context.logged_in.id, record.id
         )
-        if cursor.fetchone():
-            self.following = True
-        else:
-            self.following = False
-        cursor.close()
 
     def compose(self) -> ComposeResult:
         with Grid(id="user-actions-divider"):
@@ -143,6 +137,15 @@ class UserActionsModal(ContextModal):
                     [self.context.logged_in.id, self.record.id],
                 )
             self.context.db.commit()
+            if self.following:
+                self.context.orm.follows.unfollow(
+                    self.context.logged_in.id, self.record.id
+                )
+            else:
+                self.context.orm.follows.follow(
+                    self.context.logged_in.id, self.record.id
+                )
+            self.context.orm.invalidate("users_following")
             self.app.notify("Success!", severity="information")
             self.dismiss()
         except:
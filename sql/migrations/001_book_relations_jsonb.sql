@@ -0,0 +1,114 @@
+-- Structured relation columns for book rows
+-- Replaces the "id:name|id:name" strings of view_books_vid with one jsonb
+-- object per row, decoded by a single loader in BookRecord._from_search:
+--   {"genres": [[id, name]], "audiences": [[id, name]],
+--    "publishers": [[id, name]], "authors": [[id, first, last]],
+--    "editors": [[id, first, last]], "ratings": [[user_id, rating]]}
+-- The recommendation views keep the view_books_vid column layout as a prefix.
+-- The new column types can't be swapped in with CREATE OR REPLACE VIEW, so the view
+-- and its known dependents (the recommendation views, recreated below) are dropped
+-- first. No CASCADE: any other object depending on view_books_vid stops the
+-- migration instead of being dropped along with it, move it out of the way first.
+
+BEGIN;
+
+DROP VIEW IF EXISTS v90_vid;
+DROP VIEW IF EXISTS vmonth_vid;
+DROP VIEW IF EXISTS view_books_vid;
+
+CREATE VIEW view_books_vid AS
+SELECT
+    books.id,
+    books.title,
+    books.length,
+    books.edition,
+    books.release_dt,
+    books.isbn,
+    jsonb_build_object(
+        'genres', COALESCE((
+            SELECT jsonb_agg(jsonb_build_array(genres.id, genres.name) ORDER BY genres.name)
+            FROM books_genres
+            JOIN genres ON genres.id = books_genres.genre_id
+            WHERE books_genres.book_id = books.id
+        ), '[]'::jsonb),
+        'audiences', COALESCE((
+            SELECT jsonb_agg(jsonb_build_array(audiences.id, audiences.name) ORDER BY audiences.name)
+            FROM books_audiences
+            JOIN audiences ON audiences.id = books_audiences.audience_id
+            WHERE books_audiences.book_id = books.id
+        ), '[]'::jsonb),
+        'publishers', COALESCE((
+            SELECT jsonb_agg(
+                jsonb_build_array(contributors.id, contributors.name_last_company)
+                ORDER BY contributors.name_last_company
+            )
+            FROM books_publishers
+            JOIN contributors ON contributors.id = books_publishers.contributor_id
+            WHERE books_publishers.book_id = books.id
+        ), '[]'::jsonb),
+        'authors', COALESCE((
+            SELECT jsonb_agg(
+                jsonb_build_array(contributors.id, contributors.name_first, contributors.name_last_company)
+                ORDER BY contributors.name_last_company, contributors.name_first
+            )
+            FROM books_authors
+            JOIN contributors ON contributors.id = books_authors.contributor_id
+            WHERE books_authors.book_id = books.id
+        ), '[]'::jsonb),
+        'editors', COALESCE((
+            SELECT jsonb_agg(
+                jsonb_build_array(contributors.id, contributors.name_first, contributors.name_last_company)
+                ORDER BY contributors.name_last_company, contributors.name_first
+            )
+            FROM books_editors
+            JOIN contributors ON contributors.id = books_editors.contributor_id
+            WHERE books_editors.book_id = books.id
+        ), '[]'::jsonb),
+        'ratings', COALESCE((
+            SELECT jsonb_agg(jsonb_build_array(users_ratings.user_id, users_ratings.rating))
+            FROM users_ratings
+            WHERE users_ratings.book_id = books.id
+        ), '[]'::jsonb)
+    ) AS relations,
+    (
+        SELECT AVG(users_ratings.rating)
+        FROM users_ratings
+        WHERE users_ratings.book_id = books.id
+    ) AS avg_rating,
+    (
+        SELECT string_agg(genres.name, ', ' ORDER BY genres.name)
+        FROM books_genres
+        JOIN genres ON genres.id = books_genres.genre_id
+        WHERE books_genres.book_id = books.id
+    ) AS genres_names_only,
+    (
+        SELECT string_agg(contributors.name_last_company, ', ' ORDER BY contributors.name_last_company)
+        FROM books_publishers
+        JOIN contributors ON contributors.id = books_publishers.contributor_id
+        WHERE books_publishers.book_id = books.id
+    ) AS publishers_names_only
+FROM books;
+
+-- Books read in the last 90 days, count = sessions started in that window
+CREATE VIEW v90_vid AS
+SELECT view_books_vid.*, recent.count
+FROM view_books_vid
+JOIN (
+    SELECT book_id, COUNT(*) AS count
+    FROM users_sessions
+    WHERE start_datetime >= now() - interval '90 days'
+    GROUP BY book_id
+) AS recent ON recent.book_id = view_books_vid.id;
+
+-- Books read this calendar month, count = sessions started this month
+CREATE VIEW vmonth_vid AS
+SELECT view_books_vid.*, monthly.count
+FROM view_books_vid
+JOIN (
+    SELECT book_id, COUNT(*) AS count
+    FROM users_sessions
+    WHERE start_datetime >= date_trunc('month', now())
+    GROUP BY book_id
+) AS monthly ON monthly.book_id = view_books_vid.id;
+
+COMMIT;
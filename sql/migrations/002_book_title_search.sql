@@ -0,0 +1,20 @@
+-- Indexed title search
+-- Full-text mode matches against a generated tsvector column (GIN indexed)
+-- and can rank results with ts_rank. Substring mode keeps ILIKE '%x%'
+-- semantics, but through a trigram index on books.title instead of a
+-- sequential scan of view_books_vid.
+
+BEGIN;
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE books
+    ADD COLUMN IF NOT EXISTS title_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('english', COALESCE(title, ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS books_title_tsv_idx ON books USING GIN (title_tsv);
+CREATE INDEX IF NOT EXISTS books_title_trgm_idx ON books USING GIN (title gin_trgm_ops);
+
+ANALYZE books;
+
+COMMIT;
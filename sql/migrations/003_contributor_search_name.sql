@@ -0,0 +1,25 @@
+-- Normalized contributor names for author/publisher filters
+-- search_name is "first last", lower-cased, so a single trigram-indexed
+-- LIKE covers matches on the first name, the last name/company, and the
+-- full name (previously three ILIKEs, one on a concatenation).
+
+BEGIN;
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE contributors
+    ADD COLUMN IF NOT EXISTS search_name text
+    GENERATED ALWAYS AS (
+        lower(btrim(COALESCE(name_first, '') || ' ' || COALESCE(name_last_company, '')))
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS contributors_search_name_trgm_idx
+    ON contributors USING GIN (search_name gin_trgm_ops);
+
+-- Joins from the name match back to books
+CREATE INDEX IF NOT EXISTS books_authors_contributor_idx ON books_authors (contributor_id);
+CREATE INDEX IF NOT EXISTS books_publishers_contributor_idx ON books_publishers (contributor_id);
+
+ANALYZE contributors;
+
+COMMIT;
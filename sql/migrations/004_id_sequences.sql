@@ -0,0 +1,21 @@
+-- Sequence-backed IDs
+-- Replaces SELECT MAX(id) + 1 before every insert (an extra scan and round
+-- trip, and concurrent clients got the same ID). Each sequence is owned by
+-- its column and starts after the current maximum; the column default draws
+-- from it, so inserts can omit the ID and use RETURNING.
+
+BEGIN;
+
+CREATE SEQUENCE IF NOT EXISTS users_id_seq OWNED BY users.id;
+SELECT setval('users_id_seq', COALESCE((SELECT MAX(id) FROM users), 0) + 1, false);
+ALTER TABLE users ALTER COLUMN id SET DEFAULT nextval('users_id_seq');
+
+CREATE SEQUENCE IF NOT EXISTS collections_id_seq OWNED BY collections.id;
+SELECT setval('collections_id_seq', COALESCE((SELECT MAX(id) FROM collections), 0) + 1, false);
+ALTER TABLE collections ALTER COLUMN id SET DEFAULT nextval('collections_id_seq');
+
+CREATE SEQUENCE IF NOT EXISTS users_sessions_session_id_seq OWNED BY users_sessions.session_id;
+SELECT setval('users_sessions_session_id_seq', COALESCE((SELECT MAX(session_id) FROM users_sessions), 0) + 1, false);
+ALTER TABLE users_sessions ALTER COLUMN session_id SET DEFAULT nextval('users_sessions_session_id_seq');
+
+COMMIT;
@@ -0,0 +1,63 @@
+-- Materialized recommendation rollups
+-- v90_vid & vmonth_vid re-counted every session (and averaged every rating of
+-- the month's books) on each query. The per-book counts now live in
+-- materialized views refreshed in the background by the app (util/rollups.py),
+-- and the views only join the top rows to view_books_vid.
+-- Each rollup has a unique index so it can be refreshed CONCURRENTLY (readers
+-- are never blocked), and rollup_refreshes records when each was last refreshed.
+
+BEGIN;
+
+DROP VIEW IF EXISTS v90_vid;
+DROP VIEW IF EXISTS vmonth_vid;
+
+-- Sessions started in the last 90 days, per book
+CREATE MATERIALIZED VIEW books_sessions_90 AS
+SELECT book_id, COUNT(*) AS count
+FROM users_sessions
+WHERE start_datetime >= now() - interval '90 days'
+GROUP BY book_id;
+
+CREATE UNIQUE INDEX books_sessions_90_book_id_idx ON books_sessions_90 (book_id);
+CREATE INDEX books_sessions_90_count_idx ON books_sessions_90 (count DESC);
+
+-- Sessions started this calendar month, per book, with the book's average rating
+CREATE MATERIALIZED VIEW books_sessions_month AS
+SELECT
+    users_sessions.book_id,
+    COUNT(*) AS count,
+    (
+        SELECT AVG(users_ratings.rating)
+        FROM users_ratings
+        WHERE users_ratings.book_id = users_sessions.book_id
+    ) AS avg_rating
+FROM users_sessions
+WHERE start_datetime >= date_trunc('month', now())
+GROUP BY users_sessions.book_id;
+
+CREATE UNIQUE INDEX books_sessions_month_book_id_idx ON books_sessions_month (book_id);
+CREATE INDEX books_sessions_month_avg_rating_idx ON books_sessions_month (avg_rating DESC);
+
+-- Same columns as before, order by the rollup columns to use their indexes
+CREATE VIEW v90_vid AS
+SELECT view_books_vid.*, recent.count
+FROM books_sessions_90 AS recent
+JOIN view_books_vid ON view_books_vid.id = recent.book_id;
+
+CREATE VIEW vmonth_vid AS
+SELECT view_books_vid.*, monthly.count, monthly.avg_rating AS rollup_avg_rating
+FROM books_sessions_month AS monthly
+JOIN view_books_vid ON view_books_vid.id = monthly.book_id;
+
+-- Last refresh of each rollup, shared by every client
+CREATE TABLE IF NOT EXISTS rollup_refreshes (
+    name text PRIMARY KEY,
+    refreshed_at timestamptz NOT NULL,
+    duration_ms float8 NOT NULL
+);
+
+INSERT INTO rollup_refreshes (name, refreshed_at, duration_ms)
+VALUES ('books_sessions_90', now(), 0), ('books_sessions_month', now(), 0)
+ON CONFLICT (name) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at;
+
+COMMIT;
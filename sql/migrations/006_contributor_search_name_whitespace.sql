@@ -0,0 +1,25 @@
+-- Collapse whitespace runs in contributors.search_name
+-- The filter input is normalized to single spaces (BookRecord contributor_condition),
+-- but names stored with double spaces, tabs or newlines kept them in search_name,
+-- so they never matched. A generated column's expression can't be altered before
+-- Postgres 17, the column (and its trigram index) is rebuilt instead.
+
+BEGIN;
+
+ALTER TABLE contributors DROP COLUMN IF EXISTS search_name;
+
+ALTER TABLE contributors
+    ADD COLUMN search_name text
+    GENERATED ALWAYS AS (
+        lower(btrim(regexp_replace(
+            COALESCE(name_first, '') || ' ' || COALESCE(name_last_company, ''),
+            '\s+', ' ', 'g'
+        )))
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS contributors_search_name_trgm_idx
+    ON contributors USING GIN (search_name gin_trgm_ops);
+
+ANALYZE contributors;
+
+COMMIT;
@@ -0,0 +1,124 @@
+-- Base tables, before any migration
+-- For new databases (ie the benchmark suite's ephemeral Postgres): apply this,
+-- then every file in sql/migrations in order, which add the views, search
+-- columns, ID sequences & recommendation rollups.
+
+BEGIN;
+
+CREATE TABLE books (
+    id integer PRIMARY KEY,
+    title text NOT NULL,
+    length integer,
+    edition text,
+    release_dt timestamp,
+    isbn bigint
+);
+
+-- People (authors & editors) have both names, publishers only name_last_company
+CREATE TABLE contributors (
+    id integer PRIMARY KEY,
+    name_first text,
+    name_last_company text NOT NULL
+);
+
+CREATE TABLE genres (
+    id integer PRIMARY KEY,
+    name text NOT NULL
+);
+
+CREATE TABLE audiences (
+    id integer PRIMARY KEY,
+    name text NOT NULL
+);
+
+CREATE TABLE books_authors (
+    book_id integer NOT NULL,
+    contributor_id integer NOT NULL,
+    PRIMARY KEY (book_id, contributor_id)
+);
+
+CREATE TABLE books_editors (
+    book_id integer NOT NULL,
+    contributor_id integer NOT NULL,
+    PRIMARY KEY (book_id, contributor_id)
+);
+
+CREATE TABLE books_publishers (
+    book_id integer NOT NULL,
+    contributor_id integer NOT NULL,
+    PRIMARY KEY (book_id, contributor_id)
+);
+
+CREATE TABLE books_genres (
+    book_id integer NOT NULL,
+    genre_id integer NOT NULL,
+    PRIMARY KEY (book_id, genre_id)
+);
+
+CREATE TABLE books_audiences (
+    book_id integer NOT NULL,
+    audience_id integer NOT NULL,
+    PRIMARY KEY (book_id, audience_id)
+);
+
+CREATE TABLE users (
+    id integer PRIMARY KEY,
+    creation_dt timestamp NOT NULL,
+    access_dt timestamp NOT NULL,
+    name_first text,
+    name_last text,
+    email text NOT NULL,
+    password text NOT NULL
+);
+
+CREATE TABLE users_following (
+    user_id integer NOT NULL,
+    following_id integer NOT NULL,
+    PRIMARY KEY (user_id, following_id)
+);
+
+CREATE TABLE collections (
+    id integer PRIMARY KEY,
+    name text NOT NULL
+);
+
+CREATE TABLE users_collections (
+    user_id integer NOT NULL,
+    collection_id integer NOT NULL,
+    PRIMARY KEY (user_id, collection_id)
+);
+
+CREATE TABLE books_collections (
+    book_id integer NOT NULL,
+    collection_id integer NOT NULL,
+    PRIMARY KEY (book_id, collection_id)
+);
+
+CREATE TABLE users_ratings (
+    user_id integer NOT NULL,
+    book_id integer NOT NULL,
+    rating integer,
+    PRIMARY KEY (user_id, book_id)
+);
+
+CREATE TABLE users_sessions (
+    session_id integer PRIMARY KEY,
+    book_id integer NOT NULL,
+    user_id integer NOT NULL,
+    start_datetime timestamp NOT NULL,
+    end_datetime timestamp,
+    start_page integer,
+    end_page integer
+);
+
+-- Reverse lookups of the junction tables (their primary keys lead with the other column)
+CREATE INDEX books_genres_genre_idx ON books_genres (genre_id);
+CREATE INDEX books_audiences_audience_idx ON books_audiences (audience_id);
+CREATE INDEX books_collections_collection_idx ON books_collections (collection_id);
+CREATE INDEX users_collections_collection_idx ON users_collections (collection_id);
+CREATE INDEX users_following_following_idx ON users_following (following_id);
+CREATE INDEX users_ratings_book_idx ON users_ratings (book_id);
+CREATE INDEX users_sessions_book_idx ON users_sessions (book_id);
+CREATE INDEX users_sessions_user_idx ON users_sessions (user_id);
+
+COMMIT;
@@ -0,0 +1,134 @@
+import numpy as np
+import pytest
+from util.affinity import (
+    NEUTRAL_RATING,
+    GenreAffinityEngine,
+    GenreIncidence,
+    UserAffinity,
+    locate,
+)
+
+"""
+SUMMARY:
+Genre affinity maths, without a database: the sparse incidence matrix against its
+dense equivalent, ID lookups skipping unknown IDs, and incremental rating changes
+ending up where a from-scratch computation would.
+"""
+
+BOOK_IDS = np.array([10, 20, 30, 40], dtype=np.int64)
+GENRE_IDS = np.array([1, 2, 3], dtype=np.int64)
+# (book row, genre column), with a duplicate pair & a book without genres
+PAIRS = np.array([[0, 0], [0, 1], [1, 1], [1, 1], [2, 0], [2, 1], [2, 2]])
+
+
+def dense() -> np.ndarray:
+    matrix = np.zeros((len(BOOK_IDS), len(GENRE_IDS)))
+    matrix[PAIRS[:, 0], PAIRS[:, 1]] = 1
+    counts = matrix.sum(axis=1, keepdims=True)
+    return np.divide(matrix, counts, out=np.zeros_like(matrix), where=counts > 0)
+
+
+def incidence() -> GenreIncidence:
+    return GenreIncidence.build(len(BOOK_IDS), len(GENRE_IDS), PAIRS[:, 0], PAIRS[:, 1])
+
+
+def test_incidence_matches_dense_matrix():
+    matrix = incidence()
+    indices, weights = np.array([2, 0, 3]), np.array([1.5, -0.5, 2.0])
+    assert np.allclose(matrix.combine(indices, weights), weights @ dense()[indices])
+    vector = np.array([0.5, -1.0, 2.0])
+    assert np.allclose(matrix.dot(vector), dense() @ vector)
+
+
+def test_locate_masks_unknown_ids():
+    positions, known = locate(BOOK_IDS, np.array([20, 25, 40, 99, 5]))
+    assert known.tolist() == [True, False, True, False, False]
+    assert positions[known].tolist() == [1, 3]
+    assert (positions < len(BOOK_IDS)).all()
+    positions, known = locate(np.zeros(0, dtype=np.int64), np.array([1]))
+    assert not known.any()
+
+
+def loaded_engine(ratings: dict[int, float]) -> GenreAffinityEngine:
+    """Engine over the test matrix, with one cached user (ID 1) holding the given ratings"""
+    engine = GenreAffinityEngine(None)
+    engine.book_ids = BOOK_IDS
+    engine.genre_ids = GENRE_IDS
+    engine.incidence = incidence()
+    engine.rating_sum = np.zeros(len(BOOK_IDS))
+    engine.rating_count = np.zeros(len(BOOK_IDS))
+    # Another user's rating, which has to survive the changes
+    engine.rating_sum[1], engine.rating_count[1] = 4, 1
+    engine.loads = 1
+    engine.loaded_at = 0
+    engine.max_age = float("inf")
+    affinity = UserAffinity(vector=np.zeros(len(GENRE_IDS)), generation=1)
+    for i, rating in ratings.items():
+        engine.rating_sum[i] += rating
+        engine.rating_count[i] += 1
+        affinity.ratings[i] = rating
+        affinity.vector += (rating - NEUTRAL_RATING) * dense()[i]
+        affinity.weight += abs(rating - NEUTRAL_RATING)
+    engine.users[1] = affinity
+    return engine
+
+
+@pytest.mark.parametrize(
+    "changes",
+    [
+        # Create
+        [(20, 5.0)],
+        # Change, the previous rating comes from the cached user
+        [(10, 1.0)],
+        # Remove
+        [(10, None)],
+        # A book without genres, & a mix of everything
+        [(40, 3.0), (30, 0.5), (10, None), (20, 2.5), (30, 4.0)],
+    ],
+)
+def test_rating_changes_match_a_full_recompute(changes):
+    engine = loaded_engine({0: 4.0})
+    for book_id, rating in changes:
+        engine.rating_changed(1, book_id, rating)
+
+    ratings = {0: 4.0}
+    for book_id, rating in changes:
+        i = int(np.searchsorted(BOOK_IDS, book_id))
+        if rating == None:
+            ratings.pop(i, None)
+        else:
+            ratings[i] = rating
+    expected = loaded_engine(ratings)
+
+    assert np.allclose(engine.rating_sum, expected.rating_sum)
+    assert np.allclose(engine.rating_count, expected.rating_count)
+    affinity, recomputed = engine.users[1], expected.users[1]
+    assert affinity.ratings == recomputed.ratings
+    assert np.allclose(affinity.vector, recomputed.vector)
+    assert affinity.weight == pytest.approx(recomputed.weight)
+
+
+def test_rating_change_of_uncached_user_uses_given_previous_rating():
+    engine = loaded_engine({})
+    # User 2 is the one who rated book 20 a 4
+    engine.rating_changed(2, 20, 3.0, previous=4.0)
+    assert engine.rating_sum[1] == 3 and engine.rating_count[1] == 1
+    assert 2 not in engine.users
+
+
+def test_rating_change_skips_unknown_books_and_unloaded_engines():
+    engine = loaded_engine({0: 4.0})
+    before = engine.rating_sum.copy()
+    engine.rating_changed(1, 99, 5.0)
+    assert np.array_equal(engine.rating_sum, before)
+    engine.loaded_at = None
+    engine.rating_changed(1, 20, 5.0)
+    assert np.array_equal(engine.rating_sum, before)
+    assert engine.updates == 0
+
+
+def test_rating_change_drops_user_from_an_older_load():
+    engine = loaded_engine({0: 4.0})
+    engine.loads = 2
+    engine.rating_changed(1, 20, 5.0)
+    assert 1 not in engine.users
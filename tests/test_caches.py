@@ -0,0 +1,106 @@
+from util.cache import CachedSearch, RecommendationCache, SearchCache, estimate_size
+
+"""
+SUMMARY:
+Search & recommendation caches: LRU eviction by entry count and by size, results
+computed before a write not being stored after it, and recommendation lists going
+stale on writes, on age, and when fetched across an invalidation.
+"""
+
+
+def result(rows: list[tuple]) -> CachedSearch:
+    return CachedSearch(rows, len(rows), None, None)
+
+
+def test_search_cache_evicts_least_recently_used():
+    cache = SearchCache(max_entries=2)
+    for key in ["a", "b"]:
+        assert cache.put((key,), result([(key,)]), ["books"], cache.generation(["books"]))
+    # Touch a, so b is the least recently used
+    assert cache.get(("a",)) != None
+    cache.put(("c",), result([("c",)]), ["books"], cache.generation(["books"]))
+    assert cache.get(("b",)) == None
+    assert cache.get(("a",)) != None and cache.get(("c",)) != None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_search_cache_is_bounded_by_size():
+    rows = [(i, "title " + str(i)) for i in range(10)]
+    size = estimate_size(rows)
+    cache = SearchCache(max_bytes=size * 2)
+    for key in ["a", "b", "c"]:
+        assert cache.put((key,), result(list(rows)), ["books"], cache.generation(["books"]))
+    assert cache.get(("a",)) == None
+    assert cache.stats()["size"] == 2
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+
+def test_search_cache_rejects_oversized_results():
+    cache = SearchCache(max_bytes=64)
+    assert not cache.put(("a",), result([(i,) for i in range(100)]), ["books"], (0,))
+    assert cache.get(("a",)) == None
+
+
+def test_search_cache_drops_results_from_before_a_write():
+    cache = SearchCache()
+    generation = cache.generation(["books", "genres"])
+    cache.invalidate("genres")
+    assert not cache.put(("a",), result([(1,)]), ["books", "genres"], generation)
+    # Tables the search doesn't read don't matter
+    generation = cache.generation(["books"])
+    cache.invalidate("genres")
+    assert cache.put(("a",), result([(1,)]), ["books"], generation)
+
+
+def test_search_cache_invalidates_tagged_entries():
+    cache = SearchCache()
+    cache.put(("a",), result([(1,)]), ["books"], (0,))
+    cache.put(("b",), result([(1,)]), ["books", "genres"], (0, 0))
+    cache.put(("c",), result([(1,)]), ["users"], (0,))
+    assert cache.invalidate("genres") == 1
+    assert cache.get(("b",)) == None
+    assert cache.get(("a",)) != None and cache.get(("c",)) != None
+
+
+def test_search_cache_disabled_without_ttl():
+    cache = SearchCache(ttl=0)
+    assert not cache.put(("a",), result([(1,)]), ["books"], (0,))
+    assert cache.get(("a",)) == None
+
+
+def test_recommendations_go_stale_on_writes_to_their_tables():
+    cache = RecommendationCache({"genre": ["users_ratings"], "new": ["books"]})
+    cache.put(1, "genre", [1], None, cache.generation("genre"))
+    cache.put(1, "new", [2], None, cache.generation("new"))
+    assert cache.invalidate(("users_ratings",)) == 1
+    assert cache.get(1, "genre").stale
+    assert not cache.get(1, "new").stale
+    # Stale entries are still returned, with their records
+    assert cache.get(1, "genre").records == [1]
+
+
+def test_recommendations_fetched_across_a_write_are_stale():
+    cache = RecommendationCache({"genre": ["users_ratings"]})
+    generation = cache.generation("genre")
+    cache.invalidate(("users_ratings",))
+    cache.put(1, "genre", [1], None, generation)
+    assert cache.get(1, "genre").stale
+    cache.put(1, "genre", [1], None, cache.generation("genre"))
+    assert not cache.get(1, "genre").stale
+
+
+def test_recommendations_go_stale_with_age():
+    cache = RecommendationCache({"genre": ["users_ratings"]}, max_age=-1)
+    cache.put(1, "genre", [1], None, cache.generation("genre"))
+    assert cache.get(1, "genre").stale
+    assert cache.stats()["stale_hits"] == 1
+
+
+def test_recommendations_evict_least_recently_used_user():
+    cache = RecommendationCache({"genre": ["users_ratings"]}, max_users=2)
+    cache.put(1, "genre", [1], None, 0)
+    cache.put(2, "genre", [2], None, 0)
+    cache.get(1, "genre")
+    cache.put(3, "genre", [3], None, 0)
+    assert cache.get(2, "genre") == None
+    assert cache.get(1, "genre") != None and cache.get(3, "genre") != None
@@ -0,0 +1,74 @@
+from itertools import product
+import sqlite3
+import pytest
+from util.orm import keyset_condition, keyset_order, reverse_order
+
+"""
+SUMMARY:
+Keyset pagination predicates, checked without Postgres: every row of a small table
+(with NULLs in each sort column) is used as the seek key, and the predicate has to
+match exactly the rows sorted after it. The table lives in SQLite, sorted with the
+Postgres NULL placement (last when ascending, first when descending).
+"""
+
+VALUES = [None, 1, 2]
+ROWS = [(a, b, i) for i, (a, b) in enumerate(product(VALUES, VALUES))]
+
+
+@pytest.fixture(scope="module")
+def db():
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE t (a integer, b integer, id integer PRIMARY KEY)")
+    db.executemany("INSERT INTO t VALUES (?, ?, ?)", ROWS)
+    yield db
+    db.close()
+
+
+def postgres_order(order: list) -> str:
+    return ", ".join(
+        [c + " " + d + (" NULLS LAST" if d == "ASC" else " NULLS FIRST") for c, d in order]
+    )
+
+
+def ordered_ids(db: sqlite3.Connection, order: list, condition: str = "TRUE", fields: list = []) -> list[int]:
+    cursor = db.execute(
+        "SELECT id FROM t WHERE " + condition.replace("%s", "?") + " ORDER BY " + postgres_order(order),
+        fields,
+    )
+    return [r[0] for r in cursor.fetchall()]
+
+
+@pytest.mark.parametrize(
+    "directions", list(product(["ASC", "DESC"], ["ASC", "DESC"]))
+)
+def test_seek_matches_rows_after_key(db, directions):
+    order = keyset_order([["a", directions[0]], ["b", directions[1]]])
+    ids = ordered_ids(db, order)
+    rows = {r[2]: r for r in ROWS}
+    for position, id in enumerate(ids):
+        condition = keyset_condition(order, list(rows[id]))
+        assert ordered_ids(db, order, condition.condition, condition.fields) == ids[position + 1 :]
+
+
+@pytest.mark.parametrize(
+    "directions", list(product(["ASC", "DESC"], ["ASC", "DESC"]))
+)
+def test_reversed_seek_matches_rows_before_key(db, directions):
+    order = keyset_order([["a", directions[0]], ["b", directions[1]]])
+    reverse = reverse_order(order)
+    ids = ordered_ids(db, order)
+    rows = {r[2]: r for r in ROWS}
+    for position, id in enumerate(ids):
+        condition = keyset_condition(reverse, list(rows[id]))
+        before = ordered_ids(db, reverse, condition.condition, condition.fields)
+        assert list(reversed(before)) == ids[:position]
+
+
+def test_keyset_order_appends_key_column_once():
+    assert keyset_order([["title", "asc"]]) == [["title", "ASC"], ["id", "ASC"]]
+    assert keyset_order([["id", "DESC"]]) == [["id", "DESC"]]
+    assert keyset_order(None) == [["id", "ASC"]]
+
+
+def test_reverse_order_flips_every_direction():
+    assert reverse_order([["a", "ASC"], ["b", "DESC"]]) == [["a", "DESC"], ["b", "ASC"]]
@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+import pytest
+from util.pagination import PaginatedTable, page_count
+
+"""
+SUMMARY:
+Page arithmetic of the paginated table: page counts (an empty result still has a
+page) and jumping to a page number outside the result, which clamps to the first
+or last page.
+"""
+
+
+@pytest.mark.parametrize(
+    "total, page_size, pages",
+    [(0, 10, 1), (1, 10, 1), (10, 10, 1), (11, 10, 2), (95, 10, 10), (5, 0, 1)],
+)
+def test_page_count(total, page_size, pages):
+    assert page_count(total, page_size) == pages
+
+
+def table(total: int) -> SimpleNamespace:
+    """Stand-in for the widget, with only what go_to_page touches"""
+    table = SimpleNamespace(
+        pagination={"offset": 0, "limit": 10, "order": []},
+        total=total,
+        calls=[],
+    )
+    table.clear_keyset = lambda: table.calls.append("clear_keyset")
+    table.show_page = lambda: table.calls.append("show_page")
+    return table
+
+
+@pytest.mark.parametrize(
+    "total, page, offset",
+    [
+        (95, 3, 20),
+        (95, 10, 90),
+        # Past the end, the last page
+        (95, 42, 90),
+        # Before the start, the first page
+        (95, 0, 0),
+        (95, -3, 0),
+        # Empty result, still one page
+        (0, 5, 0),
+    ],
+)
+def test_go_to_page_clamps(total, page, offset):
+    widget = table(total)
+    PaginatedTable.go_to_page(widget, page)
+    assert widget.pagination["offset"] == offset
+    # Offset pagination, the keyset of the old page doesn't apply
+    assert widget.calls == ["clear_keyset", "show_page"]
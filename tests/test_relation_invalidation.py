@@ -0,0 +1,82 @@
+from os import environ, getpid
+from psycopg import connect
+from psycopg.conninfo import make_conninfo
+import pytest
+from app_types.book import BookRecord, RatingRecord
+from app_types.user import CollectionRecord, UserRecord
+from benchmarks.dataset import DatasetConfig, load
+from benchmarks.postgres import apply_schema
+from util.orm import ORM
+
+"""
+SUMMARY:
+Identity-mapped records share their loaded relations between every page/list holding them,
+so a write has to unload those relations or the other holders keep showing stale rows.
+Needs a Postgres server: TEST_DATABASE_URL is a connection string whose user may create
+databases, a throwaway database is created (and dropped) on it.
+"""
+
+TEST_DATABASE_URL = environ.get("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(
+    TEST_DATABASE_URL == None, reason="TEST_DATABASE_URL is not set"
+)
+
+
+@pytest.fixture(scope="module")
+def conninfo():
+    name = "relation_invalidation_" + str(getpid())
+    with connect(TEST_DATABASE_URL, autocommit=True) as admin:
+        admin.execute("CREATE DATABASE " + name)
+    conninfo = make_conninfo(TEST_DATABASE_URL, dbname=name)
+    try:
+        apply_schema(conninfo)
+        load(
+            conninfo,
+            DatasetConfig(
+                books=200,
+                users=20,
+                contributors=100,
+                publishers=10,
+                collections_per_user=1,
+                books_per_collection=10,
+            ),
+            workers=1,
+        )
+        yield conninfo
+    finally:
+        with connect(TEST_DATABASE_URL, autocommit=True) as admin:
+            admin.execute("DROP DATABASE IF EXISTS " + name + " WITH (FORCE)")
+
+
+@pytest.fixture
+def orm(conninfo):
+    with connect(conninfo) as db:
+        orm = ORM(db)
+        orm.register("books", BookRecord)
+        orm.register("users", UserRecord)
+        yield orm
+
+
+def test_rating_reaches_reloaded_collection_page(orm: ORM):
+    collection_id, name, user_id = orm.db.execute(
+        "SELECT collections.id, collections.name, users_collections.user_id FROM collections JOIN users_collections ON users_collections.collection_id = collections.id WHERE EXISTS (SELECT 1 FROM books_collections WHERE collection_id = collections.id) ORDER BY collections.id LIMIT 1"
+    ).fetchone()
+    collection = CollectionRecord(orm.db, "collections", orm, collection_id, name)
+
+    page = collection.books_page()
+    unrated = [b for b in page if not user_id in [r.user_id for r in b.ratings]]
+    assert len(unrated) > 0
+    book = unrated[0]
+    before = list(book.ratings)
+
+    RatingRecord.create(orm, user_id, book.id, 5)
+
+    reloaded = collection.books_page()
+    shared = [b for b in reloaded if b.id == book.id][0]
+    # Same record through the identity map, its ratings were re-queried
+    assert shared is book
+    assert len(shared.ratings) == len(before) + 1
+    assert (user_id, 5) in [(r.user_id, r.rating) for r in shared.ratings]
+    ratings = [r.rating for r in before] + [5]
+    assert shared.avg_rating == round(sum(ratings) / len(ratings), 2)
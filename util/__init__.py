@@ -1,5 +1,6 @@
 from .context import ApplicationContext
 from .widget import ContextWidget, ContextScreen, ContextStatic, ContextModal
 from .exceptions import *
-from .orm import Record, ORM, SearchCondition, SearchQuery, SearchResult, search_internal, PaginationParams
+from .orm import Record, ORM, SearchCondition, SearchQuery, SearchResult, search_internal, PaginationParams, Relation, SearchSpec, BulkResult
+from .async_orm import AsyncORM
 from .pagination import PaginatedTable, PaginatedColumn
\ No newline at end of file
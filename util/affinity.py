@@ -0,0 +1,462 @@
+from dataclasses import dataclass, field
+from threading import Lock
+from time import monotonic
+from typing import TYPE_CHECKING, Optional
+import numpy as np
+
+if TYPE_CHECKING:
+    from .orm import ORM
+
+"""
+SUMMARY:
+In-process genre-affinity scoring for the For You recommendations.
+Keeps a sparse book x genre incidence matrix (rows normalized, so books with many genres
+don't outscore focused ones) and per-book rating totals. The matrix is stored as its
+non-zero entries (book row & genre column, sorted by row) plus one weight per book,
+a few bytes per book-genre pair instead of a dense row per book. A user's affinity vector
+is the rating-weighted sum of the rows of the books they rated, ratings below the
+neutral point count against a genre. Scoring every book is a single matrix-vector
+product (one weighted bincount), plus a small prior from each book's (damped) average rating.
+Rating changes made through rating_changed() update the totals & cached user vectors
+in place, the whole state is reloaded every max_age seconds to pick up other clients.
+A reload swaps in new arrays (books can shift rows), so every computation works on
+the arrays of a single load, and user vectors are tagged with the load they were
+built against and rebuilt after a reload.
+"""
+
+# Ratings are 0-5, weights are centred on the middle of the scale
+NEUTRAL_RATING = 2.5
+MAX_RATING = 5
+# Rows per round trip while loading
+LOAD_BATCH_SIZE = 10_000
+
+
+@dataclass
+class UserAffinity:
+    # book index -> rating
+    ratings: dict[int, float] = field(default_factory=dict)
+    # Unnormalized rating-weighted genre vector & the total absolute weight
+    vector: Optional[np.ndarray] = None
+    weight: float = 0
+    # Load the book indices & vector refer to (GenreAffinityEngine.loads)
+    generation: int = 0
+
+
+class GenreIncidence:
+    def __init__(
+        self,
+        entry_rows: np.ndarray,
+        entry_genres: np.ndarray,
+        book_weights: np.ndarray,
+        genres: int,
+    ) -> None:
+        """Sparse, row-normalized book x genre matrix (see build())
+
+        Args:
+            entry_rows (np.ndarray): Book row of each non-zero entry, sorted
+            entry_genres (np.ndarray): Genre column of each entry
+            book_weights (np.ndarray): Value of every entry in a book's row (1 / its genre count)
+            genres (int): Number of genre columns
+        """
+        self.entry_rows = entry_rows
+        self.entry_genres = entry_genres
+        self.book_weights = book_weights
+        self.genres = genres
+
+    @staticmethod
+    def build(
+        books: int, genres: int, rows: np.ndarray, columns: np.ndarray
+    ) -> "GenreIncidence":
+        """Builds the matrix from (book row, genre column) pairs
+
+        Args:
+            books (int): Number of book rows
+            genres (int): Number of genre columns
+            rows (np.ndarray): Book row of each pair
+            columns (np.ndarray): Genre column of each pair
+
+        Returns:
+            GenreIncidence: Matrix, duplicate pairs count once
+        """
+        order = np.lexsort((columns, rows))
+        rows, columns = rows[order], columns[order]
+        if len(rows) > 0:
+            unique = np.ones(len(rows), dtype=bool)
+            unique[1:] = (rows[1:] != rows[:-1]) | (columns[1:] != columns[:-1])
+            rows, columns = rows[unique], columns[unique]
+        counts = np.bincount(rows, minlength=books)
+        weights = np.zeros(books, dtype=np.float32)
+        np.divide(1, counts, out=weights, where=counts > 0)
+        return GenreIncidence(
+            rows.astype(np.int32), columns.astype(np.int32), weights, genres
+        )
+
+    @staticmethod
+    def empty() -> "GenreIncidence":
+        return GenreIncidence(
+            np.zeros(0, dtype=np.int32),
+            np.zeros(0, dtype=np.int32),
+            np.zeros(0, dtype=np.float32),
+            0,
+        )
+
+    def entries(self, indices: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Positions of the entries in the given rows
+
+        Args:
+            indices (np.ndarray): Book rows
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Entry positions & the number of entries per given row
+        """
+        starts = np.searchsorted(self.entry_rows, indices, "left")
+        lengths = np.searchsorted(self.entry_rows, indices, "right") - starts
+        offsets = np.cumsum(lengths) - lengths
+        positions = np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+        return positions, lengths
+
+    def combine(self, indices: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """Weighted sum of rows, ie weights @ matrix[indices]
+
+        Args:
+            indices (np.ndarray): Book rows
+            weights (np.ndarray): Weight of each row
+
+        Returns:
+            np.ndarray: Genre vector
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        positions, lengths = self.entries(indices)
+        values = np.repeat(np.asarray(weights, dtype=np.float64), lengths)
+        values *= self.book_weights[np.repeat(indices, lengths)]
+        return np.bincount(
+            self.entry_genres[positions], weights=values, minlength=self.genres
+        )
+
+    def dot(self, vector: np.ndarray) -> np.ndarray:
+        """Matrix-vector product, ie matrix @ vector
+
+        Args:
+            vector (np.ndarray): Genre vector
+
+        Returns:
+            np.ndarray: Value per book row
+        """
+        return (
+            np.bincount(
+                self.entry_rows,
+                weights=vector[self.entry_genres],
+                minlength=len(self.book_weights),
+            )
+            * self.book_weights
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self.entry_rows.nbytes + self.entry_genres.nbytes + self.book_weights.nbytes
+        )
+
+
+class GenreAffinityEngine:
+    def __init__(
+        self,
+        orm: "ORM",
+        prior_weight: float = 0.1,
+        prior_ratings: int = 5,
+        max_age: float = 600,
+        max_users: int = 256,
+    ) -> None:
+        """Engine (loads on first use)
+
+        Args:
+            orm (ORM): ORM object
+            prior_weight (float, optional): Weight of the average rating prior against genre affinity. Defaults to 0.1.
+            prior_ratings (int, optional): Damping of the average rating, in ratings of the global mean. Defaults to 5.
+            max_age (float, optional): Seconds before a full reload. Defaults to 600.
+            max_users (int, optional): Max cached user vectors. Defaults to 256.
+        """
+        self.orm = orm
+        self.prior_weight = prior_weight
+        self.prior_ratings = prior_ratings
+        self.max_age = max_age
+        self.max_users = max_users
+        self.lock = Lock()
+        self.loaded_at: Optional[float] = None
+        self.book_ids = np.zeros(0, dtype=np.int64)
+        self.genre_ids = np.zeros(0, dtype=np.int64)
+        self.incidence = GenreIncidence.empty()
+        self.rating_sum = np.zeros(0, dtype=np.float64)
+        self.rating_count = np.zeros(0, dtype=np.float64)
+        self.users: dict[int, UserAffinity] = {}
+        self.loads = 0
+        self.updates = 0
+
+    def load(self):
+        """Rebuilds the incidence matrix & rating totals, dropping cached user vectors"""
+        book_ids = self.read_array("SELECT id FROM books ORDER BY id", 1, np.int64)[:, 0]
+        genre_ids = self.read_array("SELECT id FROM genres ORDER BY id", 1, np.int64)[:, 0]
+        pairs = self.read_array("SELECT book_id, genre_id FROM books_genres", 2, np.int32)
+        totals = self.read_array(
+            "SELECT book_id, SUM(rating), COUNT(rating) FROM users_ratings WHERE rating IS NOT NULL GROUP BY book_id",
+            3,
+            np.float64,
+        )
+
+        # The junction tables have no foreign keys, orphaned pairs are skipped
+        book_rows, known_books = locate(book_ids, pairs[:, 0])
+        genre_columns, known_genres = locate(genre_ids, pairs[:, 1])
+        known = known_books & known_genres
+        incidence = GenreIncidence.build(
+            len(book_ids), len(genre_ids), book_rows[known], genre_columns[known]
+        )
+        del pairs
+
+        rating_sum = np.zeros(len(book_ids), dtype=np.float64)
+        rating_count = np.zeros(len(book_ids), dtype=np.float64)
+        rows, known = locate(book_ids, totals[:, 0].astype(np.int64))
+        rating_sum[rows[known]] = totals[known, 1]
+        rating_count[rows[known]] = totals[known, 2]
+
+        with self.lock:
+            self.book_ids = book_ids
+            self.genre_ids = genre_ids
+            self.incidence = incidence
+            self.rating_sum = rating_sum
+            self.rating_count = rating_count
+            self.users = {}
+            self.loaded_at = monotonic()
+            self.loads += 1
+
+    def read_array(self, query: str, columns: int, dtype: type) -> np.ndarray:
+        """Streams a query into a rows x columns array, only one batch of tuples is held at a time
+
+        Args:
+            query (str): SQL query
+            columns (int): Number of columns it selects
+            dtype (type): Array type
+
+        Returns:
+            np.ndarray: Query rows
+        """
+        chunks = [
+            np.array(rows, dtype=dtype).reshape(-1, columns)
+            for rows in self.orm.stream_rows(query, batch_size=LOAD_BATCH_SIZE)
+        ]
+        if len(chunks) == 0:
+            return np.zeros((0, columns), dtype=dtype)
+        return np.concatenate(chunks)
+
+    def expire(self):
+        """Reloads on next use, after writes that can't be applied incrementally (ie bulk ratings)"""
+        with self.lock:
+            self.loaded_at = None
+
+    def ensure_loaded(self):
+        if self.loaded_at == None or monotonic() - self.loaded_at > self.max_age:
+            self.load()
+
+    def index(
+        self, book_id: int, book_ids: Optional[np.ndarray] = None
+    ) -> Optional[int]:
+        """Row of a book in the matrix, or None for books added since the last load
+
+        Args:
+            book_id (int): Book ID
+            book_ids (Optional[np.ndarray], optional): Book IDs of a snapshotted load. Defaults to the current ones.
+
+        Returns:
+            Optional[int]: Row index
+        """
+        book_ids = book_ids if book_ids is not None else self.book_ids
+        i = int(np.searchsorted(book_ids, book_id))
+        if i < len(book_ids) and book_ids[i] == book_id:
+            return i
+        return None
+
+    def user(self, user_id: int) -> UserAffinity:
+        """Affinity of a user, computed from their ratings on first use
+
+        Args:
+            user_id (int): User ID
+
+        Returns:
+            UserAffinity: Cached user state
+        """
+        with self.lock:
+            cached = self.users.get(user_id)
+            generation = self.loads
+            book_ids, genre_ids, incidence = (
+                self.book_ids,
+                self.genre_ids,
+                self.incidence,
+            )
+        if cached != None and cached.generation == generation:
+            return cached
+
+        rows = self.orm.db.execute(
+            "SELECT book_id, rating FROM users_ratings WHERE user_id = %s AND rating IS NOT NULL",
+            [user_id],
+            prepare=True,
+        ).fetchall()
+        affinity = UserAffinity(
+            vector=np.zeros(len(genre_ids), dtype=np.float64), generation=generation
+        )
+        indices, weights = [], []
+        for book_id, rating in rows:
+            i = self.index(book_id, book_ids)
+            if i != None:
+                affinity.ratings[i] = float(rating)
+                indices.append(i)
+                weights.append(float(rating) - NEUTRAL_RATING)
+        if len(indices) > 0:
+            weights = np.array(weights)
+            affinity.vector = incidence.combine(np.array(indices), weights)
+            affinity.weight = float(np.abs(weights).sum())
+
+        with self.lock:
+            # Reloaded meanwhile, the vector is still right for the snapshot it was built on
+            if self.loads != generation:
+                return affinity
+            if len(self.users) >= self.max_users:
+                self.users.pop(next(iter(self.users)))
+            self.users[user_id] = affinity
+        return affinity
+
+    def rating_changed(
+        self,
+        user_id: int,
+        book_id: int,
+        rating: Optional[float],
+        previous: Optional[float] = None,
+    ):
+        """Applies a rating change to the totals & the user's cached vector
+
+        Args:
+            user_id (int): User ID
+            book_id (int): Book ID
+            rating (Optional[float]): New rating, None when it was removed
+            previous (Optional[float], optional): Rating it replaced, if any. Defaults to None.
+        """
+        if self.loaded_at == None:
+            return
+        with self.lock:
+            i = self.index(book_id)
+            if i == None:
+                # Book is newer than the matrix, picked up by the next load
+                return
+            affinity = self.users.get(user_id)
+            if affinity != None and affinity.generation != self.loads:
+                # Built against an older load, rebuilt on next use
+                self.users.pop(user_id)
+                affinity = None
+            if affinity != None and i in affinity.ratings:
+                previous = affinity.ratings[i]
+            if previous != None:
+                self.rating_sum[i] -= previous
+                self.rating_count[i] -= 1
+            if rating != None:
+                self.rating_sum[i] += rating
+                self.rating_count[i] += 1
+
+            if affinity != None:
+                if previous != None:
+                    affinity.vector -= self.incidence.combine([i], [previous - NEUTRAL_RATING])
+                    affinity.weight -= abs(previous - NEUTRAL_RATING)
+                    affinity.ratings.pop(i, None)
+                if rating != None:
+                    affinity.vector += self.incidence.combine([i], [rating - NEUTRAL_RATING])
+                    affinity.weight += abs(rating - NEUTRAL_RATING)
+                    affinity.ratings[i] = float(rating)
+            self.updates += 1
+
+    def scores(self, user_id: int) -> np.ndarray:
+        """Scores every book for a user in one pass, rated books score -inf
+
+        Args:
+            user_id (int): User ID
+
+        Returns:
+            np.ndarray: Score per book, aligned with book_ids
+        """
+        return self.scored(user_id)[0]
+
+    def scored(self, user_id: int) -> tuple[np.ndarray, np.ndarray]:
+        """Scores every book for a user, along with the book IDs of the load scored against
+
+        Args:
+            user_id (int): User ID
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Score per book & the aligned book IDs
+        """
+        self.ensure_loaded()
+        while True:
+            affinity = self.user(user_id)
+            with self.lock:
+                # A reload landed after the vector was built, its indices are for the old rows
+                if affinity.generation != self.loads:
+                    continue
+                book_ids = self.book_ids
+                vector = (
+                    affinity.vector / affinity.weight
+                    if affinity.weight > 0
+                    else affinity.vector
+                )
+                rated = list(affinity.ratings.keys())
+                count = self.rating_count
+                mean = self.rating_sum.sum() / count.sum() if count.sum() > 0 else NEUTRAL_RATING
+                # Average rating damped towards the global mean, so single ratings don't dominate
+                prior = (self.rating_sum + self.prior_ratings * mean) / (
+                    count + self.prior_ratings
+                )
+                scores = self.incidence.dot(vector) + self.prior_weight * prior / MAX_RATING
+            scores[rated] = -np.inf
+            return scores, book_ids
+
+    def recommend(self, user_id: int, limit: int = 20) -> list[int]:
+        """Best scoring books the user hasn't rated
+
+        Args:
+            user_id (int): User ID
+            limit (int, optional): Max number of books. Defaults to 20.
+
+        Returns:
+            list[int]: Book IDs, best first
+        """
+        scores, book_ids = self.scored(user_id)
+        candidates = np.flatnonzero(np.isfinite(scores))
+        if len(candidates) > limit:
+            candidates = np.sort(
+                candidates[np.argpartition(-scores[candidates], limit)[:limit]]
+            )
+        # Ties keep ascending ID order
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [int(b) for b in book_ids[candidates]]
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "books": len(self.book_ids),
+            "genres": len(self.genre_ids),
+            "incidence_bytes": self.incidence.nbytes,
+            "users": len(self.users),
+            "loads": self.loads,
+            "updates": self.updates,
+        }
+
+
+def locate(ids: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Positions of values in a sorted ID array
+
+    Args:
+        ids (np.ndarray): Sorted IDs
+        values (np.ndarray): IDs to look up
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Position of each value & whether it's actually in ids
+            (positions of missing values are clipped into range, mask them out before use)
+    """
+    positions = np.minimum(np.searchsorted(ids, values), max(len(ids) - 1, 0))
+    if len(ids) == 0:
+        return positions, np.zeros(len(values), dtype=bool)
+    return positions, ids[positions] == values
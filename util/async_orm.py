@@ -0,0 +1,276 @@
+from asyncio import Lock
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import replace
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Sequence
+from psycopg import AsyncConnection, AsyncPipeline
+from psycopg_pool import AsyncConnectionPool
+from .orm import (
+    ORM,
+    Record,
+    SearchResult,
+    SearchSpec,
+    PaginationParams,
+    plan_search,
+    finish_search,
+    stream_ids,
+    STREAM_BATCH_SIZE,
+)
+from .exceptions import *
+
+"""
+SUMMARY:
+Async counterpart of the ORM, for awaiting queries from async (non-thread) workers.
+Wraps the sync ORM and shares its caches (statements, search results, identity map),
+so records built here are the same instances the sync side sees.
+Each task checks out its own pooled AsyncConnection, so independent queries can run
+at once with asyncio.gather. Lazy record properties still query synchronously;
+await prefetch() first to load relations without blocking the event loop.
+"""
+
+
+class AsyncORM:
+    def __init__(
+        self,
+        orm: ORM,
+        conninfo: str,
+        min_size: int = 1,
+        max_size: int = 4,
+        timeout: float = 30,
+        configure: Optional[Callable[[AsyncConnection], Awaitable[None]]] = None,
+    ) -> None:
+        """Creates the async pool (opened with open(), from a running event loop)
+
+        Args:
+            orm (ORM): Sync ORM to share caches & record factories with
+            conninfo (str): Connection string
+            min_size (int, optional): Connections kept open. Defaults to 1.
+            max_size (int, optional): Max connections, bounds concurrent queries. Defaults to 4.
+            timeout (float, optional): Seconds to wait for a free connection. Defaults to 30.
+            configure (Optional[Callable[[AsyncConnection], Awaitable[None]]], optional): Awaited on each new connection. Defaults to None.
+        """
+        self.orm = orm
+        self.pool = AsyncConnectionPool(
+            conninfo,
+            min_size=min_size,
+            max_size=max_size,
+            timeout=timeout,
+            configure=configure,
+            check=AsyncConnectionPool.check_connection,
+            name="books-db-async",
+            open=False,
+        )
+        # Connection checked out by the current task (tasks inherit it from their creator)
+        self.current: ContextVar[Optional[AsyncConnection]] = ContextVar(
+            "async_orm_connection", default=None
+        )
+        # Serializes opening, tasks that mount at once would otherwise each open the pool
+        self.open_lock = Lock()
+
+    async def open(self):
+        async with self.open_lock:
+            if self.pool.closed:
+                await self.pool.open()
+
+    async def close(self):
+        await self.pool.close()
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[AsyncConnection]:
+        """Checks out a connection for the current task (re-entrant).
+            Tasks gathered inside the block share it (and run one at a time),
+            gather outside of it to run queries concurrently.
+
+        Yields:
+            AsyncIterator[AsyncConnection]: Checked out connection
+        """
+        current = self.current.get()
+        if current != None:
+            yield current
+            return
+
+        # Widgets can mount (and query) before the app opens the pool
+        if self.pool.closed:
+            await self.open()
+        async with self.pool.connection() as connection:
+            token = self.current.set(connection)
+            try:
+                yield connection
+            finally:
+                self.current.reset(token)
+
+    async def fetchall(
+        self, query: str, params: Optional[Sequence[Any]] = None, prepare: bool = True
+    ) -> list[tuple]:
+        """Runs a query and returns every row
+
+        Args:
+            query (str): SQL query
+            params (Optional[Sequence[Any]], optional): Query parameters. Defaults to None.
+            prepare (bool, optional): Prepare the statement server-side. Defaults to True.
+
+        Returns:
+            list[tuple]: Result rows
+        """
+        async with self.connection() as db:
+            cursor = await db.execute(query, params, prepare=prepare)
+            rows = await cursor.fetchall()
+            await cursor.close()
+            return rows
+
+    async def fetchone(
+        self, query: str, params: Optional[Sequence[Any]] = None, prepare: bool = True
+    ) -> Optional[tuple]:
+        """Runs a query and returns its first row
+
+        Args:
+            query (str): SQL query
+            params (Optional[Sequence[Any]], optional): Query parameters. Defaults to None.
+            prepare (bool, optional): Prepare the statement server-side. Defaults to True.
+
+        Returns:
+            Optional[tuple]: First row, or None
+        """
+        async with self.connection() as db:
+            cursor = await db.execute(query, params, prepare=prepare)
+            row = await cursor.fetchone()
+            await cursor.close()
+            return row
+
+    async def search(
+        self, record_type: type[Record], pagination: PaginationParams, **kwargs
+    ) -> SearchResult:
+        """Async Record.search
+
+        Args:
+            record_type (type[Record]): Record subclass implementing search_spec
+            pagination (PaginationParams): Pagination data
+
+        Returns:
+            SearchResult: Search result
+        """
+        return await self.execute_search(record_type.search_spec(pagination, **kwargs))
+
+    async def execute_search(self, spec: SearchSpec) -> SearchResult:
+        """Async execute_search, same statements & caching as the sync ORM
+
+        Args:
+            spec (SearchSpec): Search to run
+
+        Returns:
+            SearchResult: Search result
+        """
+        plan = plan_search(self.orm, spec)
+        if isinstance(plan, SearchResult):
+            return plan
+        statements = plan.statements
+
+        async with self.connection() as db:
+            if statements.combined:
+                cursor = await db.execute(
+                    statements.query, plan.count_fields + plan.fields, prepare=True
+                )
+                rows = await cursor.fetchall()
+                columns = [c.name for c in cursor.description][:-1]
+                await cursor.close()
+                if len(rows) > 0:
+                    total_count = rows[0][-1]
+                elif plan.recount:
+                    cursor_count = await db.execute(
+                        statements.count, plan.count_fields, prepare=True
+                    )
+                    row = await cursor_count.fetchone()
+                    total_count = row[0] if row != None else 0
+                    await cursor_count.close()
+                else:
+                    total_count = 0
+                rows = [r[:-1] for r in rows]
+            else:
+                if AsyncPipeline.is_supported():
+                    async with db.pipeline():
+                        cursor = await db.execute(
+                            statements.query, plan.fields, prepare=True
+                        )
+                        cursor_count = await db.execute(
+                            statements.count, plan.count_fields, prepare=True
+                        )
+                else:
+                    cursor = await db.execute(
+                        statements.query, plan.fields, prepare=True
+                    )
+                    cursor_count = await db.execute(
+                        statements.count, plan.count_fields, prepare=True
+                    )
+                row = await cursor_count.fetchone()
+                total_count = row[0] if row != None else 0
+                rows = await cursor.fetchall()
+                columns = [c.name for c in cursor.description]
+                await cursor.close()
+                await cursor_count.close()
+
+        return finish_search(self.orm, plan, rows, columns, total_count)
+
+    async def prefetch(self, records: list[Record], *relations: str) -> list[Record]:
+        """Async ORM.prefetch, one query per relation for all records
+
+        Args:
+            records (list[Record]): Records of a single type, keyed by their id
+            relations (str): Relation names from the record type's RELATIONS
+
+        Returns:
+            list[Record]: The same records, with relation caches populated
+        """
+        for name in relations:
+            relation, pending = self.orm.pending_relation(records, name)
+            if len(pending) == 0:
+                continue
+            rows = await self.fetchall(relation.query, [list(pending.keys())])
+            self.orm.fill_relation(relation, name, pending, rows)
+        return records
+
+    async def stream_search(
+        self,
+        spec: SearchSpec,
+        batch_size: int = STREAM_BATCH_SIZE,
+        prefetch: Sequence[str] = (),
+    ) -> AsyncIterator[Record]:
+        """Async ORM.stream_search, through a named server-side cursor
+
+        Args:
+            spec (SearchSpec): Search to run
+            batch_size (int, optional): Rows per round trip. Defaults to STREAM_BATCH_SIZE.
+            prefetch (Sequence[str], optional): Relations to load per batch. Defaults to ().
+
+        Yields:
+            AsyncIterator[Record]: Records, in the search's order
+        """
+        plan = plan_search(
+            self.orm,
+            replace(
+                spec,
+                offset=None,
+                limit=None,
+                after=None,
+                before=None,
+                combine=False,
+                cache=False,
+            ),
+        )
+        async with self.connection() as db:
+            cursor = db.cursor(name="stream_" + str(next(stream_ids)))
+            try:
+                await cursor.execute(plan.statements.query, plan.fields)
+                while True:
+                    rows = await cursor.fetchmany(batch_size)
+                    if len(rows) == 0:
+                        return
+                    batch = [
+                        spec.factory(self.orm.db, spec.table, self.orm, *r)
+                        for r in rows
+                    ]
+                    if len(prefetch) > 0:
+                        await self.prefetch(batch, *prefetch)
+                    for record in batch:
+                        yield record
+            finally:
+                await cursor.close()
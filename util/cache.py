@@ -0,0 +1,333 @@
+from dataclasses import dataclass
+from collections import OrderedDict
+from sys import getsizeof
+from threading import Lock
+from time import monotonic
+from typing import Any, Optional
+from datetime import datetime
+
+"""
+SUMMARY:
+Search result cache, keyed on the full search (record factory, conditions
+and their values, ordering, pagination).
+Entries store raw rows, so records are rebuilt (through the identity map) on
+every hit. Each entry is tagged with the tables its query reads, and writes
+invalidate every entry carrying one of the written tables.
+RecommendationCache keeps whole record lists per user & mode instead, and only
+marks them stale, so they can still be shown while they are re-fetched.
+"""
+
+
+@dataclass
+class CachedSearch:
+    rows: list[tuple]
+    total: int
+    first_key: Optional[list[Any]]
+    last_key: Optional[list[Any]]
+
+
+@dataclass
+class CacheEntry:
+    value: CachedSearch
+    tags: frozenset[str]
+    size: int
+    expires: float
+
+
+def freeze(value: Any) -> Any:
+    """Converts a value into a hashable equivalent (lists & dicts become tuples)
+
+    Args:
+        value (Any): Value to convert
+
+    Returns:
+        Any: Hashable value
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple([freeze(v) for v in value])
+    if isinstance(value, dict):
+        return tuple(sorted([(k, freeze(v)) for k, v in value.items()]))
+    if isinstance(value, set):
+        return frozenset([freeze(v) for v in value])
+    return value
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate memory used by a value, following containers
+
+    Args:
+        value (Any): Value to measure
+
+    Returns:
+        int: Size in bytes
+    """
+    size = getsizeof(value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        size += sum([estimate_size(v) for v in value])
+    elif isinstance(value, dict):
+        size += sum([estimate_size(k) + estimate_size(v) for k, v in value.items()])
+    return size
+
+
+class SearchCache:
+    def __init__(
+        self, max_entries: int = 512, max_bytes: int = 16 * 1024 * 1024, ttl: float = 60
+    ) -> None:
+        """LRU of search results, bounded by entry count & memory, with expiry
+
+        Args:
+            max_entries (int, optional): Max number of cached searches. Defaults to 512.
+            max_bytes (int, optional): Max approximate size of all cached rows. Defaults to 16MiB.
+            ttl (float, optional): Seconds an entry stays valid, 0 disables the cache. Defaults to 60.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries: OrderedDict[tuple, CacheEntry] = OrderedDict()
+        self.size = 0
+        # Bumped on every invalidation, so searches that started before a write
+        # don't store their (possibly stale) results after it
+        self.generations: dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.lock = Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def generation(self, tags: list[str]) -> tuple[int, ...]:
+        """Current generation of a set of tags, pass it back to put()"""
+        with self.lock:
+            return tuple([self.generations.get(t, 0) for t in tags])
+
+    def get(self, key: tuple) -> Optional[CachedSearch]:
+        """Gets a cached search
+
+        Args:
+            key (tuple): Search key
+
+        Returns:
+            Optional[CachedSearch]: Cached result, or None on a miss
+        """
+        if not self.enabled:
+            return None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry == None:
+                self.misses += 1
+                return None
+            if entry.expires <= monotonic():
+                self.remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry.value
+
+    def put(
+        self,
+        key: tuple,
+        value: CachedSearch,
+        tags: list[str],
+        generation: tuple[int, ...],
+    ) -> bool:
+        """Caches a search result
+
+        Args:
+            key (tuple): Search key
+            value (CachedSearch): Result to cache
+            tags (list[str]): Tables the search reads
+            generation (tuple[int, ...]): Tag generation from before the search ran
+
+        Returns:
+            bool: False if the result wasn't cached (stale, disabled or too large)
+        """
+        if not self.enabled:
+            return False
+        size = estimate_size(value.rows)
+        if size > self.max_bytes:
+            return False
+        with self.lock:
+            if tuple([self.generations.get(t, 0) for t in tags]) != generation:
+                return False
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = CacheEntry(
+                value, frozenset(tags), size, monotonic() + self.ttl
+            )
+            self.size += size
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+        return True
+
+    # Callers hold the lock
+    def remove(self, key: tuple):
+        entry = self.entries.pop(key)
+        self.size -= entry.size
+
+    def invalidate(self, *tags: str) -> int:
+        """Drops every entry reading any of the given tables
+
+        Args:
+            tags (str): Written table names
+
+        Returns:
+            int: Number of entries dropped
+        """
+        with self.lock:
+            for tag in tags:
+                self.generations[tag] = self.generations.get(tag, 0) + 1
+            stale = [
+                key
+                for key, entry in self.entries.items()
+                if not entry.tags.isdisjoint(tags)
+            ]
+            for key in stale:
+                self.remove(key)
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups > 0 else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "size": len(self.entries),
+            "bytes": self.size,
+        }
+
+
+@dataclass
+class CachedRecommendation:
+    records: list[Any]
+    # When the data source was last refreshed (ie a rollup), None for live queries
+    refreshed: Optional[datetime]
+    fetched: float
+    stale: bool = False
+
+
+class RecommendationCache:
+    def __init__(
+        self, tags: dict[str, list[str]], max_age: float = 300, max_users: int = 16
+    ) -> None:
+        """Stale-while-revalidate cache of record lists, per user & mode
+
+        Args:
+            tags (dict[str, list[str]]): Tables each mode reads, writes to them mark the mode stale
+            max_age (float, optional): Seconds before an entry goes stale on its own. Defaults to 300.
+            max_users (int, optional): Max number of users with cached entries. Defaults to 16.
+        """
+        self.tags = tags
+        self.max_age = max_age
+        self.max_users = max_users
+        self.entries: OrderedDict[int, dict[str, CachedRecommendation]] = OrderedDict()
+        # Bumped per mode on every invalidation, results fetched before one are stored as stale
+        self.generations: dict[str, int] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def generation(self, mode: str) -> int:
+        """Current generation of a mode, pass it back to put()"""
+        with self.lock:
+            return self.generations.get(mode, 0)
+
+    def get(self, user_id: int, mode: str) -> Optional[CachedRecommendation]:
+        """Gets a cached list, check its stale flag to decide whether to re-fetch
+
+        Args:
+            user_id (int): User ID
+            mode (str): Recommendation mode
+
+        Returns:
+            Optional[CachedRecommendation]: Cached entry, or None on a miss
+        """
+        with self.lock:
+            entry = self.entries.get(user_id, {}).get(mode)
+            if entry == None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(user_id)
+            if monotonic() - entry.fetched > self.max_age:
+                entry.stale = True
+            if entry.stale:
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def put(
+        self,
+        user_id: int,
+        mode: str,
+        records: list[Any],
+        refreshed: Optional[datetime],
+        generation: int,
+    ):
+        """Caches a fetched list
+
+        Args:
+            user_id (int): User ID
+            mode (str): Recommendation mode
+            records (list[Any]): Fetched records
+            refreshed (Optional[datetime]): When the records' source was last refreshed, None if live
+            generation (int): Generation from before the fetch started
+        """
+        with self.lock:
+            self.entries.setdefault(user_id, {})[mode] = CachedRecommendation(
+                records, refreshed, monotonic(), generation != self.generations.get(mode, 0)
+            )
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_users:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, tables: tuple[str, ...]) -> int:
+        """Marks the modes reading any of the given tables stale (ORM listener)
+
+        Args:
+            tables (tuple[str, ...]): Written table names
+
+        Returns:
+            int: Number of entries marked stale
+        """
+        modes = [m for m, t in self.tags.items() if not set(t).isdisjoint(tables)]
+        marked = 0
+        with self.lock:
+            for mode in modes:
+                self.generations[mode] = self.generations.get(mode, 0) + 1
+            for entries in self.entries.values():
+                for mode in modes:
+                    if mode in entries and not entries[mode].stale:
+                        entries[mode].stale = True
+                        marked += 1
+        return marked
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.stale_hits) / lookups if lookups > 0 else 0.0,
+            "users": len(self.entries),
+        }
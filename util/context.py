@@ -1,10 +1,16 @@
 from dataclasses import dataclass
 from dotenv import load_dotenv
 from psycopg import Connection, connect
+from psycopg.conninfo import make_conninfo
 from sshtunnel import SSHTunnelForwarder
 from os import getenv, environ
 from typing import Optional, Literal
 from .orm import ORM
+from .async_orm import AsyncORM
+from .pool import DatabasePool
+from .cache import SearchCache
+from .rollups import RollupScheduler
+from .instrument import QUERY_STATS, instrument, instrument_async
 from app_types import *
 from datetime import datetime
 from time import time
@@ -27,6 +33,17 @@ class DatabaseOptions:
     tunnel_username: Optional[str]
     tunnel_password: Optional[str]
 
+    pool_min: int
+    pool_max: int
+
+
+# Search result cache options from ENV
+@dataclass
+class SearchCacheOptions:
+    entries: int
+    memory_mb: float
+    ttl: float
+
 
 # Database AutoLogin options from ENV
 @dataclass
@@ -39,18 +56,48 @@ class DebugAutologin:
 @dataclass
 class ContextOptions:
     database: DatabaseOptions
+    search_cache: SearchCacheOptions
+    rollup_refresh_interval: float
     debug_autologin: Optional[DebugAutologin]
     debug_autotab: Optional[Literal["self", "books", "users"]]
+    debug_orm_stats: bool
+    query_stats: bool
 
 
 # Centralized application context class
 class ApplicationContext:
     def __init__(self) -> None:
         self.options: ContextOptions = self.parse_options()
-        self.db, self.tunnel = self.open_database()
-        self.orm: ORM = ORM(self.db)
+        # Every connection gets the instrumented cursors, recording can be toggled later
+        self.query_stats = QUERY_STATS
+        self.query_stats.enabled = self.options.query_stats
+        self.main_db, self.pool, self.tunnel, conninfo = self.open_database()
+        self.orm: ORM = ORM(
+            self.main_db,
+            self.pool,
+            SearchCache(
+                max_entries=self.options.search_cache.entries,
+                max_bytes=int(self.options.search_cache.memory_mb * 1024 * 1024),
+                ttl=self.options.search_cache.ttl,
+            ),
+        )
         self.orm.register("books", BookRecord)
         self.orm.register("users", UserRecord)
+        # Opened/closed by the app, the async pool needs its event loop
+        self.async_orm = AsyncORM(
+            self.orm,
+            conninfo,
+            min_size=self.options.database.pool_min,
+            max_size=self.options.database.pool_max,
+            configure=instrument_async,
+        )
+        # Keeps the recommendation rollups fresh in the background
+        self.rollups = RollupScheduler(
+            self.pool, self.orm, interval=self.options.rollup_refresh_interval
+        )
+        self.rollups.start()
+        # For You scoring (owned by the ORM so rating writes update it), loaded by the first recommendation
+        self.affinity = self.orm.affinity
         self.logged_in: Optional[UserRecord] = None
 
     # Parse options from environment variables
@@ -70,7 +117,15 @@ class ApplicationContext:
                 else None,
                 tunnel_username=environ["DB_TUNNEL_USERNAME"] if tunnelled else None,
                 tunnel_password=environ["DB_TUNNEL_PASSWORD"] if tunnelled else None,
+                pool_min=int(getenv("DB_POOL_MIN", "1")),
+                pool_max=int(getenv("DB_POOL_MAX", "4")),
             ),
+            search_cache=SearchCacheOptions(
+                entries=int(getenv("SEARCH_CACHE_ENTRIES", "512")),
+                memory_mb=float(getenv("SEARCH_CACHE_MEMORY_MB", "16")),
+                ttl=float(getenv("SEARCH_CACHE_TTL", "60")),
+            ),
+            rollup_refresh_interval=float(getenv("ROLLUP_REFRESH_INTERVAL", "300")),
             debug_autologin=DebugAutologin(
                 email=environ["DEBUG_AUTOLOGIN_EMAIL"],
                 password=environ["DEBUG_AUTOLOGIN_PASSWORD"],
@@ -80,10 +135,22 @@ class ApplicationContext:
             debug_autotab=environ["DEBUG_AUTOTAB_NAME"]
             if getenv("DEBUG_FLAG_AUTOTAB", "false") == "true"
             else None,
+            debug_orm_stats=getenv("DEBUG_FLAG_ORM_STATS", "false") == "true",
+            query_stats=getenv("QUERY_STATS", "false") == "true",
         )
 
+    # Connection currently usable by the calling thread
+    # (the worker's checked out connection, or the main one)
+    @property
+    def db(self) -> Connection:
+        return self.orm.db
+
     # Activate database from ENV options
-    def open_database(self) -> tuple[Connection, Optional[SSHTunnelForwarder]]:
+    def open_database(
+        self,
+    ) -> tuple[Connection, DatabasePool, Optional[SSHTunnelForwarder], str]:
+        tunnel = None
+        host, port = self.options.database.host, self.options.database.port
         if self.options.database.tunnelled:
             tunnel = SSHTunnelForwarder(
                 (self.options.database.tunnel_host, self.options.database.tunnel_port),
@@ -95,29 +162,32 @@ class ApplicationContext:
                 ),
             )
             tunnel.start()
-            connection = connect(
-                dbname=self.options.database.database,
-                user=self.options.database.username,
-                password=self.options.database.password,
-                host=tunnel.local_bind_host,
-                port=tunnel.local_bind_port,
-            )
-            return connection, tunnel
-
-        else:
-            connection = connect(
-                dbname=self.options.database.database,
-                user=self.options.database.username,
-                password=self.options.database.password,
-                host=self.options.database.host,
-                port=self.options.database.port,
-            )
-            return connection, None
+            # Pooled connections all go through the same forwarded port
+            host, port = tunnel.local_bind_host, tunnel.local_bind_port
+
+        conninfo = make_conninfo(
+            dbname=self.options.database.database,
+            user=self.options.database.username,
+            password=self.options.database.password,
+            host=host,
+            port=port,
+        )
+        connection = connect(conninfo)
+        instrument(connection)
+        pool = DatabasePool(
+            conninfo,
+            min_size=self.options.database.pool_min,
+            max_size=self.options.database.pool_max,
+            configure=instrument,
+        )
+        return connection, pool, tunnel, conninfo
 
-    # Cleanup database & SSH tunnel
+    # Cleanup database, pool & SSH tunnel
     def cleanup(self):
-        self.db.commit()
-        self.db.close()
+        self.rollups.stop()
+        self.main_db.commit()
+        self.main_db.close()
+        self.pool.close()
         if self.tunnel:
             self.tunnel.stop()
 
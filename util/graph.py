@@ -0,0 +1,130 @@
+from array import array
+from bisect import bisect_left
+from threading import Lock
+from time import monotonic
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from .orm import ORM
+
+"""
+SUMMARY:
+In-memory adjacency cache of the follow graph (users_following).
+Each user's followed & follower IDs are kept as sorted int arrays, loaded with a
+single scan and updated in place by follow()/unfollow() after the write commits.
+The whole graph is reloaded every max_age seconds to pick up other clients.
+"""
+
+EMPTY = array("i")
+# Edges per round trip while loading, the rows are two ints each
+LOAD_BATCH_SIZE = 10_000
+
+
+class FollowGraph:
+    def __init__(self, orm: "ORM", max_age: float = 600) -> None:
+        """Graph (loads on first use)
+
+        Args:
+            orm (ORM): ORM object
+            max_age (float, optional): Seconds before a full reload. Defaults to 600.
+        """
+        self.orm = orm
+        self.max_age = max_age
+        self.lock = Lock()
+        self.loaded_at: Optional[float] = None
+        # user_id -> sorted IDs of the users they follow
+        self.outgoing: dict[int, array] = {}
+        # user_id -> sorted IDs of the users following them
+        self.incoming: dict[int, array] = {}
+        self.loads = 0
+
+    def load(self):
+        """Reads every follow edge in one scan, streamed in batches"""
+        outgoing: dict[int, array] = {}
+        incoming: dict[int, list[int]] = {}
+        for rows in self.orm.stream_rows(
+            "SELECT user_id, following_id FROM users_following ORDER BY user_id, following_id",
+            batch_size=LOAD_BATCH_SIZE,
+        ):
+            for user_id, following_id in rows:
+                outgoing.setdefault(user_id, array("i")).append(following_id)
+                incoming.setdefault(following_id, []).append(user_id)
+
+        with self.lock:
+            self.outgoing = outgoing
+            # Edges come sorted by user_id, so follower lists are already in order
+            self.incoming = {k: array("i", v) for k, v in incoming.items()}
+            self.loaded_at = monotonic()
+            self.loads += 1
+
+    def ensure_loaded(self):
+        if self.loaded_at == None or monotonic() - self.loaded_at > self.max_age:
+            self.load()
+
+    def following(self, user_id: int) -> array:
+        """IDs of the users a user follows
+
+        Args:
+            user_id (int): User ID
+
+        Returns:
+            array: Sorted user IDs (a copy)
+        """
+        self.ensure_loaded()
+        with self.lock:
+            return array("i", self.outgoing.get(user_id, EMPTY))
+
+    def followers(self, user_id: int) -> array:
+        """IDs of the users following a user
+
+        Args:
+            user_id (int): User ID
+
+        Returns:
+            array: Sorted user IDs (a copy)
+        """
+        self.ensure_loaded()
+        with self.lock:
+            return array("i", self.incoming.get(user_id, EMPTY))
+
+    def is_following(self, user_id: int, following_id: int) -> bool:
+        self.ensure_loaded()
+        with self.lock:
+            ids = self.outgoing.get(user_id, EMPTY)
+            i = bisect_left(ids, following_id)
+            return i < len(ids) and ids[i] == following_id
+
+    def follow(self, user_id: int, following_id: int):
+        """Adds an edge, call once the insert has committed"""
+        if self.loaded_at == None:
+            return
+        with self.lock:
+            add_sorted(self.outgoing.setdefault(user_id, array("i")), following_id)
+            add_sorted(self.incoming.setdefault(following_id, array("i")), user_id)
+
+    def unfollow(self, user_id: int, following_id: int):
+        """Removes an edge, call once the delete has committed"""
+        if self.loaded_at == None:
+            return
+        with self.lock:
+            remove_sorted(self.outgoing.get(user_id, EMPTY), following_id)
+            remove_sorted(self.incoming.get(following_id, EMPTY), user_id)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "users": len(self.outgoing.keys() | self.incoming.keys()),
+            "edges": sum([len(v) for v in self.outgoing.values()]),
+            "loads": self.loads,
+        }
+
+
+def add_sorted(ids: array, value: int):
+    i = bisect_left(ids, value)
+    if i == len(ids) or ids[i] != value:
+        ids.insert(i, value)
+
+
+def remove_sorted(ids: array, value: int):
+    i = bisect_left(ids, value)
+    if i < len(ids) and ids[i] == value:
+        del ids[i]
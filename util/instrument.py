@@ -0,0 +1,343 @@
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from os import path
+from threading import Lock
+from time import monotonic, perf_counter
+from typing import Any, Optional
+from psycopg import (
+    AsyncConnection,
+    AsyncCursor,
+    AsyncServerCursor,
+    Connection,
+    Cursor,
+    ServerCursor,
+)
+import re
+import sys
+
+"""
+SUMMARY:
+Query instrumentation, through psycopg cursor factories installed on every connection
+(the main one, the thread & async pools). Each execute is recorded under its normalized
+statement signature (literals & parameters replaced with ?), with the code that issued it
+(first frame in the app outside the ORM/pool plumbing), latency, rows and approximate bytes.
+Bursts of the same signature from the same caller are flagged as likely N+1 patterns.
+Statements sent in pipeline mode are counted, their latency only covers sending them.
+Shown by the debug screen (screens/debug.py).
+Recording is off by default (QUERY_STATS=true, or resuming it in the debug screen, turns it on),
+while off each execute only pays for the enabled check, not the caller lookup or size sampling.
+"""
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+# Plumbing between the app code & psycopg, skipped when looking for the caller
+SKIPPED_FILES = {
+    path.join(ROOT, "util", name)
+    for name in ["instrument.py", "orm.py", "async_orm.py", "pool.py"]
+}
+# Rows sampled to estimate the size of a result
+SAMPLE_ROWS = 50
+
+
+@lru_cache(maxsize=2048)
+def normalize(query: str) -> str:
+    """Statement signature, the same for every execution with different values
+
+    Args:
+        query (str): SQL query
+
+    Returns:
+        str: Normalized query
+    """
+    query = re.sub(r"--[^\n]*", " ", query)
+    query = re.sub(r"'(?:[^']|'')*'", "?", query)
+    query = re.sub(r"%\(\w+\)s|%s", "?", query)
+    query = re.sub(r"\b\d+(?:\.\d+)?\b", "?", query)
+    query = re.sub(r"\(\s*\?(?:\s*,\s*\?)+\s*\)", "(?, ...)", query)
+    return " ".join(query.split())
+
+
+def query_text(query: Any) -> str:
+    """Text of a query passed to execute (str, bytes or Composable)"""
+    if isinstance(query, bytes):
+        return query.decode(errors="replace")
+    if not isinstance(query, str):
+        return str(query)
+    return query
+
+
+def find_caller() -> str:
+    """First app frame outside the ORM, ie the panel or record property that ran the query"""
+    frame = sys._getframe(2)
+    while frame != None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(ROOT) and not filename in SKIPPED_FILES:
+            return (
+                path.relpath(filename, ROOT)
+                + ":"
+                + frame.f_code.co_name
+                + ":"
+                + str(frame.f_lineno)
+            )
+        frame = frame.f_back
+    return "<external>"
+
+
+def result_size(cursor: Any) -> tuple[Optional[int], int]:
+    """Rows & approximate bytes of the cursor's current result
+
+    Args:
+        cursor (Any): Executed cursor
+
+    Returns:
+        tuple[Optional[int], int]: Row count (None if there is no result yet) & bytes
+    """
+    result = cursor.pgresult
+    if result == None:
+        return None, 0
+    rows, fields = result.ntuples, result.nfields
+    if rows == 0 or fields == 0:
+        return (rows if rows > 0 else max(cursor.rowcount, 0)), 0
+    sampled = min(rows, SAMPLE_ROWS)
+    size = 0
+    for r in range(sampled):
+        for f in range(fields):
+            value = result.get_value(r, f)
+            if value != None:
+                size += len(value)
+    return rows, size * rows // sampled
+
+
+@dataclass
+class StatementStats:
+    signature: str
+    calls: int = 0
+    total_ms: float = 0
+    rows: int = 0
+    bytes: int = 0
+    # Most recent latencies, for percentiles
+    latencies: deque = field(default_factory=lambda: deque(maxlen=1000))
+    callers: Counter = field(default_factory=Counter)
+
+
+class QueryStats:
+    def __init__(
+        self,
+        enabled: bool = False,
+        burst_window: float = 1.0,
+        burst_threshold: int = 10,
+    ) -> None:
+        """Per-statement query statistics
+
+        Args:
+            enabled (bool, optional): Whether executions are recorded. Defaults to False.
+            burst_window (float, optional): Seconds over which repeats count towards N+1 detection. Defaults to 1.0.
+            burst_threshold (int, optional): Repeats of a statement by one caller within the window flagged as N+1. Defaults to 10.
+        """
+        self.enabled = enabled
+        self.burst_window = burst_window
+        self.burst_threshold = burst_threshold
+        self.statements: dict[str, StatementStats] = {}
+        # (signature, caller) -> recent execution times
+        self.recent: dict[tuple[str, str], deque] = {}
+        # (signature, caller) -> largest burst seen
+        self.bursts: dict[tuple[str, str], int] = {}
+        self.lock = Lock()
+
+    def record(
+        self,
+        query: Any,
+        caller: str,
+        seconds: float,
+        rows: Optional[int],
+        size: int,
+    ):
+        """Records one execution
+
+        Args:
+            query (Any): Executed query (str, bytes or Composable)
+            caller (str): Code location that issued it
+            seconds (float): Latency
+            rows (Optional[int]): Rows returned, None if unknown
+            size (int): Approximate bytes returned
+        """
+        signature = normalize(query_text(query))
+        if signature == "":
+            # Pool health checks
+            return
+        now = monotonic()
+        with self.lock:
+            stats = self.statements.get(signature)
+            if stats == None:
+                stats = self.statements[signature] = StatementStats(signature)
+            stats.calls += 1
+            stats.total_ms += seconds * 1000
+            stats.rows += rows if rows != None else 0
+            stats.bytes += size
+            stats.latencies.append(seconds * 1000)
+            stats.callers[caller] += 1
+
+            times = self.recent.setdefault(
+                (signature, caller), deque(maxlen=self.burst_threshold * 4)
+            )
+            times.append(now)
+            while len(times) > 0 and now - times[0] > self.burst_window:
+                times.popleft()
+            if len(times) >= self.burst_threshold:
+                key = (signature, caller)
+                self.bursts[key] = max(self.bursts.get(key, 0), len(times))
+
+    def add_rows(self, query: Any, rows: int):
+        """Adds rows fetched later (from a named cursor) to a statement"""
+        with self.lock:
+            stats = self.statements.get(normalize(query_text(query)))
+            if stats != None:
+                stats.rows += rows
+
+    def top(self, limit: int = 25) -> list[dict[str, Any]]:
+        """Statements by total time, with latency percentiles
+
+        Args:
+            limit (int, optional): Max number of statements. Defaults to 25.
+
+        Returns:
+            list[dict[str, Any]]: Statement summaries
+        """
+        with self.lock:
+            statements = sorted(
+                self.statements.values(), key=lambda s: s.total_ms, reverse=True
+            )[:limit]
+            summaries = []
+            for s in statements:
+                latencies = sorted(s.latencies)
+                summaries.append(
+                    {
+                        "signature": s.signature,
+                        "calls": s.calls,
+                        "total_ms": s.total_ms,
+                        "mean_ms": s.total_ms / s.calls,
+                        "p50_ms": percentile(latencies, 50),
+                        "p95_ms": percentile(latencies, 95),
+                        "p99_ms": percentile(latencies, 99),
+                        "rows": s.rows,
+                        "bytes": s.bytes,
+                        "caller": s.callers.most_common(1)[0][0],
+                    }
+                )
+            return summaries
+
+    def suspects(self) -> list[dict[str, Any]]:
+        """Statements repeated in bursts by one caller (likely N+1 queries), worst first"""
+        with self.lock:
+            return [
+                {"signature": k[0], "caller": k[1], "burst": v}
+                for k, v in sorted(
+                    self.bursts.items(), key=lambda i: i[1], reverse=True
+                )
+            ]
+
+    def totals(self) -> dict[str, Any]:
+        with self.lock:
+            return {
+                "statements": len(self.statements),
+                "calls": sum([s.calls for s in self.statements.values()]),
+                "total_ms": sum([s.total_ms for s in self.statements.values()]),
+            }
+
+    def reset(self):
+        with self.lock:
+            self.statements.clear()
+            self.recent.clear()
+            self.bursts.clear()
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    if len(values) == 0:
+        return 0.0
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+
+# Shared by every instrumented connection
+QUERY_STATS = QueryStats()
+
+
+class InstrumentedCursor(Cursor):
+    def execute(self, query, params=None, *, prepare=None, binary=None):
+        if not QUERY_STATS.enabled:
+            return super().execute(query, params, prepare=prepare, binary=binary)
+        caller = find_caller()
+        start = perf_counter()
+        try:
+            return super().execute(query, params, prepare=prepare, binary=binary)
+        finally:
+            rows, size = result_size(self)
+            QUERY_STATS.record(query, caller, perf_counter() - start, rows, size)
+
+
+# Named cursors only declare on execute, rows are counted as they are fetched
+class InstrumentedServerCursor(ServerCursor):
+    def execute(self, query, params=None, *, binary=None, **kwargs):
+        self.instrumented_query = query
+        if not QUERY_STATS.enabled:
+            return super().execute(query, params, binary=binary, **kwargs)
+        caller = find_caller()
+        start = perf_counter()
+        try:
+            return super().execute(query, params, binary=binary, **kwargs)
+        finally:
+            QUERY_STATS.record(query, caller, perf_counter() - start, 0, 0)
+
+    def fetchmany(self, size=0):
+        rows = super().fetchmany(size)
+        if QUERY_STATS.enabled:
+            QUERY_STATS.add_rows(self.instrumented_query, len(rows))
+        return rows
+
+
+class InstrumentedAsyncCursor(AsyncCursor):
+    async def execute(self, query, params=None, *, prepare=None, binary=None):
+        if not QUERY_STATS.enabled:
+            return await super().execute(
+                query, params, prepare=prepare, binary=binary
+            )
+        caller = find_caller()
+        start = perf_counter()
+        try:
+            return await super().execute(
+                query, params, prepare=prepare, binary=binary
+            )
+        finally:
+            rows, size = result_size(self)
+            QUERY_STATS.record(query, caller, perf_counter() - start, rows, size)
+
+
+class InstrumentedAsyncServerCursor(AsyncServerCursor):
+    async def execute(self, query, params=None, *, binary=None, **kwargs):
+        self.instrumented_query = query
+        if not QUERY_STATS.enabled:
+            return await super().execute(query, params, binary=binary, **kwargs)
+        caller = find_caller()
+        start = perf_counter()
+        try:
+            return await super().execute(query, params, binary=binary, **kwargs)
+        finally:
+            QUERY_STATS.record(query, caller, perf_counter() - start, 0, 0)
+
+    async def fetchmany(self, size=0):
+        rows = await super().fetchmany(size)
+        if QUERY_STATS.enabled:
+            QUERY_STATS.add_rows(self.instrumented_query, len(rows))
+        return rows
+
+
+def instrument(connection: Connection):
+    """Installs the instrumented cursors on a connection (also a pool configure callback)"""
+    connection.cursor_factory = InstrumentedCursor
+    connection.server_cursor_factory = InstrumentedServerCursor
+
+
+async def instrument_async(connection: AsyncConnection):
+    """Installs the instrumented cursors on an async connection (async pool configure callback)"""
+    connection.cursor_factory = InstrumentedAsyncCursor
+    connection.server_cursor_factory = InstrumentedAsyncServerCursor
@@ -1,10 +1,36 @@
-from psycopg import Connection, Cursor
-from typing import Literal, Optional, Any, Union
-from dataclasses import dataclass, asdict
+from psycopg import Connection, Cursor, Pipeline
+from typing import (
+    Callable,
+    ContextManager,
+    Iterable,
+    Iterator,
+    Literal,
+    Optional,
+    Any,
+    Sequence,
+    Union,
+)
+from dataclasses import dataclass, asdict, field, replace
+from collections import OrderedDict
+from concurrent.futures import Future
+from itertools import count
+from contextlib import nullcontext
+from threading import Lock
+from time import perf_counter
+from weakref import WeakValueDictionary
 from .exceptions import *
+from .pool import DatabasePool
+from .cache import SearchCache, CachedSearch, freeze
+from .graph import FollowGraph
+from .affinity import GenreAffinityEngine
 from typing_extensions import TypedDict
 
 ORDER_PARAM = list[list[str, Literal["ASC", "DESC"]]]
+KEYSET_PARAM = list[Any]
+STREAM_BATCH_SIZE = 1000
+
+# Unique names for server-side cursors
+stream_ids = count()
 
 
 @dataclass
@@ -19,6 +45,8 @@ class SearchQuery:
 class SearchResult:
     results: list["Record"]
     total: int
+    first_key: Optional[KEYSET_PARAM] = None
+    last_key: Optional[KEYSET_PARAM] = None
 
 
 @dataclass
@@ -27,10 +55,206 @@ class SearchCondition:
     fields: list[Any]
 
 
+@dataclass
+class Relation:
+    # Selects the owning record's ID first, then the related row.
+    # Takes one array parameter of owner IDs (... WHERE owner_id = ANY(%s))
+    query: str
+    # Builds a related record from (orm, owner ID, row without the owner ID)
+    build: Callable[["ORM", Any, tuple], "Record"]
+    # Tables the query reads, writes to any of them drop the loaded relation
+    tags: list[str] = field(default_factory=list)
+
+
+@dataclass
+class BulkResult:
+    table: str
+    rows: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
 class PaginationParams(TypedDict):
     offset: Optional[int]
     limit: Optional[int]
     order: Optional[ORDER_PARAM]
+    after: Optional[KEYSET_PARAM]
+    before: Optional[KEYSET_PARAM]
+
+
+def keyset_order(order: Optional[ORDER_PARAM], key_column: str = "id") -> ORDER_PARAM:
+    """Makes an ordering deterministic by appending the key column as a tie-breaker
+
+    Args:
+        order (Optional[ORDER_PARAM]): Ordering data
+        key_column (str, optional): Unique column to break ties with. Defaults to "id".
+
+    Returns:
+        ORDER_PARAM: Ordering data ending in the key column
+    """
+    result = [[o[0], o[1].upper()] for o in order] if order else []
+    if not key_column in [o[0] for o in result]:
+        result.append([key_column, "ASC"])
+    return result
+
+
+def reverse_order(order: ORDER_PARAM) -> ORDER_PARAM:
+    """Flips every direction in an ordering (NULLS placement flips with it)"""
+    return [[o[0], "DESC" if o[1] == "ASC" else "ASC"] for o in order]
+
+
+def keyset_condition(order: ORDER_PARAM, key: KEYSET_PARAM) -> SearchCondition:
+    """Builds a seek predicate matching every row that sorts strictly after key.
+        Expanded into (a > x) OR (a = x AND b > y) ... so that mixed directions
+        and NULL values (last when ascending, first when descending) both work.
+
+    Args:
+        order (ORDER_PARAM): Deterministic ordering (see keyset_order)
+        key (KEYSET_PARAM): Sort key values of the row to seek past
+
+    Returns:
+        SearchCondition: Condition to add to the search
+    """
+    clauses = []
+    fields = []
+    for i, (column, direction) in enumerate(order):
+        parts = []
+        part_fields = []
+        for (prev_column, _), prev_value in zip(order[:i], key[:i]):
+            if prev_value == None:
+                parts.append(prev_column + " IS NULL")
+            else:
+                parts.append(prev_column + " = %s")
+                part_fields.append(prev_value)
+
+        value = key[i]
+        if direction == "ASC":
+            if value == None:
+                continue
+            parts.append("(" + column + " > %s OR " + column + " IS NULL)")
+            part_fields.append(value)
+        else:
+            if value == None:
+                parts.append(column + " IS NOT NULL")
+            else:
+                parts.append(column + " < %s")
+                part_fields.append(value)
+
+        clauses.append("(" + " AND ".join(parts) + ")")
+        fields.extend(part_fields)
+
+    return SearchCondition(
+        "(" + " OR ".join(clauses) + ")" if len(clauses) > 0 else "FALSE", fields
+    )
+
+
+def can_combine(query: str) -> bool:
+    """Checks whether a statement can be nested as a subquery of another one
+
+    Args:
+        query (str): Assembled statement
+
+    Returns:
+        bool: True for a single SELECT / WITH statement
+    """
+    stripped = query.strip()
+    return stripped.upper().startswith(("SELECT", "WITH")) and not ";" in stripped
+
+
+@dataclass
+class SearchStatements:
+    query: str
+    count: str
+    combined: bool
+
+
+class StatementCache:
+    def __init__(self, size: int = 256) -> None:
+        """LRU of assembled search statements, keyed on the search "shape"
+            (conditions present, sort columns, keyset direction, pagination clauses).
+            Statements are executed with prepare=True, so each connection plans
+            a shape once and reuses it for every new set of parameters.
+
+        Args:
+            size (int, optional): Max number of shapes kept. Defaults to 256.
+        """
+        self.size = size
+        self.statements: OrderedDict[tuple, SearchStatements] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def get(
+        self, shape: tuple, assemble: Callable[[], SearchStatements]
+    ) -> SearchStatements:
+        """Gets the statements for a shape, assembling them on a miss
+
+        Args:
+            shape (tuple): Hashable shape key
+            assemble (Callable[[], SearchStatements]): Builds the statements
+
+        Returns:
+            SearchStatements: Cached statements
+        """
+        with self.lock:
+            if shape in self.statements:
+                self.hits += 1
+                self.statements.move_to_end(shape)
+                return self.statements[shape]
+            self.misses += 1
+
+        statements = assemble()
+        with self.lock:
+            self.statements[shape] = statements
+            while len(self.statements) > self.size:
+                self.statements.popitem(last=False)
+        return statements
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups > 0 else 0.0,
+            "size": len(self.statements),
+        }
+
+
+@dataclass
+class SearchSpec:
+    table: str
+    factory: type["Record"]
+    conditions: Optional[list[SearchCondition]] = None
+    order: Optional[ORDER_PARAM] = None
+    offset: Optional[int] = None
+    limit: Optional[int] = None
+    format_query: str = "SELECT * FROM {table} AS root{conditions}{order}{offset}{limit}"
+    format_count_query: str = "SELECT COUNT(*) FROM {table} AS root{conditions}"
+    after: Optional[KEYSET_PARAM] = None
+    before: Optional[KEYSET_PARAM] = None
+    key_column: str = "id"
+    combine: bool = True
+    tags: Optional[list[str]] = None
+    cache: bool = True
+    source_fields: Optional[list[Any]] = None
+
+
+@dataclass
+class SearchPlan:
+    spec: SearchSpec
+    statements: SearchStatements
+    fields: list[Any]
+    count_fields: list[Any]
+    # Deterministic ordering, the sort keys of the result follow it
+    order: ORDER_PARAM
+    # An empty combined page carries no total, re-count unless it's an unbounded first page
+    # (past the end, seeking, or LIMIT 0 can all be empty while rows match)
+    recount: bool
+    cache_key: Optional[tuple] = None
+    generation: Optional[tuple[int, ...]] = None
 
 
 def search_internal(
@@ -42,7 +266,14 @@ def search_internal(
     offset: Optional[int] = None,
     limit: Optional[int] = None,
     format_query: str = "SELECT * FROM {table} AS root{conditions}{order}{offset}{limit}",
-    format_count_query: str = "SELECT COUNT(*) FROM {table} AS root{conditions}"
+    format_count_query: str = "SELECT COUNT(*) FROM {table} AS root{conditions}",
+    after: Optional[KEYSET_PARAM] = None,
+    before: Optional[KEYSET_PARAM] = None,
+    key_column: str = "id",
+    combine: bool = True,
+    tags: Optional[list[str]] = None,
+    cache: bool = True,
+    source_fields: Optional[list[Any]] = None,
 ) -> SearchResult:
     """Does the actual searching part (querying, result count, etc)
 
@@ -52,46 +283,268 @@ def search_internal(
         factory (type[Record]): Class factory
         conditions (Optional[list[SearchCondition]], optional): List of conditions and format values. Defaults to None.
         order (Optional[ORDER_PARAM], optional): Ordering data. Defaults to None.
-        offset (Optional[int], optional): First record to get. Defaults to None.
+        offset (Optional[int], optional): First record to get. Ignored when after/before is given. Defaults to None.
         limit (Optional[int], optional): Max number of records past offset to get. Defaults to None.
+        after (Optional[KEYSET_PARAM], optional): Keyset cursor, get the page following this sort key. Defaults to None.
+        before (Optional[KEYSET_PARAM], optional): Keyset cursor, get the page preceding this sort key. Defaults to None.
+        key_column (str, optional): Unique column used as the sort tie-breaker. Defaults to "id".
+        combine (bool, optional): Fetch the page and the total in a single statement when possible,
+            otherwise both statements are pipelined. Defaults to True.
+        tags (Optional[list[str]], optional): Tables the query reads, writes to any of them
+            invalidate the cached result. Defaults to [table].
+        cache (bool, optional): Use the ORM's search result cache. Defaults to True.
+        source_fields (Optional[list[Any]], optional): Values for placeholders in format_query
+            before {conditions} (ie computed columns), not passed to the count query. Defaults to None.
 
     Returns:
-        SearchResult: Search result
+        SearchResult: Search result, including the sort keys of its first and last records
     """
-    fields = []
-    assembled = format_query.format(
-        table=table,
-        conditions=" WHERE " + " AND ".join([c.condition for c in conditions])
-        if len(conditions) > 0
-        else "",
-        order=" ORDER BY " + ", ".join([o[0] + " " + o[1] for o in order])
-        if order
-        else "",
-        offset=" OFFSET " + str(offset) if offset != None else "",
-        limit=" LIMIT " + str(limit) if limit != None else "",
+    return execute_search(
+        orm,
+        SearchSpec(
+            table,
+            factory,
+            conditions,
+            order,
+            offset,
+            limit,
+            format_query,
+            format_count_query,
+            after,
+            before,
+            key_column,
+            combine,
+            tags,
+            cache,
+            source_fields,
+        ),
     )
 
-    assembled_count = format_count_query.format(
-        table=table,
-        conditions=" WHERE " + " AND ".join([c.condition for c in conditions])
-        if len(conditions) > 0
-        else "",
+
+def plan_search(orm: "ORM", spec: SearchSpec) -> Union[SearchPlan, SearchResult]:
+    """Builds the statements & parameters of a search, shared by the sync & async ORMs
+
+    Args:
+        orm (ORM): ORM object (statement & result caches)
+        spec (SearchSpec): Search to run
+
+    Returns:
+        Union[SearchPlan, SearchResult]: What to execute, or the result itself when it was cached
+    """
+    conditions = spec.conditions if spec.conditions else []
+    order = keyset_order(spec.order, spec.key_column)
+    query_order = order
+    query_conditions = conditions
+    if spec.after != None:
+        query_conditions = conditions + [keyset_condition(order, spec.after)]
+    elif spec.before != None:
+        query_order = reverse_order(order)
+        query_conditions = conditions + [keyset_condition(query_order, spec.before)]
+    seeking = spec.after != None or spec.before != None
+    use_offset = spec.offset != None and not seeking
+    source_fields = spec.source_fields if spec.source_fields else []
+
+    tags = spec.tags if spec.tags else [spec.table]
+    cache_key, generation = None, None
+    if spec.cache and orm.searches.enabled:
+        cache_key = (
+            getattr(spec.factory, "__module__", None),
+            getattr(spec.factory, "__qualname__", repr(spec.factory)),
+            spec.table,
+            spec.format_query,
+            spec.format_count_query,
+            freeze([(c.condition, c.fields) for c in conditions]),
+            freeze(source_fields),
+            freeze(order),
+            spec.offset if use_offset else None,
+            spec.limit,
+            freeze(spec.after),
+            freeze(spec.before),
+        )
+        cached = orm.searches.get(cache_key)
+        if cached != None:
+            return SearchResult(
+                [spec.factory(orm.db, spec.table, orm, *r) for r in cached.rows],
+                cached.total,
+                cached.first_key,
+                cached.last_key,
+            )
+        generation = orm.searches.generation(tags)
+
+    # Offset & limit are parameters too, so every page of a search shares one statement
+    def assemble() -> SearchStatements:
+        assembled = spec.format_query.format(
+            table=spec.table,
+            conditions=" WHERE "
+            + " AND ".join([c.condition for c in query_conditions])
+            if len(query_conditions) > 0
+            else "",
+            order=" ORDER BY " + ", ".join([o[0] + " " + o[1] for o in query_order]),
+            offset=" OFFSET %s" if use_offset else "",
+            limit=" LIMIT %s" if spec.limit != None else "",
+        )
+        assembled_count = spec.format_count_query.format(
+            table=spec.table,
+            conditions=" WHERE " + " AND ".join([c.condition for c in conditions])
+            if len(conditions) > 0
+            else "",
+        )
+        if (
+            spec.combine
+            and can_combine(assembled)
+            and can_combine(assembled_count)
+            and all([o[0].isidentifier() for o in query_order])
+        ):
+            # Page & total in one round trip, the count runs once as an InitPlan.
+            # A subquery's order isn't kept by the outer SELECT, so it's repeated on the page's columns
+            return SearchStatements(
+                "SELECT _page.*, ("
+                + assembled_count
+                + ") AS _total FROM ("
+                + assembled
+                + ") AS _page ORDER BY "
+                + ", ".join(["_page." + o[0] + " " + o[1] for o in query_order]),
+                assembled_count,
+                True,
+            )
+        return SearchStatements(assembled, assembled_count, False)
+
+    statements = orm.statements.get(
+        (
+            spec.table,
+            spec.format_query,
+            spec.format_count_query,
+            tuple([c.condition for c in query_conditions]),
+            tuple([tuple(o) for o in query_order]),
+            use_offset,
+            spec.limit != None,
+            spec.combine,
+        ),
+        assemble,
     )
 
-    for c in conditions:
+    fields = list(source_fields)
+    for c in query_conditions:
         fields.extend(c.fields)
+    if use_offset:
+        fields.append(spec.offset)
+    if spec.limit != None:
+        fields.append(spec.limit)
+    count_fields = []
+    for c in conditions:
+        count_fields.extend(c.fields)
+
+    return SearchPlan(
+        spec,
+        statements,
+        fields,
+        count_fields,
+        order,
+        (spec.offset != None and spec.offset > 0) or seeking or spec.limit == 0,
+        cache_key,
+        generation,
+    )
+
+
+def finish_search(
+    orm: "ORM", plan: SearchPlan, rows: list[tuple], columns: list[str], total: int
+) -> SearchResult:
+    """Builds the result of an executed search plan (and caches it)
+
+    Args:
+        orm (ORM): ORM object
+        plan (SearchPlan): Executed plan
+        rows (list[tuple]): Page rows, without the combined total column
+        columns (list[str]): Column names of the rows
+        total (int): Total number of matching records
+
+    Returns:
+        SearchResult: Search result, including the sort keys of its first and last records
+    """
+    spec = plan.spec
+    if spec.before != None:
+        rows.reverse()
 
-    cursor = orm.db.execute(assembled, fields)
-    cursor_count = orm.db.execute(assembled_count, fields)
-    total_count = cursor_count.fetchone()[0] if cursor_count.rowcount > 0 else 0
-    results = [factory(orm.db, table, orm, *r) for r in cursor.fetchall()]
-    cursor.close()
-    cursor_count.close()
+    # Sort keys of the first & last rows are the cursors for neighbouring pages
+    first_key, last_key = None, None
+    if len(rows) > 0 and all([o[0] in columns for o in plan.order]):
+        indices = [columns.index(o[0]) for o in plan.order]
+        first_key = [rows[0][i] for i in indices]
+        last_key = [rows[-1][i] for i in indices]
+
+    if plan.cache_key != None:
+        orm.searches.put(
+            plan.cache_key,
+            CachedSearch(rows, total, first_key, last_key),
+            spec.tags if spec.tags else [spec.table],
+            plan.generation,
+        )
+
+    results = [spec.factory(orm.db, spec.table, orm, *r) for r in rows]
     return SearchResult(
         results,
-        total_count,
+        total,
+        first_key,
+        last_key,
     )
 
+
+def execute_search(orm: "ORM", spec: SearchSpec) -> SearchResult:
+    """Runs a search on the ORM's (thread's) connection
+
+    Args:
+        orm (ORM): ORM object
+        spec (SearchSpec): Search to run
+
+    Returns:
+        SearchResult: Search result
+    """
+    plan = plan_search(orm, spec)
+    if isinstance(plan, SearchResult):
+        return plan
+    statements = plan.statements
+
+    if statements.combined:
+        cursor = orm.db.execute(
+            statements.query, plan.count_fields + plan.fields, prepare=True
+        )
+        rows = cursor.fetchall()
+        columns = [c.name for c in cursor.description][:-1]
+        cursor.close()
+        if len(rows) > 0:
+            total_count = rows[0][-1]
+        elif plan.recount:
+            # Paged past the end (or LIMIT 0), the empty page carried no total
+            cursor_count = orm.db.execute(
+                statements.count, plan.count_fields, prepare=True
+            )
+            total_count = cursor_count.fetchone()[0] if cursor_count.rowcount > 0 else 0
+            cursor_count.close()
+        else:
+            total_count = 0
+        rows = [r[:-1] for r in rows]
+    else:
+        # Can't nest the statements, pipeline them so they share a round trip
+        if Pipeline.is_supported():
+            with orm.db.pipeline():
+                cursor = orm.db.execute(statements.query, plan.fields, prepare=True)
+                cursor_count = orm.db.execute(
+                    statements.count, plan.count_fields, prepare=True
+                )
+        else:
+            cursor = orm.db.execute(statements.query, plan.fields, prepare=True)
+            cursor_count = orm.db.execute(
+                statements.count, plan.count_fields, prepare=True
+            )
+        total_count = cursor_count.fetchone()[0] if cursor_count.rowcount > 0 else 0
+        rows = cursor.fetchall()
+        columns = [c.name for c in cursor.description]
+        cursor.close()
+        cursor_count.close()
+
+    return finish_search(orm, plan, rows, columns, total_count)
+
+
 TABLE_NAMES = Literal[
     "books",
     "contributors",
@@ -112,18 +565,31 @@ table_mapping: dict[TABLE_NAMES, str] = {
 
 # Record class
 class Record:
+    # Slotted to keep large pages compact, subclasses list their own columns
+    # Names starting with "_" are internal (relation caches) and skipped by dict()
+    __slots__ = ("orm", "__weakref__")
+
+    # Table metadata lives on the class, not on every instance
+    table: str = None
+
+    # Relations loadable with ORM.prefetch, cached in the "_<name>" slot
+    RELATIONS: dict[str, Relation] = {}
+
     def __init__(self, db: Connection, table: str, orm: "ORM", *args) -> None:
         """Initializer
 
         Args:
-            db (Connection): DB Connection, handled by ORM
-            table (str): Table name
+            db (Connection): DB Connection, unused (resolved through the ORM)
+            table (str): Table name, unused (set on the class)
             orm (ORM): ORM object
         """
-        self.db = db
-        self.table = table
         self.orm = orm
 
+    # Resolved on use so pooled workers query through their own connection
+    @property
+    def db(self) -> Connection:
+        return self.orm.db
+
     # Implement in subclasses to save to database automatically
     def save(self):
         raise NotImplementedError
@@ -131,27 +597,287 @@ class Record:
     # Implement in subclass to delete from database automatically
     def delete(self):
         raise NotImplementedError
-    
+
+    @classmethod
+    def fields(cls) -> list[str]:
+        """Public slot names across the class hierarchy
+
+        Returns:
+            list[str]: Field names, base classes first
+        """
+        names = []
+        for klass in reversed(cls.__mro__):
+            for name in klass.__dict__.get("__slots__", ()):
+                if not name.startswith("_") and name != "orm" and not name in names:
+                    names.append(name)
+        return names
+
     def __repr__(self) -> str:
-        return "Record<{}>".format(", ".join([f"{k} = {v}" for k, v in self.__dict__.items() if not k in ["db", "table", "orm"]]))
-    
+        return "Record<{}>".format(
+            ", ".join([f"{k} = {v}" for k, v in self.dict().items()])
+        )
+
     def dict(self) -> dict:
-        return {k:v for k, v in self.__dict__.items() if not k in ["db", "table", "orm"]}
-    
+        return {k: getattr(self, k) for k in self.fields() if hasattr(self, k)}
+
+    # Implement in subclasses to make the record type searchable (sync & async)
     @classmethod
-    def search(self, orm: "ORM", pagination: PaginationParams, **kwargs) -> SearchResult:
+    def search_spec(cls, pagination: PaginationParams, **kwargs) -> SearchSpec:
         raise NotImplementedError
 
+    @classmethod
+    def search(cls, orm: "ORM", pagination: PaginationParams, **kwargs) -> SearchResult:
+        return execute_search(orm, cls.search_spec(pagination, **kwargs))
+
+    # Every record matching the search params, loaded in batches (see ORM.stream_search)
+    @classmethod
+    def stream(
+        cls,
+        orm: "ORM",
+        order: Optional[ORDER_PARAM] = None,
+        batch_size: int = STREAM_BATCH_SIZE,
+        prefetch: Sequence[str] = (),
+        **kwargs,
+    ) -> Iterator["Record"]:
+        return orm.stream_search(
+            cls.search_spec({"order": order}, **kwargs), batch_size, prefetch
+        )
+
 # Extremely basic ORM, just abstracts away some common tasks into OOP
 class ORM:
-    def __init__(self, connection: Connection) -> None:
+    def __init__(
+        self,
+        connection: Connection,
+        pool: Optional[DatabasePool] = None,
+        searches: Optional[SearchCache] = None,
+    ) -> None:
         """Create ORM
 
         Args:
-            connection (Connection): Database connection object
+            connection (Connection): Main database connection object, used outside of checked out tasks
+            pool (Optional[DatabasePool], optional): Connection pool for worker tasks. Defaults to None.
+            searches (Optional[SearchCache], optional): Search result cache. Defaults to a SearchCache with default bounds.
         """
-        self.db = connection
+        self.main_db = connection
+        self.pool = pool
         self.factories: dict[TABLE_NAMES, type[Record]] = {}
+        self.statements = StatementCache()
+        self.searches = searches if searches != None else SearchCache()
+        self.follows = FollowGraph(self)
+        # For You scoring, rating writes through RatingRecord keep it current
+        self.affinity = GenreAffinityEngine(self)
+        self.identities: WeakValueDictionary[tuple[str, Any], Record] = (
+            WeakValueDictionary()
+        )
+        self.identity_lock = Lock()
+        self.identity_hits = 0
+        self.identity_misses = 0
+        # Called with the written tables on every invalidate(), for caches outside the ORM
+        self.listeners: list[Callable[[tuple[str, ...]], Any]] = []
+
+    @property
+    def db(self) -> Connection:
+        """Connection checked out by the current thread, or the main connection"""
+        if self.pool != None:
+            current = self.pool.current()
+            if current != None:
+                return current
+        return self.main_db
+
+    def connection(self) -> ContextManager[Connection]:
+        """Checks out a pooled connection for the current thread,
+            all ORM/Record queries inside the block use it.
+
+        Returns:
+            ContextManager[Connection]: Context yielding the connection
+        """
+        if self.pool == None:
+            return nullcontext(self.main_db)
+        return self.pool.connection()
+
+    def submit(self, task: Callable[..., Any], *args, **kwargs) -> Future:
+        """Runs a task on the bounded DB executor with its own connection
+
+        Args:
+            task (Callable[..., Any]): Function to run
+
+        Raises:
+            ORMException: Raised if the ORM has no pool
+
+        Returns:
+            Future: Future of the task's return value
+        """
+        if self.pool == None:
+            raise ORMException("*", "No connection pool configured")
+        return self.pool.submit(task, *args, **kwargs)
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """Cache statistics, for checking hit rates
+
+        Returns:
+            dict[str, dict[str, Any]]: Stats per cache
+        """
+        lookups = self.identity_hits + self.identity_misses
+        return {
+            "statements": self.statements.stats(),
+            "searches": self.searches.stats(),
+            "follows": self.follows.stats(),
+            "affinity": self.affinity.stats(),
+            "identities": {
+                "hits": self.identity_hits,
+                "misses": self.identity_misses,
+                "hit_ratio": self.identity_hits / lookups if lookups > 0 else 0.0,
+                "size": len(self.identities),
+            },
+        }
+
+    def invalidate(self, *tables: str) -> int:
+        """Drops cached searches reading any of the given tables, call after writing to them
+
+        Args:
+            tables (str): Written table names
+
+        Returns:
+            int: Number of cached searches dropped
+        """
+        dropped = self.searches.invalidate(*tables)
+        self.reset_relations(tables)
+        for listener in list(self.listeners):
+            listener(tables)
+        return dropped
+
+    def reset_relations(self, tables: Iterable[str]) -> int:
+        """Unloads the relations reading any of the tables from every identity-mapped record,
+            so shared records re-query them on next access instead of showing stale rows
+
+        Args:
+            tables (Iterable[str]): Written table names
+
+        Returns:
+            int: Number of relations unloaded
+        """
+        written = set(tables)
+        with self.identity_lock:
+            records = list(self.identities.values())
+        reset = 0
+        stale: dict[type, list[str]] = {}
+        for record in records:
+            record_type = type(record)
+            names = stale.get(record_type)
+            if names == None:
+                names = stale[record_type] = [
+                    name
+                    for name, relation in record_type.RELATIONS.items()
+                    if not written.isdisjoint(relation.tags)
+                ]
+            for name in names:
+                if getattr(record, "_" + name) != None:
+                    setattr(record, "_" + name, None)
+                    reset += 1
+        return reset
+
+    def add_listener(self, listener: Callable[[tuple[str, ...]], Any]):
+        """Registers a callback for invalidate(), it may be called from any thread
+
+        Args:
+            listener (Callable[[tuple[str, ...]], Any]): Called with the written table names
+        """
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[tuple[str, ...]], Any]):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def identity(
+        self, table: str, key: Any, factory: Callable[..., Record], *args, **kwargs
+    ) -> Record:
+        """Identity map lookup, each (table, key) resolves to one shared instance
+            for as long as something still references it (values are weak).
+
+        Args:
+            table (str): Table name
+            key (Any): Hashable record key (usually its ID)
+            factory (Callable[..., Record]): Builds the record on a miss, called with *args & **kwargs
+
+        Returns:
+            Record: Shared record
+        """
+        with self.identity_lock:
+            record = self.identities.get((table, key))
+            if record != None:
+                self.identity_hits += 1
+                return record
+            self.identity_misses += 1
+            record = factory(*args, **kwargs)
+            self.identities[(table, key)] = record
+            return record
+
+    def prefetch(self, records: list[Record], *relations: str) -> list[Record]:
+        """Loads relations for many records at once, with one query per relation
+            instead of one per record. Records that already have a relation
+            cached are skipped.
+
+        Args:
+            records (list[Record]): Records of a single type, keyed by their id
+            relations (str): Relation names from the record type's RELATIONS
+
+        Raises:
+            ORMException: Raised if a relation isn't defined for the record type
+
+        Returns:
+            list[Record]: The same records, with relation caches populated
+        """
+        for name in relations:
+            relation, pending = self.pending_relation(records, name)
+            if len(pending) == 0:
+                continue
+            cursor = self.db.execute(
+                relation.query, [list(pending.keys())], prepare=True
+            )
+            self.fill_relation(relation, name, pending, cursor.fetchall())
+            cursor.close()
+        return records
+
+    def pending_relation(
+        self, records: list[Record], name: str
+    ) -> tuple[Optional[Relation], dict[Any, list[Record]]]:
+        """Finds the records that still need a relation loaded
+
+        Args:
+            records (list[Record]): Records of a single type
+            name (str): Relation name
+
+        Raises:
+            ORMException: Raised if the relation isn't defined for the record type
+
+        Returns:
+            tuple[Optional[Relation], dict[Any, list[Record]]]: The relation & pending records by id
+        """
+        if len(records) == 0:
+            return None, {}
+        record_type = type(records[0])
+        if not name in record_type.RELATIONS.keys():
+            raise ORMException(record_type.table, f"Relation {name} is not defined")
+        pending: dict[Any, list[Record]] = {}
+        for record in records:
+            if getattr(record, "_" + name) == None:
+                pending.setdefault(record.id, []).append(record)
+        return record_type.RELATIONS[name], pending
+
+    def fill_relation(
+        self,
+        relation: Relation,
+        name: str,
+        pending: dict[Any, list[Record]],
+        rows: list[tuple],
+    ):
+        """Builds related records from a relation query's rows and caches them on their owners"""
+        loaded: dict[Any, list[Record]] = {id: [] for id in pending.keys()}
+        for row in rows:
+            loaded[row[0]].append(relation.build(self, row[0], row[1:]))
+        for id, owners in pending.items():
+            for record in owners:
+                setattr(record, "_" + name, loaded[id])
 
     def register(self, table: TABLE_NAMES, record_factory: type[Record]):
         """Register Record type to table
@@ -268,15 +994,274 @@ class ORM:
             for i in cursor.fetchall()
         ]
 
-    def next_available_id(self, table: TABLE_NAMES, col="id") -> int:
-        """Returns the next available ID in the table. 
-                This is not assumed to be safe for more than 1 client, 
-                we just aren't using serial IDs so this was a quick hack around it
+    def iter_records_from_cursor(
+        self,
+        factory: Callable[..., Record],
+        table: str,
+        cursor: Cursor,
+        batch_size: int = STREAM_BATCH_SIZE,
+        prefetch: Sequence[str] = (),
+    ) -> Iterator[Record]:
+        """Yields records from a cursor, fetching batch_size rows at a time
 
         Args:
-            table (TABLE_NAMES): Table name
+            factory (Callable[..., Record]): Record factory
+            table (str): Table name passed to the factory
+            cursor (Cursor): Executed cursor
+            batch_size (int, optional): Rows per fetch. Defaults to STREAM_BATCH_SIZE.
+            prefetch (Sequence[str], optional): Relations to load per batch. Defaults to ().
+
+        Yields:
+            Iterator[Record]: Records, one batch in memory at a time
+        """
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if len(rows) == 0:
+                return
+            batch = [factory(self.db, table, self, *r) for r in rows]
+            if len(prefetch) > 0:
+                self.prefetch(batch, *prefetch)
+            yield from batch
+
+    def stream_query(
+        self,
+        factory: Callable[..., Record],
+        table: str,
+        query: str,
+        params: Union[Sequence[Any], dict[str, Any], None] = None,
+        batch_size: int = STREAM_BATCH_SIZE,
+        prefetch: Sequence[str] = (),
+    ) -> Iterator[Record]:
+        """Streams a query's records through a named server-side cursor,
+            so only one batch of rows (and records) is held at a time.
+            Runs inside the connection's current transaction, keep the
+            connection checked out until the iterator is exhausted or closed.
+
+        Args:
+            factory (Callable[..., Record]): Record factory
+            table (str): Table name passed to the factory
+            query (str): SQL query
+            params (Union[Sequence[Any], dict[str, Any], None], optional): Query parameters. Defaults to None.
+            batch_size (int, optional): Rows per round trip. Defaults to STREAM_BATCH_SIZE.
+            prefetch (Sequence[str], optional): Relations to load per batch. Defaults to ().
+
+        Yields:
+            Iterator[Record]: Records
+        """
+        for rows in self.stream_rows(query, params, batch_size):
+            batch = [factory(self.db, table, self, *r) for r in rows]
+            if len(prefetch) > 0:
+                self.prefetch(batch, *prefetch)
+            yield from batch
+
+    def stream_rows(
+        self,
+        query: str,
+        params: Union[Sequence[Any], dict[str, Any], None] = None,
+        batch_size: int = STREAM_BATCH_SIZE,
+    ) -> Iterator[list[tuple]]:
+        """Streams a query's raw rows in batches through a named server-side cursor,
+            for bulk readers that build their own structures (ie the in-memory caches).
+            Same transaction rules as stream_query.
+
+        Args:
+            query (str): SQL query
+            params (Union[Sequence[Any], dict[str, Any], None], optional): Query parameters. Defaults to None.
+            batch_size (int, optional): Rows per round trip. Defaults to STREAM_BATCH_SIZE.
+
+        Yields:
+            Iterator[list[tuple]]: Batches of at most batch_size rows
+        """
+        cursor = self.db.cursor(name="stream_" + str(next(stream_ids)))
+        cursor.itersize = batch_size
+        try:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if len(rows) == 0:
+                    return
+                yield rows
+        finally:
+            cursor.close()
+
+    def stream_records_by_query_suffix(
+        self,
+        table: TABLE_NAMES,
+        query_suffix: str,
+        params={},
+        batch_size: int = STREAM_BATCH_SIZE,
+        prefetch: Sequence[str] = (),
+    ) -> Iterator[Record]:
+        """Streaming get_records_by_query_suffix
+
+        Args:
+            table (TABLE_NAMES): Table key
+            query_suffix (str): Query suffix (ie SELECT * FROM table {suffix})
+            params (dict, optional): Parameters for a parameterized string. Defaults to {}.
+            batch_size (int, optional): Rows per round trip. Defaults to STREAM_BATCH_SIZE.
+            prefetch (Sequence[str], optional): Relations to load per batch. Defaults to ().
+
+        Raises:
+            ORMRegistryError: Raised if the table record type is not registered
 
         Returns:
-            int: Next available ID.
+            Iterator[Record]: Records
         """
-        return self.db.execute("SELECT MAX(" + col + ") FROM " + table).fetchone()[0] + 1
+        if not table in self.factories.keys():
+            raise ORMRegistryError(table)
+        return self.stream_query(
+            self.factories[table],
+            table_mapping[table],
+            f"SELECT * FROM {table} " + query_suffix,
+            params,
+            batch_size,
+            prefetch,
+        )
+
+    def stream_search(
+        self,
+        spec: SearchSpec,
+        batch_size: int = STREAM_BATCH_SIZE,
+        prefetch: Sequence[str] = (),
+    ) -> Iterator[Record]:
+        """Streams every record matching a search, ignoring its pagination & total
+
+        Args:
+            spec (SearchSpec): Search to run
+            batch_size (int, optional): Rows per round trip. Defaults to STREAM_BATCH_SIZE.
+            prefetch (Sequence[str], optional): Relations to load per batch. Defaults to ().
+
+        Returns:
+            Iterator[Record]: Records, in the search's order
+        """
+        plan = plan_search(
+            self,
+            replace(
+                spec,
+                offset=None,
+                limit=None,
+                after=None,
+                before=None,
+                combine=False,
+                cache=False,
+            ),
+        )
+        return self.stream_query(
+            spec.factory,
+            spec.table,
+            plan.statements.query,
+            plan.fields,
+            batch_size,
+            prefetch,
+        )
+
+    def bulk_insert(
+        self, table: str, columns: list[str], rows: Iterable[Sequence[Any]]
+    ) -> BulkResult:
+        """Inserts many rows with a single COPY, then commits.
+            Rows are streamed to the server, so any iterable (ie a generator) works.
+
+        Args:
+            table (str): Table name
+            columns (list[str]): Columns each row gives values for, in order
+            rows (Iterable[Sequence[Any]]): Row values
+
+        Returns:
+            BulkResult: Rows written & time taken
+        """
+        start = perf_counter()
+        try:
+            with self.db.cursor() as cursor:
+                with cursor.copy(
+                    "COPY " + table + " (" + ", ".join(columns) + ") FROM STDIN"
+                ) as copy:
+                    for row in rows:
+                        copy.write_row(row)
+                count = cursor.rowcount
+            self.db.commit()
+        except:
+            self.db.rollback()
+            raise
+        self.invalidate(table)
+        return BulkResult(table, count, perf_counter() - start)
+
+    def bulk_upsert(
+        self,
+        table: str,
+        columns: list[str],
+        rows: Iterable[Sequence[Any]],
+        key_columns: list[str],
+        update_columns: Optional[list[str]] = None,
+    ) -> BulkResult:
+        """Inserts or updates many rows: COPY into a temporary staging table,
+            then merge it into the table with INSERT ... ON CONFLICT, and commit.
+            When a key appears more than once, its last row wins.
+
+        Args:
+            table (str): Table name
+            columns (list[str]): Columns each row gives values for, in order
+            rows (Iterable[Sequence[Any]]): Row values
+            key_columns (list[str]): Columns of a unique constraint/index on the table
+            update_columns (Optional[list[str]], optional): Columns to overwrite on conflict,
+                an empty list keeps existing rows. Defaults to every non-key column.
+
+        Returns:
+            BulkResult: Rows merged (inserted or updated) & time taken
+        """
+        update_columns = (
+            update_columns
+            if update_columns != None
+            else [c for c in columns if not c in key_columns]
+        )
+        staging = "staging_" + table
+        start = perf_counter()
+        try:
+            with self.db.cursor() as cursor:
+                cursor.execute(
+                    "CREATE TEMPORARY TABLE "
+                    + staging
+                    + " ON COMMIT DROP AS SELECT "
+                    + ", ".join(columns)
+                    + " FROM "
+                    + table
+                    + " WITH NO DATA"
+                )
+                # Arrival order, so duplicate keys resolve to their last row
+                cursor.execute(
+                    "ALTER TABLE " + staging + " ADD COLUMN _staging_seq bigserial"
+                )
+                with cursor.copy(
+                    "COPY " + staging + " (" + ", ".join(columns) + ") FROM STDIN"
+                ) as copy:
+                    for row in rows:
+                        copy.write_row(row)
+                cursor.execute(
+                    "INSERT INTO "
+                    + table
+                    + " ("
+                    + ", ".join(columns)
+                    + ") SELECT DISTINCT ON ("
+                    + ", ".join(key_columns)
+                    + ") "
+                    + ", ".join(columns)
+                    + " FROM "
+                    + staging
+                    + " ORDER BY "
+                    + ", ".join(key_columns)
+                    + ", _staging_seq DESC ON CONFLICT ("
+                    + ", ".join(key_columns)
+                    + ") "
+                    + (
+                        "DO UPDATE SET "
+                        + ", ".join([c + " = EXCLUDED." + c for c in update_columns])
+                        if len(update_columns) > 0
+                        else "DO NOTHING"
+                    )
+                )
+                count = cursor.rowcount
+            self.db.commit()
+        except:
+            self.db.rollback()
+            raise
+        self.invalidate(table)
+        return BulkResult(table, count, perf_counter() - start)
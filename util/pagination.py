@@ -1,20 +1,27 @@
 from textual.app import ComposeResult
 from textual.widget import Widget
-from textual.widgets import DataTable, Button, Static, Select
+from textual.widgets import DataTable, Button, Static, Select, Input
 from textual.containers import Container, Grid
 from .widget import ContextWidget
 from textual.reactive import reactive
 from textual import work, on
+from textual.worker import get_current_worker
 from textual.coordinate import Coordinate
 from textual.message import Message
 from .orm import Record, SearchResult, PaginationParams
-from typing import Any, Callable, Union, Optional
+from .cache import freeze
+from typing import Any, Callable, Literal, Union, Optional
 from typing_extensions import TypedDict
 from rich.console import RenderableType
-from threading import Thread
+from threading import Lock
 import math
 
 
+# Number of pages of a result, an empty result still shows one page
+def page_count(total: int, page_size: int) -> int:
+    return math.ceil(total / page_size) if total > 0 and page_size > 0 else 1
+
+
 class PaginatedColumn(TypedDict):
     key: str
     name: str
@@ -48,6 +55,9 @@ class PaginatedTable(ContextWidget):
         initial_params: dict[str, Any] = {},
         initial_total: int = 0,
         cursor_type: str = "none",
+        pagination_mode: Literal["keyset", "offset"] = "keyset",
+        prefetch: Literal["none", "next", "both"] = "next",
+        prefetch_buffer: int = 4,
     ) -> None:
         """Paginated Table Class
 
@@ -61,6 +71,9 @@ class PaginatedTable(ContextWidget):
             initial_pagination (_type_, optional): Initial pagination setup. Defaults to {"offset": 0, "limit": 25, "order": []}.
             initial_params (dict[str, Any], optional): Initial search params. Defaults to {}.
             initial_total (int, optional): Initial total results. Defaults to 0.
+            pagination_mode (Literal["keyset", "offset"], optional): Whether next/previous seek from the sort keys of the current page, or use OFFSET. Defaults to "keyset".
+            prefetch (Literal["none", "next", "both"], optional): Adjacent pages to load in the background after each page. Defaults to "next".
+            prefetch_buffer (int, optional): Max number of prefetched pages held. Defaults to 4.
         """
         super().__init__(
             *children, name=name, id=id, classes=classes, disabled=disabled
@@ -73,15 +86,25 @@ class PaginatedTable(ContextWidget):
         self.params = initial_params
         self.total = initial_total
         self.calculate_page_status()
-        self.lock = False
+        # Held while a page loads, update_data workers run one at a time
+        self.lock = Lock()
         self.cursor_mode = cursor_type
         self.cursor_waiting = True
+        self.pagination_mode = pagination_mode
+        self.first_key = None
+        self.last_key = None
+        self.prefetch = prefetch
+        self.prefetch_buffer = prefetch_buffer
+        # Prefetched pages keyed by page_signature, oldest first
+        self.buffer: dict[tuple, SearchResult] = {}
+        # Bumped whenever params/sorting/page size change, so in-flight prefetches drop their results
+        self.generation = 0
+        # Guards buffer & generation, used from the prefetch worker, the app's thread & ORM listeners
+        self.buffer_lock = Lock()
 
     def calculate_page_status(self) -> None:
         page_size = self.pagination["limit"]
-        total_pages = (
-            math.ceil(self.total / page_size) if self.total > 0 and page_size > 0 else 1
-        )
+        total_pages = page_count(self.total, page_size)
         current_page = (
             math.floor(
                 self.pagination["offset"]
@@ -114,27 +137,123 @@ class PaginatedTable(ContextWidget):
         for row in range(len(self.data)):
             self.render_row(self.data[row], row, table)
 
-    @work(exclusive=True, thread=True, group="pagination-update")
-    def update_data(self):
-        """Update data from current attrs"""
-        while self.lock:
-            pass
+    def apply_result(self, result: SearchResult) -> None:
+        """Render a search result as the current page"""
         self.cursor_waiting = True
-        self.lock = True
         table = self.query_one(".paginated-table", expect_type=DataTable)
         table.clear(columns=True)
-        result = self.result_factory.search(
-            self.context.orm, self.pagination, **self.params
-        )
         self.total = result.total
         self.data = result.results
+        self.first_key = result.first_key
+        self.last_key = result.last_key
         table.add_columns(*self.get_column_sorts())
         self.render_rows()
         self.calculate_page_status()
-        self.query_one(".paginated-table", expect_type=DataTable).refresh()
-        self.lock = False
+        table.refresh()
+
+    @work(exclusive=True, thread=True, group="pagination-update")
+    def update_data(self):
+        """Update data from current attrs"""
+        with self.lock:
+            generation = self.generation
+            with self.context.orm.connection():
+                result = self.result_factory.search(
+                    self.context.orm, self.pagination, **self.params
+                )
+                self.apply_result(result)
+        # Workers can only be started from the app's thread
+        self.app.call_from_thread(self.prefetch_adjacent, generation)
+
+    def show_page(self):
+        """Render the current pagination, straight from the prefetch buffer if it's there"""
+        with self.buffer_lock:
+            result = self.buffer.pop(self.page_signature(self.pagination), None)
+            generation = self.generation
+        if result == None:
+            self.update_data()
+            return
+        self.apply_result(result)
+        self.prefetch_adjacent(generation)
+
+    def page_signature(self, pagination: PaginationParams) -> tuple:
+        return freeze(
+            [
+                self.params,
+                pagination.get("order"),
+                pagination.get("limit"),
+                pagination.get("offset"),
+                pagination.get("after"),
+                pagination.get("before"),
+            ]
+        )
+
+    def can_prefetch(self) -> bool:
+        """Prefetches only use spare capacity, not while a page loads or every pooled connection is busy"""
+        if self.lock.locked():
+            return False
+        pool = self.context.orm.pool
+        return pool == None or pool.has_spare()
+
+    @work(exclusive=True, thread=True, group="pagination-prefetch")
+    def prefetch_adjacent(self, generation: int):
+        """Load the pages next to the current one into the buffer, skipped when the DB is busy
+        (the pages are then loaded on demand)"""
+        if self.prefetch == "none":
+            return
+        worker = get_current_worker()
+        pages = [self.next_pagination()]
+        if self.prefetch == "both":
+            pages.append(self.previous_pagination())
+
+        if not self.can_prefetch():
+            return
+        with self.context.orm.connection():
+            for pagination in pages:
+                if pagination == None:
+                    continue
+                signature = self.page_signature(pagination)
+                with self.buffer_lock:
+                    if signature in self.buffer.keys():
+                        continue
+                if not self.can_prefetch():
+                    return
+                result = self.result_factory.search(
+                    self.context.orm, pagination, **self.params
+                )
+                with self.buffer_lock:
+                    # Params changed or the tables were written while loading, the page is stale
+                    if worker.is_cancelled or generation != self.generation:
+                        return
+                    self.buffer[signature] = result
+                    while len(self.buffer) > self.prefetch_buffer:
+                        self.buffer.pop(next(iter(self.buffer)), None)
+
+    def drop_prefetched(self):
+        """Drop prefetched pages, in-flight prefetches discard theirs (any thread)"""
+        with self.buffer_lock:
+            self.generation += 1
+            self.buffer.clear()
+
+    def reset_prefetch(self):
+        """Drop prefetched pages & stop loading more, after params/sorting/page size change"""
+        self.drop_prefetched()
+        self.workers.cancel_group(self, "pagination-prefetch")
+
+    def search_tags(self) -> set[str]:
+        """Tables the current search reads"""
+        spec = self.result_factory.search_spec(self.pagination, **self.params)
+        return set(spec.tags if spec.tags else [spec.table])
+
+    def invalidate_prefetch(self, tables: tuple[str, ...]):
+        """ORM listener, drops the prefetched pages once a table they were read from is written.
+        May be called from any thread, the pages are dropped right away & the workers are
+        cancelled on the app's thread"""
+        if not self.search_tags().isdisjoint(tables):
+            self.drop_prefetched()
+            self.call_later(self.workers.cancel_group, self, "pagination-prefetch")
 
     def action_refresh(self):
+        self.reset_prefetch()
         self.update_data()
 
     def compose(self) -> ComposeResult:
@@ -148,6 +267,11 @@ class PaginatedTable(ContextWidget):
                 Button("<- Previous", classes="pagination-control-item previous"),
                 Static(self.page_status, classes="pagination-control-item status"),
                 Button("Next ->", classes="pagination-control-item next"),
+                Input(
+                    placeholder="Page",
+                    type="integer",
+                    classes="pagination-control-item page-number",
+                ),
                 Select(
                     [("10", 10), ("25", 25), ("50", 50)],
                     classes="pagination-control-item page-size",
@@ -162,8 +286,12 @@ class PaginatedTable(ContextWidget):
     def on_mount(self) -> None:
         table = self.query_one(".paginated-table", expect_type=DataTable)
         table.add_columns(*[c["name"] for c in self.columns])
+        self.context.orm.add_listener(self.invalidate_prefetch)
         self.update_data()
 
+    def on_unmount(self) -> None:
+        self.context.orm.remove_listener(self.invalidate_prefetch)
+
     @on(Button.Pressed, ".pagination-control-item.previous")
     def on_previous_pressed(self):
         self.go_previous()
@@ -172,25 +300,89 @@ class PaginatedTable(ContextWidget):
     def on_next_pressed(self):
         self.go_next()
 
+    @on(Input.Submitted, ".pagination-control-item.page-number")
+    def on_page_number_submitted(self, event: Input.Submitted):
+        try:
+            self.go_to_page(int(event.value))
+        except ValueError:
+            pass
+        event.input.clear()
+
     @on(Select.Changed, ".pagination-control-item.page-size")
     def on_page_size_changed(self, event: Select.Changed):
         self.pagination["limit"] = event.value
+        self.clear_keyset()
+        self.reset_prefetch()
         self.update_data()
 
+    def clear_keyset(self):
+        """Drop keyset cursors, the next fetch uses the current offset instead"""
+        self.pagination["after"] = None
+        self.pagination["before"] = None
+
+    def previous_pagination(self) -> Optional[PaginationParams]:
+        """Pagination of the page before the current one, None on the first page"""
+        if self.pagination["offset"] <= 0:
+            return None
+        pagination: PaginationParams = {
+            **self.pagination,
+            "offset": max(0, self.pagination["offset"] - self.pagination["limit"]),
+            "after": None,
+            "before": None,
+        }
+        if (
+            self.pagination_mode == "keyset"
+            and self.first_key != None
+            and pagination["offset"] > 0
+        ):
+            pagination["before"] = self.first_key
+        return pagination
+
+    def next_pagination(self) -> Optional[PaginationParams]:
+        """Pagination of the page after the current one, None on the last page"""
+        if self.pagination_mode == "keyset" and self.last_key != None:
+            if self.pagination["offset"] + self.pagination["limit"] < self.total:
+                return {
+                    **self.pagination,
+                    "offset": self.pagination["offset"] + self.pagination["limit"],
+                    "after": self.last_key,
+                    "before": None,
+                }
+        elif self.pagination["offset"] < self.total - self.pagination["limit"]:
+            return {
+                **self.pagination,
+                "offset": min(
+                    self.total - self.pagination["limit"],
+                    self.pagination["offset"] + self.pagination["limit"],
+                ),
+                "after": None,
+                "before": None,
+            }
+        return None
+
     def go_previous(self):
-        if self.pagination["offset"] > 0:
-            self.pagination["offset"] = max(
-                0, self.pagination["offset"] - self.pagination["limit"]
-            )
-            self.update_data()
+        pagination = self.previous_pagination()
+        if pagination != None:
+            self.pagination = pagination
+            self.show_page()
 
     def go_next(self):
-        if self.pagination["offset"] < self.total - self.pagination["limit"]:
-            self.pagination["offset"] = min(
-                self.total - self.pagination["limit"],
-                self.pagination["offset"] + self.pagination["limit"],
-            )
-            self.update_data()
+        pagination = self.next_pagination()
+        if pagination != None:
+            self.pagination = pagination
+            self.show_page()
+
+    def go_to_page(self, page: int):
+        """Jump straight to a page (1-indexed) using OFFSET, clamped to the existing pages
+
+        Args:
+            page (int): Page number
+        """
+        page_size = self.pagination["limit"]
+        page = min(max(1, page), page_count(self.total, page_size))
+        self.pagination["offset"] = (page - 1) * page_size
+        self.clear_keyset()
+        self.show_page()
 
     @on(DataTable.HeaderSelected)
     def on_column_select(self, event: DataTable.HeaderSelected):
@@ -218,6 +410,8 @@ class PaginatedTable(ContextWidget):
                 self.pagination["order"].insert(
                     0, [self.columns[event.column_index]["sort_by"], "ASC"]
                 )
+            self.clear_keyset()
+            self.reset_prefetch()
             self.update_data()
 
     def get_column_sorts(self) -> list[str]:
@@ -237,14 +431,18 @@ class PaginatedTable(ContextWidget):
                 new_columns.append(self.columns[c]["name"])
         return new_columns
 
-    def search(self, params: dict[str, Any]):
+    def search(self, params: dict[str, Any], order: Optional[list] = None):
         """Update search params
 
         Args:
             params (dict[str, Any]): New search parameters
+            order (Optional[list], optional): Ordering to use instead of the default one. Defaults to None.
         """
         self.pagination = self.default_pagination.copy()
+        if order != None:
+            self.pagination["order"] = order
         self.params = params
+        self.reset_prefetch()
         self.update_data()
 
     def watch_cursor_mode(self, old, new):
@@ -0,0 +1,101 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from threading import local
+from typing import Any, Callable, Iterator, Optional
+from psycopg import Connection
+from psycopg_pool import ConnectionPool
+
+"""
+SUMMARY:
+Pooled database connections, checked out per task/thread.
+Workers each get their own connection (so transactions don't interleave),
+and the executor bounds how much DB work runs at once.
+"""
+
+
+class DatabasePool:
+    def __init__(
+        self,
+        conninfo: str,
+        min_size: int = 1,
+        max_size: int = 4,
+        timeout: float = 30,
+        configure: Optional[Callable[[Connection], None]] = None,
+    ) -> None:
+        """Opens the pool & executor
+
+        Args:
+            conninfo (str): Connection string (points at the SSH tunnel's local bind when tunnelled)
+            min_size (int, optional): Connections kept open. Defaults to 1.
+            max_size (int, optional): Max connections, also the executor's worker count. Defaults to 4.
+            timeout (float, optional): Seconds to wait for a free connection. Defaults to 30.
+            configure (Optional[Callable[[Connection], None]], optional): Called on each new connection. Defaults to None.
+        """
+        self.pool = ConnectionPool(
+            conninfo,
+            min_size=min_size,
+            max_size=max_size,
+            timeout=timeout,
+            configure=configure,
+            check=ConnectionPool.check_connection,
+            name="books-db",
+            open=True,
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_size, thread_name_prefix="books-db"
+        )
+        self.local = local()
+
+    def current(self) -> Optional[Connection]:
+        """Returns the connection checked out by the calling thread, if any"""
+        return getattr(self.local, "connection", None)
+
+    @contextmanager
+    def connection(self) -> Iterator[Connection]:
+        """Checks out a connection for the calling thread (re-entrant).
+            Commits when the outermost block exits cleanly, rolls back otherwise.
+
+        Yields:
+            Iterator[Connection]: Checked out connection
+        """
+        current = self.current()
+        if current != None:
+            yield current
+            return
+
+        with self.pool.connection() as connection:
+            self.local.connection = connection
+            try:
+                yield connection
+            finally:
+                self.local.connection = None
+
+    def has_spare(self) -> bool:
+        """Whether a connection can be checked out without waiting (one is idle, or the pool can grow)"""
+        stats = self.pool.get_stats()
+        if stats.get("requests_waiting", 0) > 0:
+            return False
+        return (
+            stats.get("pool_available", 0) > 0
+            or stats.get("pool_size", 0) < self.pool.max_size
+        )
+
+    def submit(self, task: Callable[..., Any], *args, **kwargs) -> Future:
+        """Runs a task on the executor with its own checked out connection
+
+        Args:
+            task (Callable[..., Any]): Function to run, uses ORM.db / Record.db as usual
+
+        Returns:
+            Future: Future of the task's return value
+        """
+
+        def run():
+            with self.connection():
+                return task(*args, **kwargs)
+
+        return self.executor.submit(run)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.pool.close()
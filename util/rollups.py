@@ -0,0 +1,159 @@
+from datetime import datetime
+from threading import Event, Thread
+from time import perf_counter
+from typing import TYPE_CHECKING, Optional
+from psycopg import Connection
+from .pool import DatabasePool
+
+if TYPE_CHECKING:
+    from .orm import ORM
+
+"""
+SUMMARY:
+Background refresh of the materialized recommendation rollups (see sql/migrations/005_recommendation_rollups.sql).
+Every interval, each rollup older than the interval is refreshed CONCURRENTLY, so readers
+keep the previous contents until the refresh commits. Clients coordinate through a
+transaction-level advisory lock and the rollup_refreshes table: only one client
+refreshes a given rollup, and the others skip it until it goes stale again.
+"""
+
+# Materialized views kept fresh by the scheduler
+ROLLUPS = ["books_sessions_90", "books_sessions_month"]
+
+
+class RollupScheduler:
+    def __init__(
+        self,
+        pool: DatabasePool,
+        orm: Optional["ORM"] = None,
+        interval: float = 300,
+        rollups: list[str] = ROLLUPS,
+    ) -> None:
+        """Scheduler (not started until start())
+
+        Args:
+            pool (DatabasePool): Pool to check refresh connections out of
+            orm (Optional[ORM], optional): ORM whose caches are invalidated after a refresh. Defaults to None.
+            interval (float, optional): Seconds between refreshes, 0 disables the scheduler. Defaults to 300.
+            rollups (list[str], optional): Materialized views to refresh. Defaults to ROLLUPS.
+        """
+        self.pool = pool
+        self.orm = orm
+        self.interval = interval
+        self.rollups = rollups
+        self.stopped = Event()
+        self.thread: Optional[Thread] = None
+        self.refreshes = 0
+        self.skipped = 0
+        self.failures = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def start(self):
+        if not self.enabled or self.thread != None:
+            return
+        self.stopped.clear()
+        self.thread = Thread(target=self.run, name="rollup-refresh", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self.stopped.set()
+        if self.thread != None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def run(self):
+        # Check right away (rollups may have gone stale while no client ran), then every interval
+        while not self.stopped.is_set():
+            self.refresh_stale()
+            self.stopped.wait(self.interval)
+
+    def refresh_stale(self) -> list[str]:
+        """Refreshes every rollup older than the interval
+
+        Returns:
+            list[str]: Rollups refreshed by this call
+        """
+        refreshed = []
+        for name in self.rollups:
+            if self.stopped.is_set():
+                break
+            try:
+                if self.refresh(name):
+                    refreshed.append(name)
+            except Exception:
+                # Retried at the next interval, the previous contents stay readable
+                self.failures += 1
+        if len(refreshed) > 0 and self.orm != None:
+            self.orm.invalidate(*refreshed)
+        return refreshed
+
+    def refresh(self, name: str, force: bool = False) -> bool:
+        """Refreshes a single rollup, unless another client holds it or it is still fresh
+
+        Args:
+            name (str): Materialized view name
+            force (bool, optional): Refresh even if it is not stale yet. Defaults to False.
+
+        Returns:
+            bool: Whether it was refreshed
+        """
+        with self.pool.connection() as db:
+            try:
+                locked = db.execute(
+                    "SELECT pg_try_advisory_xact_lock(hashtext(%s))", [name]
+                ).fetchone()[0]
+                if not locked:
+                    db.rollback()
+                    self.skipped += 1
+                    return False
+                if not force:
+                    fresh = db.execute(
+                        "SELECT 1 FROM rollup_refreshes WHERE name = %s AND refreshed_at > now() - make_interval(secs => %s)",
+                        [name, self.interval],
+                    ).fetchone()
+                    if fresh != None:
+                        db.rollback()
+                        self.skipped += 1
+                        return False
+
+                start = perf_counter()
+                db.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY " + name)
+                db.execute(
+                    "INSERT INTO rollup_refreshes (name, refreshed_at, duration_ms) VALUES (%s, now(), %s) ON CONFLICT (name) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at, duration_ms = EXCLUDED.duration_ms",
+                    [name, (perf_counter() - start) * 1000],
+                )
+                # Also releases the advisory lock
+                db.commit()
+            except:
+                db.rollback()
+                raise
+        self.refreshes += 1
+        return True
+
+    def last_refreshed(self, db: Connection) -> dict[str, datetime]:
+        """When each rollup was last refreshed (by any client)
+
+        Args:
+            db (Connection): Connection to read with
+
+        Returns:
+            dict[str, datetime]: Refresh time per rollup name
+        """
+        cursor = db.execute(
+            "SELECT name, refreshed_at FROM rollup_refreshes WHERE name = ANY(%s)",
+            [self.rollups],
+            prepare=True,
+        )
+        result = {r[0]: r[1] for r in cursor.fetchall()}
+        cursor.close()
+        return result
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "refreshes": self.refreshes,
+            "skipped": self.skipped,
+            "failures": self.failures,
+        }